@@ -1,19 +1,50 @@
 import asyncio
+import base64
 import json
+import logging
 import os
+import re
+import shutil
 import subprocess
+import time
+import uuid
 from typing import Dict, List, Optional
 from pathlib import Path
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 from pydantic import BaseModel
 import redis.asyncio as aioredis
 
+from cluster import FORWARDED_HEADER, Cluster
+from consumer_lag import ConsumerLagMonitor
+from producer_pool import ProducerPool
+from replies import REPLY_SUFFIX
+from stream_hub import StreamHub
+from log_tail import LogFollower, tail_lines
+from mcp_pool import McpServerPool, is_shared, pooled_json_config, server_key
+from resources import ResourceMonitor
+from scale_to_zero import ScaleToZero
+from structured_logging import configure_logging
+from transports import backend_of
+
 app = FastAPI(title="Agent Manager API", version="1.0.0")
+logger = logging.getLogger(__name__)
 
-print(Path)
-ABSOLUTE_PATH = "/Users/vaibhavgeek/commandhive/docker-container"
+# Checkout the manager and its agents run from; differs per container in cluster mode
+ABSOLUTE_PATH = os.environ.get('AGENT_HOME', "/Users/vaibhavgeek/commandhive/docker-container")
 AGENTS_BASE_DIR = Path(ABSOLUTE_PATH) / "agents"
 MAIN_DIRECTORY = Path(ABSOLUTE_PATH)
+# Size-based rotation of agent logs
+LOG_MAX_BYTES = int(os.environ.get('AGENT_LOG_MAX_BYTES', str(50 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.environ.get('AGENT_LOG_BACKUPS', '5'))
+# Largest batch accepted by POST /agents/{agent_name}/messages/batch
+MAX_MESSAGE_BATCH = int(os.environ.get('MAX_MESSAGE_BATCH', '500'))
+# Seconds between keepalives on idle agent streams
+STREAM_KEEPALIVE_SECONDS = float(os.environ.get('STREAM_KEEPALIVE_SECONDS', '15'))
+# Most lines a single log tail request may ask for
+MAX_LOG_TAIL_LINES = int(os.environ.get('MAX_LOG_TAIL_LINES', '10000'))
+# Log files exposed by the logs endpoint: supervisord-captured output and structured runtime logs
+LOG_SOURCES = {"output": "{name}_logs.log", "runtime": "{name}_runtime.log"}
 
 class SubAgent(BaseModel):
     name: str
@@ -21,12 +52,94 @@ class SubAgent(BaseModel):
     servers: List[str] = []
     model: str = "haiku"
 
+class RouteRule(BaseModel):
+    agent: str
+    pattern: Optional[str] = None
+    keywords: List[str] = []
+
 class AgentConfig(BaseModel):
     username: str
     name: str
     subagents: List[SubAgent]
     json_config: Dict
     initial_task: Optional[str] = None
+    num_partitions: int = 1
+    replication_factor: int = 1
+    # Kafka consumer group; None gives the agent its own group, so other agents' restarts never rebalance it
+    consumer_group: Optional[str] = None
+    # Rejoin under a fixed group.instance.id, so a restart within the session timeout keeps the partitions
+    static_membership: bool = True
+    max_pending_per_partition: int = 100
+    publish_replies: bool = True
+    reply_linger_ms: int = 5
+    # None: headless whenever the agent's stdout is not a TTY (always the case under supervisord)
+    headless: Optional[bool] = None
+    # Orchestration result cache: off at 0; "memory" or "redis" (shared by agents with the same config)
+    result_cache_ttl_seconds: float = 0
+    result_cache_max_entries: int = 1000
+    result_cache_backend: str = "memory"
+    # Plan cache: replay orchestrator plans for recurring objectives (0 = off); "memory" or "redis"
+    plan_cache_ttl_seconds: float = 0
+    plan_cache_max_entries: int = 1000
+    plan_cache_backend: str = "memory"
+    # Semantic cache: answers rephrased repeats whose embedding is at least semantic_cache_threshold similar
+    semantic_cache_enabled: bool = False
+    semantic_cache_threshold: float = 0.95
+    semantic_cache_match_terms: bool = True
+    semantic_cache_ttl_seconds: float = 300
+    semantic_cache_max_entries: int = 1000
+    semantic_cache_embedder: Optional[str] = None
+    # Skip messages processed within the window: by envelope id / broker offset ("id") or task text ("content")
+    dedup_window_seconds: float = 600
+    dedup_max_entries: int = 10000
+    dedup_key: str = "id"
+    dedup_bloom_capacity: int = 0
+    dedup_backend: str = "memory"
+    # Start MCP servers on first tool call (once their tools are in the manifest); 0 never stops idle ones
+    mcp_lazy_start: bool = True
+    mcp_idle_timeout_seconds: float = 600
+    # Fast-path rules sending matching tasks straight to one subagent, skipping orchestrator planning
+    routes: List[RouteRule] = []
+    # "orchestrator" plans every task; "parallel" sends it to all fan-out subagents at once (0 = no limit)
+    workflow: str = "orchestrator"
+    parallel_agents: List[str] = []
+    parallel_max_concurrency: int = 0
+    parallel_fan_in: Optional[str] = None
+    # Stop the agent after this many minutes without messages and start it on the next one (0 = always on)
+    scale_to_zero_idle_minutes: float = 0
+    # Per-session subagent histories, snapshotted every N turns and on stop; "file" or "redis".
+    # Tasks then run one at a time across all partitions, and the answer caches must be off
+    sessions_enabled: bool = False
+    session_backend: str = "file"
+    session_checkpoint_turns: int = 1
+    session_ttl_seconds: float = 7 * 24 * 3600
+    session_max_in_memory: int = 100
+    # Restart the agent when its process tree (agent plus MCP servers) exceeds this RSS (0 = no limit)
+    memory_limit_mb: float = 0
+    # Cap the agent's process tree at this share of one core once it exceeds it (0 = no limit)
+    cpu_limit_percent: float = 0
+
+class AgentMessage(BaseModel):
+    content: str
+    type: str = "user"
+    correlation_id: Optional[str] = None
+    channel_id: Optional[str] = None
+    reply_to: Optional[str] = None
+    # Subagent that handles the message directly instead of the orchestrator
+    target: Optional[str] = None
+    # Conversation the message belongs to (defaults to channel_id) when the agent keeps sessions
+    session_id: Optional[str] = None
+    metadata: Dict = {}
+
+class AgentMessageBatch(BaseModel):
+    messages: List[AgentMessage]
+
+class AgentImport(BaseModel):
+    """An agent handed over by another node when its user moves"""
+    config: Dict
+    # Agent-relative path -> base64 file content (MCP tool manifest, session snapshots)
+    files: Dict[str, str] = {}
+    start: bool = False
 
 class AgentStatus(BaseModel):
     name: str
@@ -36,6 +149,19 @@ class AgentStatus(BaseModel):
 class AgentManager:
     def __init__(self):
         AGENTS_BASE_DIR.mkdir(exist_ok=True)
+        self.stream_hub = StreamHub()
+        self.producer_pool = ProducerPool()
+        self.mcp_pool = McpServerPool(self._resolve_mcp_server)
+        self.scale_to_zero = ScaleToZero(
+            self._idle_policy_agents,
+            self._is_running,
+            lambda agent_name, username: self.start_agent(agent_name, username, wake=False),
+            lambda agent_name, username: self.stop_agent(agent_name, username, idle=True),
+            self.producer_pool.get
+        )
+        self.lag = ConsumerLagMonitor(self._lag_agents, self.producer_pool.get)
+        self.resources = ResourceMonitor(self._agent_pids, self._resource_limits, self._restart_over_limit)
+        self.cluster = Cluster.from_env()
         
     def _get_user_directories(self, username: str):
         """Get user-specific directories, creating them if they don't exist"""
@@ -65,6 +191,10 @@ class AgentManager:
         supervisor_file = supervisor_dir / f"{config.name}.ini"
         supervisor_file.write_text(supervisor_config)
         
+        # Keep the original configuration so the manager can reach the agent's channels later
+        config_file = agents_dir / f"{config.name}_config.json"
+        config_file.write_text(json.dumps(config.dict(), indent=4))
+        
         return {"message": f"Agent '{config.name}' created successfully for user '{config.username}'", "file": str(agent_file)}
     
     def _generate_agent_code(self, config: AgentConfig) -> str:
@@ -82,15 +212,22 @@ class AgentManager:
         subagents_json = json.dumps([agent.dict() for agent in config.subagents], indent=4)
         subagents_python = subagents_json.replace('true', 'True').replace('false', 'False').replace('null', 'None')
         
-        config_json = json.dumps(config.json_config, indent=4)
+        # Shared stdio MCP servers are reached through the manager's pool instead of being spawned
+        config_json = json.dumps(pooled_json_config(config.json_config), indent=4)
         config_python = config_json.replace('true', 'True').replace('false', 'False').replace('null', 'None')
         
+        runtime_json = json.dumps(self._get_runtime_config(config), indent=4)
+        runtime_python = runtime_json.replace('true', 'True').replace('false', 'False').replace('null', 'None')
+        
         agent_code = template_content.replace(
             "# PLACEHOLDER_SUBAGENTS_CONFIG - This will be replaced with actual subagents configuration\nsubagents_config = []",
             f"subagents_config = {subagents_python}"
         ).replace(
             "# PLACEHOLDER_JSON_CONFIG - This will be replaced with actual JSON configuration\nsample_json_config = {}",
             f"sample_json_config = {config_python}"
+        ).replace(
+            "# PLACEHOLDER_RUNTIME_CONFIG - This will be replaced with actual runtime configuration\nruntime_config = {}",
+            f"runtime_config = {runtime_python}"
         ).replace(
             "PLACEHOLDER_AGENT_NAME",
             config.name
@@ -107,7 +244,7 @@ class AgentManager:
             initial_task_code = f'''
             # Initial task for the orchestrator
             initial_task = """{config.initial_task}"""
-            await agent.orchestrate(initial_task)
+            await run_task(agent, initial_task, source="initial_task")
             '''
             agent_code = agent_code.replace(
                 "            # PLACEHOLDER_INITIAL_TASK - This will be replaced with initial task if provided\n            # PLACEHOLDER_INITIAL_TASK_EXECUTION - This will be replaced with task execution if provided",
@@ -121,6 +258,104 @@ class AgentManager:
         
         return agent_code
     
+    def _get_runtime_config(self, config: AgentConfig) -> Dict:
+        """Runtime options for the generated agent that live outside json_config"""
+        if config.num_partitions < 1:
+            raise HTTPException(status_code=400, detail="num_partitions must be at least 1")
+        if config.result_cache_backend not in ("memory", "redis"):
+            raise HTTPException(status_code=400, detail="result_cache_backend must be 'memory' or 'redis'")
+        if config.plan_cache_backend not in ("memory", "redis"):
+            raise HTTPException(status_code=400, detail="plan_cache_backend must be 'memory' or 'redis'")
+        if not 0 < config.semantic_cache_threshold <= 1:
+            raise HTTPException(status_code=400, detail="semantic_cache_threshold must be in (0, 1]")
+        if config.dedup_key not in ("id", "content"):
+            raise HTTPException(status_code=400, detail="dedup_key must be 'id' or 'content'")
+        if config.dedup_backend not in ("memory", "redis"):
+            raise HTTPException(status_code=400, detail="dedup_backend must be 'memory' or 'redis'")
+        for server_name, server_config in ((config.json_config.get("mcp") or {}).get("servers") or {}).items():
+            cache_config = server_config.get("cache") if isinstance(server_config, dict) else None
+            if cache_config and cache_config.get("backend", "memory") not in ("memory", "redis"):
+                raise HTTPException(status_code=400, detail=f"mcp server '{server_name}': cache backend must be 'memory' or 'redis'")
+        subagent_names = {subagent.name for subagent in config.subagents}
+        for index, rule in enumerate(config.routes):
+            if rule.agent not in subagent_names:
+                raise HTTPException(status_code=400, detail=f"routes[{index}]: unknown subagent '{rule.agent}'")
+            if not rule.pattern and not rule.keywords:
+                raise HTTPException(status_code=400, detail=f"routes[{index}]: a pattern or keywords are required")
+            if rule.pattern:
+                try:
+                    re.compile(rule.pattern)
+                except re.error as e:
+                    raise HTTPException(status_code=400, detail=f"routes[{index}]: invalid pattern: {e}")
+        if config.workflow not in ("orchestrator", "parallel"):
+            raise HTTPException(status_code=400, detail="workflow must be 'orchestrator' or 'parallel'")
+        if config.parallel_max_concurrency < 0:
+            raise HTTPException(status_code=400, detail="parallel_max_concurrency must not be negative")
+        unknown = [name for name in config.parallel_agents + [config.parallel_fan_in] if name and name not in subagent_names]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown parallel subagents: {unknown}")
+        if config.memory_limit_mb < 0 or config.cpu_limit_percent < 0:
+            raise HTTPException(status_code=400, detail="memory_limit_mb and cpu_limit_percent must not be negative")
+        if config.scale_to_zero_idle_minutes < 0:
+            raise HTTPException(status_code=400, detail="scale_to_zero_idle_minutes must not be negative")
+        if config.scale_to_zero_idle_minutes and backend_of(config.json_config.get("pubsub_config")) == "memory":
+            raise HTTPException(status_code=400, detail="scale_to_zero_idle_minutes needs a redis, kafka or msk backend")
+        if config.session_backend not in ("file", "redis"):
+            raise HTTPException(status_code=400, detail="session_backend must be 'file' or 'redis'")
+        if config.sessions_enabled and (config.result_cache_ttl_seconds > 0 or config.semantic_cache_enabled):
+            # A cached answer would skip the subagents, leaving the turn out of the session's history
+            raise HTTPException(status_code=400, detail="sessions_enabled cannot be combined with the result or semantic cache")
+        agents_dir, _ = self._get_user_directories(config.username)
+        return {
+            "num_partitions": config.num_partitions,
+            "replication_factor": config.replication_factor,
+            "consumer_group": self._consumer_group_of(config.dict()),
+            # The same id on every node, so an agent moved between nodes takes over (fences) its old instance
+            "group_instance_id": f"{config.username}_{config.name}" if config.static_membership else None,
+            "max_pending_per_partition": config.max_pending_per_partition,
+            "publish_replies": config.publish_replies,
+            "reply_linger_ms": config.reply_linger_ms,
+            "headless": config.headless,
+            "result_cache_ttl_seconds": config.result_cache_ttl_seconds,
+            "result_cache_max_entries": config.result_cache_max_entries,
+            "result_cache_backend": config.result_cache_backend,
+            "plan_cache_ttl_seconds": config.plan_cache_ttl_seconds,
+            "plan_cache_max_entries": config.plan_cache_max_entries,
+            "plan_cache_backend": config.plan_cache_backend,
+            "semantic_cache_enabled": config.semantic_cache_enabled,
+            "semantic_cache_threshold": config.semantic_cache_threshold,
+            "semantic_cache_match_terms": config.semantic_cache_match_terms,
+            "semantic_cache_ttl_seconds": config.semantic_cache_ttl_seconds,
+            "semantic_cache_max_entries": config.semantic_cache_max_entries,
+            "semantic_cache_embedder": config.semantic_cache_embedder,
+            "dedup_window_seconds": config.dedup_window_seconds,
+            "dedup_max_entries": config.dedup_max_entries,
+            "dedup_key": config.dedup_key,
+            "dedup_bloom_capacity": config.dedup_bloom_capacity,
+            "dedup_backend": config.dedup_backend,
+            "mcp_lazy_start": config.mcp_lazy_start,
+            "mcp_idle_timeout_seconds": config.mcp_idle_timeout_seconds,
+            "routes": [rule.dict(exclude_none=True) for rule in config.routes],
+            "workflow": config.workflow,
+            "parallel_agents": config.parallel_agents,
+            "parallel_max_concurrency": config.parallel_max_concurrency,
+            "parallel_fan_in": config.parallel_fan_in,
+            # Tool/prompt lists of the agent's MCP servers, written on first start
+            "mcp_manifest_file": str(agents_dir / f"{config.name}_mcp_tools.json"),
+            "sessions_enabled": config.sessions_enabled,
+            "session_backend": config.session_backend,
+            "session_checkpoint_turns": config.session_checkpoint_turns,
+            "session_ttl_seconds": config.session_ttl_seconds,
+            "session_max_in_memory": config.session_max_in_memory,
+            "session_dir": str(agents_dir / f"{config.name}_sessions"),
+            # Touched as messages are handled; the manager's idle policy reads its mtime
+            "activity_file": str(agents_dir / f"{config.name}_activity"),
+            # Structured runtime logs, rotated and compressed by the agent itself
+            "log_file": str(agents_dir / f"{config.name}_runtime.log"),
+            "log_max_bytes": LOG_MAX_BYTES,
+            "log_backup_count": LOG_BACKUP_COUNT
+        }
+    
     def _generate_supervisor_config(self, agent_name: str, username: str) -> str:
         """Generate supervisord configuration for agent"""
         agents_dir, _ = self._get_user_directories(username)
@@ -129,18 +364,25 @@ command=bash -c "source {ABSOLUTE_PATH}/.venv/bin/activate && python {agents_dir
 directory={ABSOLUTE_PATH}
 autostart=false
 autorestart=true
-stderr_logfile={agents_dir}/{agent_name}_logs.log
+redirect_stderr=true
 stdout_logfile={agents_dir}/{agent_name}_logs.log
+stdout_logfile_maxbytes={LOG_MAX_BYTES}
+stdout_logfile_backups={LOG_BACKUP_COUNT}
+environment=PYTHONPATH="{ABSOLUTE_PATH}"
 user=vaibhavgeek
 """
 
-    async def start_agent(self, agent_name: str, username: str) -> Dict:
+    async def start_agent(self, agent_name: str, username: str, wake: bool = True) -> Dict:
         """Start an agent using supervisorctl"""
+        key = f"{username}/{agent_name}"
+        if wake and self.scale_to_zero.hibernating(key):
+            # Through the dispatcher, so messages buffered while the agent was stopped are delivered
+            await self.scale_to_zero.wake(self._idle_policy_agent(self._load_agent_config(agent_name, username)), reason="start")
+            return {"message": f"Agent '{agent_name}' woken for user '{username}'", "status": self._program_status(agent_name, username)}
         try:
             agents_dir, supervisor_dir = self._get_user_directories(username)
             # Check if agent file exists first
             agent_file = agents_dir / f"{agent_name}_agent.py"
-            print(agent_file)
             if not agent_file.exists():
                 raise HTTPException(status_code=404, detail=f"Agent file '{agent_name}_agent.py' not found for user '{username}'")
             
@@ -148,7 +390,7 @@ user=vaibhavgeek
             log_file = agents_dir / f"{agent_name}_logs.log"
             if not log_file.exists():
                 log_file.touch()
-                print(f"Created log file: {log_file}")
+                logger.info(f"Created log file: {log_file}")
             
             # Check if supervisor config exists
             supervisor_file = supervisor_dir / f"{agent_name}.ini"
@@ -156,18 +398,18 @@ user=vaibhavgeek
                 raise HTTPException(status_code=404, detail=f"Supervisor config '{agent_name}.ini' not found for user '{username}'")
             
             # First, make sure supervisor knows about the configuration
-            print(f"Updating supervisor configuration for agent '{agent_name}'...")
+            logger.info(f"Updating supervisor configuration for agent '{agent_name}'...")
             reread_result = subprocess.run(
                 ["supervisorctl", "reread"], 
                 capture_output=True, text=True, check=True
             )
-            print(f"Reread output: {reread_result.stdout}")
+            logger.debug(f"Reread output: {reread_result.stdout}")
             
             update_result = subprocess.run(
                 ["supervisorctl", "update"], 
                 capture_output=True, text=True, check=True
             )
-            print(f"Update output: {update_result.stdout}")
+            logger.debug(f"Update output: {update_result.stdout}")
             
             # Check if the program is now known to supervisor
             program_name = f"{username}_{agent_name}_agent"
@@ -178,13 +420,13 @@ user=vaibhavgeek
             
             
             # Now try to start the agent
-            print(f"Starting agent '{program_name}'...")
+            logger.info(f"Starting agent '{program_name}'...")
             start_result = subprocess.run(
                 ["supervisorctl", "-c" , "/opt/homebrew/etc/supervisord.conf", "start", program_name],
                 capture_output=True, text=True, check=True
             )
             
-            print(f"Start output: {start_result.stdout}")
+            logger.info(f"Start output: {start_result.stdout}")
             
             # Verify the agent actually started
             final_status = subprocess.run(
@@ -239,8 +481,12 @@ user=vaibhavgeek
                 detail=f"Unexpected error starting agent '{agent_name}' for user '{username}': {str(e)}"
             )
 
-    async def stop_agent(self, agent_name: str, username: str) -> Dict:
-        """Stop an agent using supervisorctl"""
+    async def stop_agent(self, agent_name: str, username: str, idle: bool = False) -> Dict:
+        """Stop an agent using supervisorctl; idle stops leave it to be woken by its dispatcher"""
+        if not idle:
+            self.scale_to_zero.forget(f"{username}/{agent_name}")
+            agents_dir, _ = self._get_user_directories(username)
+            (agents_dir / f"{agent_name}_idle.json").unlink(missing_ok=True)
         try:
             program_name = f"{username}_{agent_name}_agent"
             result = subprocess.run(
@@ -253,59 +499,45 @@ user=vaibhavgeek
 
     async def delete_agent(self, agent_name: str, username: str) -> Dict:
         """Delete an agent and its configuration"""
+        await self.stop_agent(agent_name, username)
+        self._delete_files(agent_name, username)
+            
+        subprocess.run(["supervisorctl", "reread"], check=True)
+        subprocess.run(["supervisorctl", "update"], check=True)
+        
+        return {"message": f"Agent '{agent_name}' deleted successfully for user '{username}'"}
+
+    def _delete_files(self, agent_name: str, username: str):
+        """Remove an agent's code, supervisor config and state from this node"""
         agents_dir, supervisor_dir = self._get_user_directories(username)
         agent_file = agents_dir / f"{agent_name}_agent.py"
         supervisor_file = supervisor_dir / f"{agent_name}.ini"
-        
-        await self.stop_agent(agent_name, username)
+        config_file = agents_dir / f"{agent_name}_config.json"
+        manifest_file = agents_dir / f"{agent_name}_mcp_tools.json"
+        activity_file = agents_dir / f"{agent_name}_activity"
         
         if agent_file.exists():
             agent_file.unlink()
         if supervisor_file.exists():
             supervisor_file.unlink()
-            
-        subprocess.run(["supervisorctl", "reread"], check=True)
-        subprocess.run(["supervisorctl", "update"], check=True)
-        
-        return {"message": f"Agent '{agent_name}' deleted successfully for user '{username}'"}
+        if config_file.exists():
+            config_file.unlink()
+        if manifest_file.exists():
+            manifest_file.unlink()
+        if activity_file.exists():
+            activity_file.unlink()
+        (agents_dir / f"{agent_name}_idle.json").unlink(missing_ok=True)
+        shutil.rmtree(agents_dir / f"{agent_name}_sessions", ignore_errors=True)
 
     async def list_agents(self, username: str = None) -> List[Dict]:
         """List all agents and their status for a specific user or all users"""
         agents = []
         
         # Get all running supervisor processes
-        supervisor_agents = {}
-        try:
-            result = subprocess.run(
-                ["supervisorctl", "status"],
-                capture_output=True, text=True, check=True
-            )
-            
-            for line in result.stdout.strip().split('\n'):
-                if '_agent' in line and line.strip():
-                    parts = line.split()
-                    if len(parts) >= 2:
-                        program_name = parts[0]
-                        # Extract username and agent name from program name (format: username_agentname_agent)
-                        if program_name.count('_') >= 2:
-                            name_parts = program_name.rsplit('_agent', 1)[0].split('_', 1)
-                            if len(name_parts) == 2:
-                                prog_username, agent_name = name_parts
-                                # Filter by username if specified
-                                if username is None or prog_username == username:
-                                    status = parts[1]
-                                    is_active = status.upper() in ['RUNNING']
-                                    pid = None
-                                    if len(parts) > 2 and parts[2].startswith('pid'):
-                                        pid = int(parts[2].split()[1].rstrip(','))
-                                    
-                                    supervisor_agents[f"{prog_username}/{agent_name}"] = {
-                                        "status": status,
-                                        "is_active": is_active,
-                                        "pid": pid
-                                    }
-        except subprocess.CalledProcessError:
-            pass
+        supervisor_agents = {
+            agent_key: info for agent_key, info in self._supervisor_programs().items()
+            if username is None or agent_key.split('/', 1)[0] == username
+        }
         
         # Check file system for agent files
         if username:
@@ -327,7 +559,8 @@ user=vaibhavgeek
                         "file_exists": True,
                         "is_active_in_background": supervisor_info["is_active"],
                         "status": supervisor_info["status"],
-                        "pid": supervisor_info["pid"]
+                        "pid": supervisor_info["pid"],
+                        "resources": self.resources.get(agent_key)
                     })
         else:
             # Check all users' agents
@@ -352,7 +585,8 @@ user=vaibhavgeek
                                     "file_exists": True,
                                     "is_active_in_background": supervisor_info["is_active"],
                                     "status": supervisor_info["status"],
-                                    "pid": supervisor_info["pid"]
+                                    "pid": supervisor_info["pid"],
+                                    "resources": self.resources.get(agent_key)
                                 })
         
         # Add any supervisor-configured agents that don't have files
@@ -363,7 +597,8 @@ user=vaibhavgeek
                     "file_exists": False,
                     "is_active_in_background": info["is_active"],
                     "status": info["status"],
-                    "pid": info["pid"]
+                    "pid": info["pid"],
+                    "resources": self.resources.get(agent_key)
                 })
             
         return agents
@@ -395,40 +630,668 @@ user=vaibhavgeek
             "username": username,
             "status": status,
             "file": str(agent_file),
-            "exists": True
+            "exists": True,
+            "resources": self.resources.get(f"{username}/{agent_name}"),
+            "consumer_lag": self.lag.get(f"{username}/{agent_name}")
+        }
+
+    def _load_agent_config(self, agent_name: str, username: str) -> Dict:
+        """Load the configuration an agent was created with"""
+        agents_dir, _ = self._get_user_directories(username)
+        agent_file = agents_dir / f"{agent_name}_agent.py"
+        if not agent_file.exists():
+            raise HTTPException(status_code=404, detail=f"Agent '{agent_name}' not found for user '{username}'")
+        
+        config_file = agents_dir / f"{agent_name}_config.json"
+        if config_file.exists():
+            return json.loads(config_file.read_text())
+        # Agents created before configs were stored: assume the Redis defaults
+        return {"name": agent_name, "username": username, "json_config": {}}
+    
+    def _get_pubsub_config(self, agent_name: str, username: str) -> Dict:
+        """pubsub_config of an agent, defaulting to Redis on its own name"""
+        return self._pubsub_config_of(self._load_agent_config(agent_name, username))
+    
+    @staticmethod
+    def _pubsub_config_of(config: Dict) -> Dict:
+        pubsub_config = dict(config.get("json_config", {}).get("pubsub_config") or {})
+        # Same default as the agent's create_transport, so the manager never publishes elsewhere
+        pubsub_config["backend"] = backend_of(pubsub_config)
+        pubsub_config.setdefault("channel_name", config["name"])
+        return pubsub_config
+    
+    def _program_status(self, agent_name: str, username: str) -> str:
+        """supervisord state of an agent's program (RUNNING, STOPPED, ...)"""
+        result = subprocess.run(
+            ["supervisorctl", "status", f"{username}_{agent_name}_agent"],
+            capture_output=True, text=True
+        )
+        parts = result.stdout.split()
+        return parts[1] if len(parts) > 1 else "unknown"
+    
+    def _is_running(self, agent_name: str, username: str) -> bool:
+        return self._program_status(agent_name, username) in ("RUNNING", "STARTING")
+    
+    def _supervisor_programs(self) -> Dict[str, Dict]:
+        """supervisord state of every agent program, keyed by username/agent_name"""
+        programs = {}
+        try:
+            result = subprocess.run(
+                ["supervisorctl", "status"],
+                capture_output=True, text=True, check=True
+            )
+        except subprocess.CalledProcessError:
+            return programs
+        for line in result.stdout.strip().split('\n'):
+            if '_agent' in line and line.strip():
+                parts = line.split()
+                if len(parts) >= 2:
+                    program_name = parts[0]
+                    # Extract username and agent name from program name (format: username_agentname_agent)
+                    if program_name.count('_') >= 2:
+                        name_parts = program_name.rsplit('_agent', 1)[0].split('_', 1)
+                        if len(name_parts) == 2:
+                            prog_username, agent_name = name_parts
+                            status = parts[1]
+                            pid = None
+                            if len(parts) > 3 and parts[2] == 'pid':
+                                pid = int(parts[3].rstrip(','))
+                            programs[f"{prog_username}/{agent_name}"] = {
+                                "status": status,
+                                "is_active": status.upper() in ['RUNNING'],
+                                "pid": pid
+                            }
+        return programs
+    
+    @staticmethod
+    def _consumer_group_of(config: Dict) -> str:
+        """Kafka consumer group the agent runtime commits its offsets in"""
+        if "consumer_group" not in config:
+            # Created before per-agent groups: the runtime uses the shared default
+            return "mcp_agent_consumer"
+        return config["consumer_group"] or f"mcp_agent_{config['username']}_{config['name']}"
+    
+    def _lag_agents(self) -> List[Dict]:
+        agents = []
+        for config in self._iter_agent_configs():
+            pubsub_config = self._pubsub_config_of(config)
+            if pubsub_config.get("backend") in ("kafka", "msk") and config.get("username"):
+                agents.append({
+                    "key": f"{config['username']}/{config['name']}",
+                    "pubsub_config": pubsub_config,
+                    "channel_name": pubsub_config["channel_name"],
+                    "group": self._consumer_group_of(config),
+                })
+        return agents
+    
+    def _agent_pids(self) -> Dict[str, int]:
+        return {key: info["pid"] for key, info in self._supervisor_programs().items() if info["pid"]}
+    
+    def _resource_limits(self) -> Dict[str, Dict]:
+        return {
+            f"{config['username']}/{config['name']}": {
+                "memory_limit_mb": config.get("memory_limit_mb", 0),
+                "cpu_limit_percent": config.get("cpu_limit_percent", 0),
+            }
+            for config in self._iter_agent_configs()
+            if config.get("memory_limit_mb") or config.get("cpu_limit_percent")
+        }
+    
+    async def _restart_over_limit(self, key: str):
+        username, agent_name = key.split("/", 1)
+        await self.stop_agent(agent_name, username)
+        await self.start_agent(agent_name, username, wake=False)
+    
+    def _idle_policy_agent(self, config: Dict) -> Dict:
+        """What the scale-to-zero policy needs to know about an agent"""
+        agents_dir, _ = self._get_user_directories(config["username"])
+        name = config["name"]
+        return {
+            "key": f"{config['username']}/{name}",
+            "username": config["username"],
+            "name": name,
+            "idle_seconds": config.get("scale_to_zero_idle_minutes", 0) * 60,
+            "pubsub_config": self._pubsub_config_of(config),
+            "group": self._consumer_group_of(config),
+            "activity_file": str(agents_dir / f"{name}_activity"),
+            "runtime_log": str(agents_dir / f"{name}_runtime.log"),
+            "state_file": str(agents_dir / f"{name}_idle.json"),
+        }
+    
+    def _idle_policy_agents(self) -> List[Dict]:
+        """Agents created with a scale-to-zero idle timeout"""
+        return [
+            self._idle_policy_agent(config) for config in self._iter_agent_configs()
+            if config.get("scale_to_zero_idle_minutes") and config.get("username") and config.get("name")
+        ]
+
+    async def open_stream(self, agent_name: str, username: str):
+        """Attach a client to the agent's shared output stream (its channel and reply channel)"""
+        pubsub_config = self._get_pubsub_config(agent_name, username)
+        channel_name = pubsub_config["channel_name"]
+        try:
+            return await self.stream_hub.connect(
+                f"{username}/{agent_name}", pubsub_config, [channel_name, channel_name + REPLY_SUFFIX]
+            )
+        except Exception as e:
+            raise HTTPException(status_code=502, detail=f"Failed to subscribe to agent '{agent_name}' output: {str(e)}")
+
+    def _build_envelope(self, message: AgentMessage, channel_name: str) -> Dict:
+        """Validate a submitted message and fill in the envelope defaults"""
+        if message.type != "user":
+            raise HTTPException(status_code=400, detail=f"Unsupported message type '{message.type}', expected 'user'")
+        if not message.content.strip():
+            raise HTTPException(status_code=400, detail="Message content must not be empty")
+        envelope = message.dict()
+        envelope["correlation_id"] = message.correlation_id or uuid.uuid4().hex
+        envelope["channel_id"] = message.channel_id or f"agent:{channel_name}"
+        if not message.reply_to:
+            del envelope["reply_to"]
+        if not message.target:
+            del envelope["target"]
+        if not message.session_id:
+            del envelope["session_id"]
+        return envelope
+
+    async def submit_messages(self, agent_name: str, username: str, messages: List[AgentMessage]) -> Dict:
+        """Publish messages to an agent's channel through the shared producer"""
+        if not messages:
+            raise HTTPException(status_code=400, detail="No messages to submit")
+        if len(messages) > MAX_MESSAGE_BATCH:
+            raise HTTPException(status_code=400, detail=f"At most {MAX_MESSAGE_BATCH} messages can be submitted at once")
+        
+        pubsub_config = self._get_pubsub_config(agent_name, username)
+        if pubsub_config.get("backend") == "memory":
+            raise HTTPException(status_code=400, detail=f"Agent '{agent_name}' uses the in-process memory backend and cannot receive messages from the manager")
+        envelopes = [self._build_envelope(message, pubsub_config["channel_name"]) for message in messages]
+        self.scale_to_zero.touch(f"{username}/{agent_name}")
+        
+        started = time.perf_counter()
+        try:
+            transport = await self.producer_pool.get(pubsub_config)
+            channel = transport.resolve_channel(pubsub_config["channel_name"])
+            results = await transport.publish_many(
+                [(channel, envelope, envelope["correlation_id"]) for envelope in envelopes]
+            )
+        except Exception as e:
+            raise HTTPException(status_code=502, detail=f"Failed to publish to agent '{agent_name}': {str(e)}")
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        
+        return {
+            "agent": f"{username}/{agent_name}",
+            "backend": transport.backend,
+            "elapsed_ms": round(elapsed_ms, 2),
+            "messages": [
+                {"correlation_id": envelope["correlation_id"], **(result or {})}
+                for envelope, result in zip(envelopes, results)
+            ]
         }
 
+    def _get_log_path(self, agent_name: str, username: str, source: str) -> Path:
+        """Path of one of an agent's log files"""
+        if source not in LOG_SOURCES:
+            raise HTTPException(status_code=400, detail=f"Unknown log source '{source}', expected one of {list(LOG_SOURCES)}")
+        agents_dir, _ = self._get_user_directories(username)
+        if not (agents_dir / f"{agent_name}_agent.py").exists():
+            raise HTTPException(status_code=404, detail=f"Agent '{agent_name}' not found for user '{username}'")
+        log_path = agents_dir / LOG_SOURCES[source].format(name=agent_name)
+        if not log_path.exists():
+            raise HTTPException(status_code=404, detail=f"No {source} log for agent '{agent_name}' yet")
+        return log_path
+
+    async def tail_logs(self, agent_name: str, username: str, lines: int, source: str, include_partial: bool = True):
+        """Last lines of an agent's log, read backwards from the end of the file"""
+        if lines < 0 or lines > MAX_LOG_TAIL_LINES:
+            raise HTTPException(status_code=400, detail=f"lines must be between 0 and {MAX_LOG_TAIL_LINES}")
+        log_path = self._get_log_path(agent_name, username, source)
+        loop = asyncio.get_running_loop()
+        tail, offset = await loop.run_in_executor(None, tail_lines, log_path, lines, include_partial)
+        return log_path, tail, offset
+
+    def _iter_agent_configs(self):
+        """Stored configurations of every agent on this node"""
+        for config_file in AGENTS_BASE_DIR.glob("*/agents/*_config.json"):
+            try:
+                yield json.loads(config_file.read_text())
+            except (OSError, ValueError) as e:
+                logger.warning(f"Skipping unreadable agent config {config_file}: {e}")
+
+    def _resolve_mcp_server(self, key: str) -> Optional[Dict]:
+        """Definition of the shared MCP server with this pool key, from the stored agent configs"""
+        for config in self._iter_agent_configs():
+            servers = (config.get("json_config", {}).get("mcp") or {}).get("servers") or {}
+            for name, server_config in servers.items():
+                if isinstance(server_config, dict) and is_shared(server_config) and server_key(server_config) == key:
+                    return {"name": name, **server_config}
+        return None
+
+    async def warm_producers(self):
+        """Connect one shared producer per distinct broker used by existing agents"""
+        configs = {}
+        for config in self._iter_agent_configs():
+            pubsub_config = config.get("json_config", {}).get("pubsub_config")
+            if pubsub_config and backend_of(pubsub_config) != "memory":
+                configs[ProducerPool.pool_key(pubsub_config)] = pubsub_config
+        await self.producer_pool.warm(list(configs.values()))
+
+    def _require_cluster(self) -> Cluster:
+        if self.cluster is None:
+            raise HTTPException(status_code=400, detail="Cluster mode is not enabled (set CLUSTER_REDIS_HOST)")
+        return self.cluster
+
+    def _export_agent(self, config: Dict) -> Dict:
+        """An agent's config and node-local state, as sent to the node a user moves to"""
+        agents_dir, _ = self._get_user_directories(config["username"])
+        name = config["name"]
+        paths = [agents_dir / f"{name}_mcp_tools.json"]
+        paths += sorted((agents_dir / f"{name}_sessions").glob("*.json.z"))
+        return {
+            "config": config,
+            "files": {
+                str(path.relative_to(agents_dir)): base64.b64encode(path.read_bytes()).decode("ascii")
+                for path in paths if path.is_file()
+            },
+        }
+
+    async def import_agent(self, agent: AgentImport) -> Dict:
+        """Create (or refresh) an agent handed over by another node"""
+        try:
+            config = AgentConfig(**agent.config)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid agent config: {str(e)}")
+        agents_dir, _ = self._get_user_directories(config.username)
+        if not (agents_dir / f"{config.name}_agent.py").exists():
+            await self.create_agent(config)
+        root = agents_dir.resolve()
+        for relative, data in agent.files.items():
+            path = (agents_dir / relative).resolve()
+            if root not in path.parents or not relative.startswith(f"{config.name}_"):
+                raise HTTPException(status_code=400, detail=f"Invalid agent file path '{relative}'")
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(base64.b64decode(data))
+        result = {"agent": f"{config.username}/{config.name}", "files": len(agent.files)}
+        if agent.start and not self._is_running(config.name, config.username):
+            result["start"] = (await self.start_agent(config.name, config.username))["message"]
+        return result
+
+    async def move_user(self, username: str, node_id: str) -> Dict:
+        """
+        Move a user's agents to another node without a gap: the target creates
+        and starts them, the placement flips, then the copies here stop and the
+        session snapshots they wrote on shutdown follow
+        """
+        cluster = self._require_cluster()
+        if node_id == cluster.node_id:
+            raise HTTPException(status_code=400, detail=f"User '{username}' is already on node '{node_id}'")
+        configs = [config for config in self._iter_agent_configs() if config.get("username") == username]
+        started = time.perf_counter()
+
+        async def handover(config: Dict, start: bool):
+            try:
+                response = await cluster.request(node_id, "POST", "/cluster/import", json={**self._export_agent(config), "start": start})
+            except ConnectionError as e:
+                raise HTTPException(status_code=503, detail=str(e))
+            if response.status_code >= 400:
+                raise HTTPException(status_code=502, detail=f"Node '{node_id}' rejected agent '{config['name']}': {response.text}")
+
+        for config in configs:
+            # Agents stopped by the idle policy start on the target and go idle there again
+            running = self._is_running(config["name"], username)
+            await handover(config, start=running or self.scale_to_zero.hibernating(f"{username}/{config['name']}"))
+        await cluster.place(username, node_id)
+        for config in configs:
+            try:
+                await self.stop_agent(config["name"], username)
+            except HTTPException as e:
+                logger.debug(f"Stopping '{username}/{config['name']}' before the move: {e.detail}")
+            await handover(config, start=False)
+            self._delete_files(config["name"], username)
+        if configs:
+            subprocess.run(["supervisorctl", "reread"], check=True)
+            subprocess.run(["supervisorctl", "update"], check=True)
+        elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+        logger.info(f"Moved user '{username}' to node '{node_id}'", extra={
+            "event": "cluster_move", "username": username, "from": cluster.node_id, "to": node_id,
+            "agents": len(configs), "elapsed_ms": elapsed_ms
+        })
+        return {"username": username, "from": cluster.node_id, "to": node_id, "agents": [c["name"] for c in configs], "elapsed_ms": elapsed_ms}
+
+    async def rebalance(self) -> Dict:
+        """Move this node's users to the nodes the ring now assigns them (after nodes joined, or to drain this one)"""
+        cluster = self._require_cluster()
+        moved, failed = [], {}
+        for username in await cluster.users():
+            node_id = await cluster.ring_owner(username)
+            if node_id is None:
+                raise HTTPException(status_code=409, detail="No node outside the draining ones can take users")
+            if node_id == cluster.node_id:
+                continue
+            try:
+                moved.append(await self.move_user(username, node_id))
+            except HTTPException as e:
+                failed[username] = e.detail
+        return {"node": cluster.node_id, "draining": cluster.draining, "moved": moved, "failed": failed}
+
+    async def drain(self, draining: bool = True) -> Dict:
+        """Stop placing users on this node and move the ones it holds elsewhere"""
+        cluster = self._require_cluster()
+        await cluster.set_draining(draining)
+        if not draining:
+            return {"node": cluster.node_id, "draining": False, "moved": [], "failed": {}}
+        return await self.rebalance()
+
+    async def list_cluster_agents(self) -> List[Dict]:
+        """Agents of every live node, each tagged with the node holding it"""
+        cluster = self._require_cluster()
+
+        async def node_agents(node_id):
+            if node_id == cluster.node_id:
+                agents = await self.list_agents()
+            else:
+                response = await cluster.request(node_id, "GET", "/agents")
+                response.raise_for_status()
+                agents = response.json()
+            return [{**agent, "node": node_id} for agent in agents]
+
+        node_ids = list(await cluster.nodes(refresh=True))
+        results = await asyncio.gather(*(node_agents(node_id) for node_id in node_ids), return_exceptions=True)
+        agents = []
+        for node_id, result in zip(node_ids, results):
+            if isinstance(result, BaseException):
+                logger.warning(f"Could not list agents of node '{node_id}': {result}")
+            else:
+                agents.extend(result)
+        return agents
+
 manager = AgentManager()
 
+@app.on_event("startup")
+async def startup():
+    # Warm in the background so the API is available while brokers connect
+    asyncio.create_task(manager.warm_producers())
+    manager.mcp_pool.start()
+    manager.scale_to_zero.start()
+    manager.resources.start()
+    manager.lag.start()
+    if manager.cluster is not None:
+        await manager.cluster.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    if manager.cluster is not None:
+        await manager.cluster.close()
+    await manager.scale_to_zero.close()
+    await manager.resources.close()
+    await manager.lag.close()
+    await manager.producer_pool.close()
+    await manager.mcp_pool.close()
+
+async def route_to_owner(request: Request, username: str, pin: bool = False):
+    """In cluster mode, proxy the request to the node holding the user's agents; None when this node serves it"""
+    cluster = manager.cluster
+    if cluster is None or request.headers.get(FORWARDED_HEADER):
+        return None
+    node_id = await cluster.owner(username, pin=pin)
+    if node_id == cluster.node_id:
+        return None
+    try:
+        return await cluster.forward(node_id, request, await request.body())
+    except ConnectionError as e:
+        raise HTTPException(status_code=503, detail=f"Agents of user '{username}' are unavailable: {str(e)}")
+
 @app.post("/agents")
-async def create_agent(config: AgentConfig):
+async def create_agent(config: AgentConfig, request: Request):
     """Create a new agent"""
+    forwarded = await route_to_owner(request, config.username, pin=True)
+    if forwarded is not None:
+        return forwarded
     return await manager.create_agent(config)
 
 @app.get("/agents")
-async def list_agents(username: str = None):
+async def list_agents(request: Request, username: str = None):
     """List all agents for a specific user or all users"""
+    if username is not None:
+        forwarded = await route_to_owner(request, username)
+        if forwarded is not None:
+            return forwarded
+    elif manager.cluster is not None and not request.headers.get(FORWARDED_HEADER):
+        return await manager.list_cluster_agents()
     return await manager.list_agents(username)
 
 @app.get("/agents/{agent_name}")
-async def get_agent(agent_name: str, username: str):
+async def get_agent(agent_name: str, username: str, request: Request):
     """Get agent details"""
+    forwarded = await route_to_owner(request, username)
+    if forwarded is not None:
+        return forwarded
     return await manager.get_agent(agent_name, username)
 
 @app.post("/agents/{agent_name}/start")
-async def start_agent(agent_name: str, username: str):
+async def start_agent(agent_name: str, username: str, request: Request):
     """Start an agent"""
+    forwarded = await route_to_owner(request, username)
+    if forwarded is not None:
+        return forwarded
     return await manager.start_agent(agent_name, username)
 
 @app.post("/agents/{agent_name}/stop")
-async def stop_agent(agent_name: str, username: str):
+async def stop_agent(agent_name: str, username: str, request: Request):
     """Stop an agent"""
+    forwarded = await route_to_owner(request, username)
+    if forwarded is not None:
+        return forwarded
     return await manager.stop_agent(agent_name, username)
 
 @app.delete("/agents/{agent_name}")
-async def delete_agent(agent_name: str, username: str):
+async def delete_agent(agent_name: str, username: str, request: Request):
     """Delete an agent"""
-    return await manager.delete_agent(agent_name, username)
+    forwarded = await route_to_owner(request, username)
+    if forwarded is not None:
+        return forwarded
+    result = await manager.delete_agent(agent_name, username)
+    if manager.cluster is not None and not any(c.get("username") == username for c in manager._iter_agent_configs()):
+        # The user's next agent is placed afresh
+        await manager.cluster.unplace(username)
+    return result
+
+@app.post("/agents/{agent_name}/messages")
+async def submit_message(agent_name: str, username: str, message: AgentMessage, request: Request):
+    """Send a message to an agent"""
+    forwarded = await route_to_owner(request, username)
+    if forwarded is not None:
+        return forwarded
+    result = await manager.submit_messages(agent_name, username, [message])
+    return {**result["messages"][0], "agent": result["agent"], "backend": result["backend"], "elapsed_ms": result["elapsed_ms"]}
+
+@app.post("/agents/{agent_name}/messages/batch")
+async def submit_messages(agent_name: str, username: str, batch: AgentMessageBatch, request: Request):
+    """Send a batch of messages to an agent"""
+    forwarded = await route_to_owner(request, username)
+    if forwarded is not None:
+        return forwarded
+    return await manager.submit_messages(agent_name, username, batch.messages)
+
+def format_sse(event: Dict) -> str:
+    """Encode an agent event as a server-sent event"""
+    event_type = str(event.get("type", "message")).replace("\n", " ")
+    return f"event: {event_type}\ndata: {json.dumps(event, default=str)}\n\n"
+
+@app.get("/agents/{agent_name}/stream")
+async def stream_agent(agent_name: str, username: str, request: Request):
+    """Stream an agent's output as server-sent events"""
+    forwarded = await route_to_owner(request, username)
+    if forwarded is not None:
+        return forwarded
+    client = await manager.open_stream(agent_name, username)
+    
+    async def event_source():
+        try:
+            yield ": connected\n\n"
+            while not await request.is_disconnected():
+                event = await client.next_event(timeout=STREAM_KEEPALIVE_SECONDS)
+                if event is None:
+                    yield ": keepalive\n\n"
+                else:
+                    yield format_sse(event)
+        finally:
+            await manager.stream_hub.disconnect(client)
+    
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.websocket("/agents/{agent_name}/ws")
+async def stream_agent_ws(websocket: WebSocket, agent_name: str, username: str):
+    """Stream an agent's output over a WebSocket"""
+    await websocket.accept()
+    if manager.cluster is not None:
+        # WebSockets are not proxied; point the client at the node holding the agent
+        node_id = await manager.cluster.owner(username)
+        if node_id != manager.cluster.node_id:
+            url = await manager.cluster.node_url(node_id) or "unavailable"
+            await websocket.close(code=1013, reason=f"Served by node '{node_id}' at {url}"[:120])
+            return
+    try:
+        client = await manager.open_stream(agent_name, username)
+    except HTTPException as e:
+        await websocket.close(code=1011, reason=e.detail[:120])
+        return
+    
+    try:
+        while True:
+            event = await client.next_event(timeout=STREAM_KEEPALIVE_SECONDS)
+            await websocket.send_json(event if event is not None else {"type": "keepalive"})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        await manager.stream_hub.disconnect(client)
+
+@app.get("/agents/{agent_name}/logs")
+async def agent_logs(agent_name: str, username: str, request: Request, lines: int = 100,
+                     follow: bool = False, source: str = "output"):
+    """Tail an agent's log; with follow=true, keep streaming new lines as server-sent events"""
+    forwarded = await route_to_owner(request, username)
+    if forwarded is not None:
+        return forwarded
+    # When following, a trailing partial line is left for the follower to complete
+    log_path, tail, offset = await manager.tail_logs(agent_name, username, lines, source, include_partial=not follow)
+    if not follow:
+        return {"agent": f"{username}/{agent_name}", "source": source, "file": str(log_path), "lines": tail}
+    
+    follower = LogFollower(log_path, offset)
+    follower.start()
+    
+    async def event_source():
+        try:
+            for line in tail:
+                yield format_sse({"type": "log", "line": line})
+            while not await request.is_disconnected():
+                events = await follower.next_events(timeout=STREAM_KEEPALIVE_SECONDS)
+                if not events:
+                    yield ": keepalive\n\n"
+                for event in events:
+                    yield format_sse(event)
+        finally:
+            follower.close()
+    
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/mcp/servers/{key}")
+async def mcp_pool_request(key: str, request: Request):
+    """Streamable HTTP endpoint of a shared MCP server"""
+    try:
+        payload = await request.json()
+    except ValueError:
+        return JSONResponse({"jsonrpc": "2.0", "id": None, "error": {"code": -32700, "message": "Parse error"}}, status_code=400)
+    try:
+        body, headers = await manager.mcp_pool.handle(key, payload, request.headers.get("mcp-session-id"))
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"No shared MCP server '{key}'")
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"Shared MCP server '{key}' failed to start: {str(e)}")
+    if body is None:
+        return Response(status_code=202, headers=headers)
+    return JSONResponse(body, headers=headers)
+
+@app.get("/mcp/servers/{key}")
+async def mcp_pool_stream(key: str):
+    """The pool sends no server-initiated messages, so there is no standalone SSE stream"""
+    return Response(status_code=405, headers={"Allow": "POST, DELETE"})
+
+@app.delete("/mcp/servers/{key}")
+async def mcp_pool_end_session(key: str):
+    """Sessions share the pooled server; ending one leaves the server running"""
+    return Response(status_code=200)
+
+@app.get("/mcp/servers")
+async def mcp_pool_status():
+    """Shared MCP servers and their state"""
+    return manager.mcp_pool.stats()
+
+@app.get("/scaling")
+async def scaling_status():
+    """Agents stopped by the idle policy, buffered messages and cold-start latency"""
+    return manager.scale_to_zero.stats()
+
+@app.get("/metrics")
+async def metrics():
+    """Per-agent resource usage and consumer lag in Prometheus text format"""
+    lines = manager.resources.metrics() + manager.lag.metrics()
+    return PlainTextResponse("\n".join(lines) + "\n", media_type="text/plain; version=0.0.4")
+
+@app.get("/cluster")
+async def cluster_status():
+    """Live nodes, their weights and the number of users placed on each"""
+    if manager.cluster is None:
+        return {"enabled": False}
+    return {"enabled": True, **await manager.cluster.status()}
+
+@app.post("/cluster/import")
+async def cluster_import(agent: AgentImport):
+    """Receive an agent from another node (used by user moves)"""
+    manager._require_cluster()
+    return await manager.import_agent(agent)
+
+@app.post("/cluster/users/{username}/move")
+async def cluster_move_user(username: str, node: str, request: Request):
+    """Move a user's agents to another node without stopping them first"""
+    manager._require_cluster()
+    forwarded = await route_to_owner(request, username)
+    if forwarded is not None:
+        return forwarded
+    return await manager.move_user(username, node)
+
+async def forward_to_node(request: Request, node_id: str):
+    """Proxy a node-level request to node_id unless it is this node"""
+    cluster = manager._require_cluster()
+    if node_id == cluster.node_id:
+        return None
+    try:
+        return await cluster.forward(node_id, request, await request.body())
+    except ConnectionError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+@app.post("/cluster/nodes/{node_id}/drain")
+async def cluster_drain(node_id: str, request: Request, draining: bool = True):
+    """Move every user off a node and keep new users away from it (draining=false undoes the latter)"""
+    forwarded = await forward_to_node(request, node_id)
+    if forwarded is not None:
+        return forwarded
+    return await manager.drain(draining)
+
+@app.post("/cluster/nodes/{node_id}/rebalance")
+async def cluster_rebalance(node_id: str, request: Request):
+    """Move a node's users to the nodes the hash ring now assigns them"""
+    forwarded = await forward_to_node(request, node_id)
+    if forwarded is not None:
+        return forwarded
+    return await manager.rebalance()
 
 @app.get("/health")
 async def health_check():
@@ -437,4 +1300,5 @@ async def health_check():
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8080)
\ No newline at end of file
+    configure_logging({"level": os.environ.get("AGENT_MANAGER_LOG_LEVEL", "info")})
+    uvicorn.run(app, host="0.0.0.0", port=8080, log_config=None)
\ No newline at end of file
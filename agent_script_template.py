@@ -2,113 +2,32 @@ import asyncio
 import json
 from typing import Dict, List
 import os
+import signal
+import time
 from  mcp_agent.core.fastagent import FastAgent
 from dotenv import load_dotenv
 load_dotenv()
-from aiokafka import AIOKafkaConsumer, AIOKafkaProducer
-from aiokafka.abc import AbstractTokenProvider
-from aiokafka.admin import AIOKafkaAdminClient, NewTopic
-from aiokafka.errors import TopicAlreadyExistsError
-from aws_msk_iam_sasl_signer import MSKAuthTokenProvider
-import ssl
 import logging
 
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
-logger = logging.getLogger(__name__)
-
-def create_ssl_context():
-    ssl_context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
-    ssl_context.options |= ssl.OP_NO_SSLv2
-    ssl_context.options |= ssl.OP_NO_SSLv3
-    ssl_context.check_hostname = False
-    ssl_context.verify_mode = ssl.CERT_NONE
-    ssl_context.load_default_certs()
-    return ssl_context
-
-class AWSTokenProvider(AbstractTokenProvider):
-    def __init__(self, region="ap-south-1"):
-        self.region = region
-    
-    async def token(self):
-        loop = asyncio.get_running_loop()
-        return await loop.run_in_executor(None, self._generate_token)
-    
-    def _generate_token(self):
-        try:
-            token, _ = MSKAuthTokenProvider.generate_auth_token(self.region)
-            return token
-        except Exception as e:
-            logger.error(f"Failed to generate auth token: {e}")
-            raise
-
-async def create_msk_consumer(bootstrap_servers, topic_name, consumer_group="mcp_agent_consumer"):
-    try:
-        tp = AWSTokenProvider()
-        consumer = AIOKafkaConsumer(
-            topic_name,
-            bootstrap_servers=bootstrap_servers,
-            group_id=consumer_group,
-            security_protocol='SASL_SSL',
-            ssl_context=create_ssl_context(),
-            sasl_mechanism='OAUTHBEARER',
-            sasl_oauth_token_provider=tp,
-            value_deserializer=lambda m: json.loads(m.decode('utf-8')) if m else None,
-            key_deserializer=lambda k: k.decode('utf-8') if k else None,
-            auto_offset_reset='latest',
-            enable_auto_commit=True,
-            auto_commit_interval_ms=1000,
-            client_id='mcp_agent_consumer',
-            api_version="0.11.5",
-            session_timeout_ms=30000,
-            heartbeat_interval_ms=10000
-        )
-        
-        await consumer.start()
-        logger.info(f"MSK consumer created successfully for topic '{topic_name}'!")
-        return consumer
-        
-    except Exception as e:
-        logger.error(f"Failed to create MSK consumer: {str(e)}")
-        return None
+from dedup import DedupWindow
+from fan_out import FanOutWorkflow
+from lazy_mcp import LazyMcpServers
+from headless import apply_headless_config, is_headless, orchestrate_with_events, silence_console
+from partition_workers import PartitionWorkerPool
+from plan_cache import PlanCache
+from progress import install as install_progress_events, reporting
+from replies import ReplyPublisher, correlation_id_for
+from routing import TaskRouter
+from result_cache import ResultCache, config_fingerprint
+from scale_to_zero import ActivityMarker
+from semantic_cache import SemanticCache
+from sessions import SessionManager, session_key
+from structured_logging import configure_logging
+from tool_cache import ToolCallCache, install_tool_cache
+from transports import create_transport
 
-async def ensure_topic_exists(bootstrap_servers, topic_name, num_partitions=1, replication_factor=1):
-    """Ensure Kafka topic exists, create if it doesn't"""
-    try:
-        tp = AWSTokenProvider()
-        admin_client = AIOKafkaAdminClient(
-            bootstrap_servers=bootstrap_servers,
-            security_protocol='SASL_SSL',
-            ssl_context=create_ssl_context(),
-            sasl_mechanism='OAUTHBEARER',
-            sasl_oauth_token_provider=tp,
-            client_id=f'admin_client_{topic_name}'
-        )
-        
-        await admin_client.start()
-        
-        try:
-            # Try to create the topic
-            new_topic = NewTopic(
-                name=topic_name,
-                num_partitions=num_partitions,
-                replication_factor=replication_factor
-            )
-            
-            result = await admin_client.create_topics([new_topic])
-            logger.info(f"Topic '{topic_name}' created successfully")
-            
-        except TopicAlreadyExistsError:
-            logger.info(f"Topic '{topic_name}' already exists")
-        except Exception as e:
-            logger.warning(f"Error creating topic '{topic_name}': {e}")
-            
-    except Exception as e:
-        logger.error(f"Failed to connect to Kafka admin client: {e}")
-    finally:
-        try:
-            await admin_client.close()
-        except:
-            pass
+logger = logging.getLogger(__name__)
+process_started = time.perf_counter()
 
 # PLACEHOLDER_SUBAGENTS_CONFIG - This will be replaced with actual subagents configuration
 subagents_config = []
@@ -116,6 +35,33 @@ subagents_config = []
 # PLACEHOLDER_JSON_CONFIG - This will be replaced with actual JSON configuration
 sample_json_config = {}
 
+# PLACEHOLDER_RUNTIME_CONFIG - This will be replaced with actual runtime configuration
+runtime_config = {}
+
+# JSON-lines logging through a background writer; level comes from json_config["logger"]
+configure_logging(
+    sample_json_config.get("logger"),
+    log_file=runtime_config.get("log_file"),
+    max_bytes=runtime_config.get("log_max_bytes", 50 * 1024 * 1024),
+    backup_count=runtime_config.get("log_backup_count", 5),
+    static_fields={"agent": "PLACEHOLDER_AGENT_NAME"}
+)
+
+# No terminal under supervisord: skip rich panel rendering and log compact events instead
+if is_headless(runtime_config):
+    apply_headless_config(sample_json_config)
+    silence_console()
+
+# MCP tool call results cached per server/tool as configured in json_config["mcp"]["servers"][...]["cache"]
+tool_cache = ToolCallCache.from_json_config(sample_json_config)
+if tool_cache and not install_tool_cache(tool_cache):
+    tool_cache = None
+
+# MCP servers known from the manifest start on first use and stop when idle
+lazy_mcp = LazyMcpServers.from_runtime_config(runtime_config, sample_json_config)
+if lazy_mcp and not lazy_mcp.install():
+    lazy_mcp = None
+
 # Create FastAgent instance
 fast = FastAgent(
     name="PLACEHOLDER_AGENT_NAME",
@@ -164,83 +110,270 @@ def create_agents_from_config(config_list: List[Dict]) -> List[str]:
 # Create agents from configuration
 created_agent_names = create_agents_from_config(subagents_config)
 
+# Orchestrator settings, also part of the result and plan cache fingerprints
+orchestrator_config = {"plan_type": "full", "model": "haiku"}
+
 # Create orchestrator with the dynamically created agents
 @fast.orchestrator(
     name="orchestrate", 
     agents=created_agent_names,  # Use the list of created agent names
-    plan_type="full",
-    model="haiku"
+    **orchestrator_config
 )
 async def orchestrate_task():
     """Orchestrator function"""
     pass
 
-async def main():
-    """Test initializing FastAgent with JSON config using MSK for message consumption."""
+# runtime_config["workflow"] == "parallel": independent subagents get every task concurrently
+workflow = FanOutWorkflow.from_runtime_config(runtime_config, created_agent_names)
+
+# Fast-path rules (runtime_config["routes"]) and envelope targets that skip orchestrator planning
+router = TaskRouter(runtime_config.get("routes", []), created_agent_names, workflow=workflow)
+
+# Opt-in plan cache (runtime_config["plan_cache_ttl_seconds"] > 0): recurring objectives replay
+# their orchestrator plans until the subagents or orchestrator settings change
+plan_cache = PlanCache.from_runtime_config(
+    runtime_config, sample_json_config, config_fingerprint(subagents_config, orchestrator_config)
+)
+if plan_cache and not plan_cache.install():
+    plan_cache = None
+
+# Plan steps and subagent results are streamed as progress events ahead of the reply
+# (installed after the plan cache so replayed plans are reported too)
+if runtime_config.get("publish_replies", True):
+    install_progress_events()
+
+# Opt-in result cache (runtime_config["result_cache_ttl_seconds"] > 0); entries are
+# invalidated by any change to the subagents, models or MCP servers
+result_cache = ResultCache.from_runtime_config(
+    runtime_config,
+    sample_json_config,
+    config_fingerprint(subagents_config, orchestrator_config, workflow and vars(workflow),
+                       sample_json_config.get("default_model"), sample_json_config.get("mcp"))
+)
+
+# Opt-in semantic cache (runtime_config["semantic_cache_enabled"]) for rephrased repeats
+semantic_cache = SemanticCache.from_runtime_config(runtime_config)
+
+# Window of processed message ids (runtime_config["dedup_window_seconds"], 0 disables)
+dedup = DedupWindow.from_runtime_config(runtime_config, sample_json_config, namespace="PLACEHOLDER_AGENT_NAME")
+
+# Per-session subagent histories, snapshotted to disk/Redis and restored on the session's next message
+sessions = SessionManager.from_runtime_config(
+    runtime_config, sample_json_config, created_agent_names, namespace="PLACEHOLDER_AGENT_NAME"
+)
+
+# Last-message time for the manager's scale-to-zero idle policy
+activity = ActivityMarker(runtime_config["activity_file"]) if runtime_config.get("activity_file") else None
+
+async def orchestrate_uncached(agent, task, target=None, **fields):
+    """Run a task unless the semantic cache holds the answer to a similar one on the default route"""
+    if semantic_cache is None or target is not None:
+        return await orchestrate_with_events(agent, task, router=router, target=target, **fields)
+    started = time.perf_counter()
+    response = await semantic_cache.lookup(task)
+    logger.info("Semantic cache lookup", extra={
+        "event": "semantic_cache",
+        "outcome": "miss" if response is None else "hit",
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 3),
+        **semantic_cache.stats()
+    })
+    if response is None:
+        response = await orchestrate_with_events(agent, task, router=router, **fields)
+        await semantic_cache.add(task, response)
+    return response
+
+async def run_task(agent, task, target=None, **fields):
+    """
+    Run a task on the orchestrator (or workflow), or directly on the target subagent, answering
+    repeated tasks from the result caches when they are enabled
+    """
+    if result_cache is None:
+        return await orchestrate_uncached(agent, task, target, **fields)
+    cache_key = task if target is None else f"@{target} {task}"
+    return await result_cache.get_or_compute(cache_key, lambda: orchestrate_uncached(agent, task, target, **fields))
+
+def parse_task(value):
+    """
+    Extract the orchestrator task from a message value.
+    Returns (task, envelope); task is None for messages that carry no task.
+    """
+    # If this is a user message, extract content and send to orchestrator
+    if isinstance(value, dict):
+        if value.get('type') == 'user' and 'content' in value:
+            return value['content'], value
+        return None, value
     
-    # MSK configuration from the FastAgent config
-    msk_config = sample_json_config["pubsub_config"]["msk"]
-    bootstrap_servers = msk_config["bootstrap_servers"]
-    topic_name = msk_config["topic_prefix"] + sample_json_config["pubsub_config"]["channel_name"]
+    if isinstance(value, str):
+        # Try to parse as JSON first
+        try:
+            data_obj = json.loads(value)
+            if isinstance(data_obj, dict) and data_obj.get('type') == 'user' and 'content' in data_obj:
+                return data_obj['content'], data_obj
+        except json.JSONDecodeError:
+            pass
+        # Process as plain text
+        return value, {}
     
-    # Ensure topic exists before creating consumer
-    await ensure_topic_exists(bootstrap_servers, topic_name)
+    return None, {}
+
+async def handle_message(agent, message, replies=None):
+    """Send the task carried by a transport message to the orchestrator and publish its reply"""
+    if not message.value:
+        return
     
-    # Create MSK consumer
-    consumer = await create_msk_consumer(bootstrap_servers, topic_name)
-    if not consumer:
-        logger.error("Failed to create MSK consumer. Exiting.")
+    task, envelope = parse_task(message.value)
+    if task is None:
         return
+    if activity:
+        activity.touch()
+    
+    # Redelivered or retried messages inside the dedup window are not processed again; their
+    # sender gets the stored reply, or a "duplicate" status while the first one is in flight
+    dedup_key = dedup.message_key(message, envelope, task) if dedup else None
+    if dedup_key and await dedup.check(dedup_key):
+        stored = await dedup.stored(dedup_key)
+        logger.info("Skipping duplicate message", extra={
+            "event": "dedup", "key": dedup_key, "replayed": stored is not None, **dedup.stats()
+        })
+        if replies and stored is not None:
+            replies.reply(envelope, stored["response"], status="ok", message=message)
+        elif replies:
+            replies.reply(envelope, None, status="duplicate", message=message)
+        return
+    target, route_reason = router.route(task, envelope)
+    logger.info("Processing user input", extra={
+        "partition": str(message.partition), "task": task, "route": target or router.default_route, "route_reason": route_reason
+    })
+    
+    # Progress events and the reply share one correlation id
+    correlation_id = reporter = None
+    if replies:
+        correlation_id = correlation_id_for(envelope, message)
+        reporter = lambda stage, **fields: replies.progress(envelope, stage, correlation_id=correlation_id, **fields)
+    
+    status = None
+    try:
+        try:
+            # Simple requests go straight to their subagent, everything else to the orchestrator
+            with reporting(reporter):
+                if sessions:
+                    response = await sessions.run(
+                        agent, session_key(envelope), lambda: run_task(agent, task, target, partition=str(message.partition))
+                    )
+                else:
+                    response = await run_task(agent, task, target, partition=str(message.partition))
+            status = "ok"
+        except Exception as e:
+            logger.exception(f"Error processing message: {e}")
+            response = str(e)
+            status = "error"
+    finally:
+        # Only successes are remembered, so a retry after an error or a revoke is processed again
+        if dedup_key and status == "ok":
+            await dedup.record(dedup_key, response)
+        elif dedup_key:
+            dedup.release(dedup_key)
+    
+    if replies:
+        replies.reply(envelope, response, status=status, correlation_id=correlation_id)
+
+async def consume_messages(transport, pool, max_records=100, timeout_ms=1000):
+    """Receive message batches and hand each one to its partition's worker"""
+    while True:
+        for message in await transport.receive_batch(max_records=max_records, timeout_ms=timeout_ms):
+            # The partition may have been revoked while the batch was in hand; the message is not
+            # acked, so Kafka redelivers it to the partition's new owner (Redis pub/sub loses it)
+            if not pool.submit(message.partition, message):
+                logger.warning("Dropped message of a revoked partition", extra={
+                    "event": "revoked_drop", "channel": message.channel, "partition": str(message.partition), "offset": message.offset
+                })
+
+async def main():
+    """Run the agent, consuming tasks from the transport selected in pubsub_config."""
+    
+    # Transport (memory, redis, kafka or msk) from the FastAgent config
+    pubsub_config = sample_json_config["pubsub_config"]
+    transport = create_transport(
+        pubsub_config,
+        num_partitions=runtime_config.get("num_partitions", 1),
+        replication_factor=runtime_config.get("replication_factor", 1),
+        consumer_group=runtime_config.get("consumer_group", "mcp_agent_consumer"),
+        group_instance_id=runtime_config.get("group_instance_id")
+    )
+    channel = transport.resolve_channel(pubsub_config["channel_name"])
+    
+    # supervisorctl stop sends SIGTERM: unwind through the cleanup below instead of dying mid-task
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
     
     # Register agents and keep it running
     async with fast.run() as agent:        
+        pool = None
+        replies = None
         try:
+            if lazy_mcp:
+                lazy_mcp.start()
+            await transport.start()
+            
+            # Results go back to each request's reply channel through one long-lived producer
+            if runtime_config.get("publish_replies", True):
+                replies = ReplyPublisher(
+                    transport,
+                    agent_name="PLACEHOLDER_AGENT_NAME",
+                    default_channel_name=pubsub_config["channel_name"],
+                    linger_ms=runtime_config.get("reply_linger_ms", 5)
+                )
+                replies.start()
+            
             # PLACEHOLDER_INITIAL_TASK - This will be replaced with initial task if provided
             # PLACEHOLDER_INITIAL_TASK_EXECUTION - This will be replaced with task execution if provided
             
-            # Keep running and listen for MSK messages
-            logger.info("Starting to listen for MSK messages...")
-            async for message in consumer:
-                try:
-                    # Process the message data
-                    if message.value:
-                        logger.info(f"Received message: {message.value}")
-                        
-                        # If this is a user message, extract content and send to orchestrator
-                        if isinstance(message.value, dict) and message.value.get('type') == 'user' and 'content' in message.value:
-                            user_input = message.value['content']
-                            logger.info(f"Processing user input: {user_input}")
-                            
-                            # Send to orchestrator instead of individual agent
-                            response = await agent.orchestrate(user_input)
-                            
-                        elif isinstance(message.value, str):
-                            # Try to parse as JSON first
-                            try:
-                                data_obj = json.loads(message.value)
-                                if data_obj.get('type') == 'user' and 'content' in data_obj:
-                                    user_input = data_obj['content']
-                                    logger.info(f"Processing user input from JSON: {user_input}")
-                                    response = await agent.orchestrate(user_input)
-                                else:
-                                    # Process as plain text
-                                    response = await agent.orchestrate(message.value)
-                            except json.JSONDecodeError:
-                                # Process as plain text
-                                response = await agent.orchestrate(message.value)
-                                
-                except Exception as e:
-                    logger.error(f"Error processing message: {e}")
-                    import traceback
-                    traceback.print_exc()
+            # Each assigned partition gets its own worker: ordering is kept
+            # within a partition while partitions are processed in parallel
+            pool = PartitionWorkerPool(
+                handler=lambda message: handle_message(agent, message, replies),
+                max_pending=runtime_config.get("max_pending_per_partition", 100),
+                on_processed=lambda partition, message: transport.ack(message),
+                on_pause=transport.pause,
+                on_resume=transport.resume
+            )
+            # Taken before subscribing: a scale-to-zero dispatcher replays the Redis messages it got before then
+            subscribed_at = time.time()
+            await transport.subscribe(channel, on_assign=pool.assign, on_revoke=pool.revoke)
+            
+            # Keep running and listen for messages; the manager times cold starts up to agent_ready
+            logger.info("Agent ready", extra={
+                "event": "agent_ready", "startup_ms": round((time.perf_counter() - process_started) * 1000, 1),
+                "subscribed_at": subscribed_at
+            })
+            logger.info(f"Starting to listen for {transport.backend} messages on '{channel}'...")
+            await consume_messages(transport, pool)
                 
         finally:
-            # Clean up MSK consumer
-            logger.info("Stopping MSK consumer...")
-            await consumer.stop()
+            # Stop workers before the transport so in-flight messages can be acknowledged
+            if pool:
+                await pool.close()
+            if sessions:
+                logger.info("Saving sessions", extra={"event": "sessions", **sessions.stats()})
+                await sessions.close(agent)
+            if replies:
+                await replies.close()
+            if result_cache:
+                await result_cache.close()
+            if plan_cache:
+                await plan_cache.close()
+            if lazy_mcp:
+                await lazy_mcp.close()
+            if dedup:
+                await dedup.close()
+            logger.info("Route latency", extra={"event": "routes", "routes": router.summary()})
+            if tool_cache:
+                logger.info("MCP tool cache stats", extra={"event": "tool_cache", **tool_cache.stats()})
+                await tool_cache.close()
+            logger.info(f"Stopping {transport.backend} transport...")
+            await transport.close()
 
 if __name__ == "__main__":
     try:
         asyncio.run(main())
-    except KeyboardInterrupt:
-        pass
\ No newline at end of file
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        pass
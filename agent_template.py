@@ -1,11 +1,11 @@
 import asyncio
-import json
 from typing import Dict, List
 import os
 from mcp_agent.core.fastagent import FastAgent
 from dotenv import load_dotenv
 load_dotenv()
-import redis.asyncio as aioredis
+
+from transports import create_transport
 
 # PLACEHOLDER_SUBAGENTS_CONFIG - This will be replaced with actual subagents configuration
 subagents_config = []
@@ -75,64 +75,53 @@ async def orchestrate_task():
 async def main():
     """Test initializing FastAgent with JSON config in interactive mode."""
     
-    # Create Redis client
-    redis_client = aioredis.Redis(
-        host="localhost",
-        port=6379,
-        db=0,
-        decode_responses=True
-    )
+    # Defaults to Redis pub/sub on agent:PLACEHOLDER_AGENT_NAME when no pubsub_config is given
+    pubsub_config = sample_json_config.get("pubsub_config") or {
+        "backend": "redis",
+        "channel_name": "PLACEHOLDER_AGENT_NAME"
+    }
+    transport = create_transport(pubsub_config)
+    channel = transport.resolve_channel(pubsub_config.get("channel_name", "PLACEHOLDER_AGENT_NAME"))
     
     # Register agents and keep it running
     async with fast.run() as agent:        
         try:
             # Subscribe to the input channel
-            pubsub = redis_client.pubsub()
-            await pubsub.subscribe("agent:PLACEHOLDER_AGENT_NAME")
+            await transport.start()
+            await transport.subscribe(channel)
             
             # PLACEHOLDER_INITIAL_TASK - This will be replaced with initial task if provided
             # PLACEHOLDER_INITIAL_TASK_EXECUTION - This will be replaced with task execution if provided
             
-            # Keep running and listen for Redis messages
+            # Keep running and listen for messages
             while True:
-                # Process Redis messages directly
-                message = await pubsub.get_message(ignore_subscribe_messages=True)
-                if message and message.get('type') == 'message':
+                for message in await transport.receive_batch(timeout_ms=1000):
                     try:
-                        # Process the message data
-                        data = message.get('data')
-                        if isinstance(data, bytes):
-                            data = data.decode('utf-8')
+                        data_obj = message.value
                         
-                        # Try to parse JSON
-                        try:
-                            data_obj = json.loads(data)
-                            
-                            # If this is a user message, extract content and send to orchestrator
+                        # If this is a user message, extract content and send to orchestrator
+                        if isinstance(data_obj, dict):
                             if data_obj.get('type') == 'user' and 'content' in data_obj:
                                 user_input = data_obj['content']
                                 
                                 # Send to orchestrator instead of individual agent
                                 response = await agent.orchestrate(user_input)
-                                
-                        except json.JSONDecodeError:
+                        elif data_obj:
                             # Try to process as plain text
-                            response = await agent.orchestrate(data)
+                            response = await agent.orchestrate(str(data_obj))
+                        
+                        await transport.ack(message)
                             
                     except Exception as e:
                         import traceback
-                
-                # Small delay to prevent CPU spike
-                await asyncio.sleep(0.05)
+                        traceback.print_exc()
                 
         finally:
-            # Clean up Redis connection
-            if 'pubsub' in locals():
-                await pubsub.unsubscribe("agent:PLACEHOLDER_AGENT_NAME")
-            await redis_client.close()
+            # Clean up transport connection
+            await transport.close()
 
 if __name__ == "__main__":
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
-        pass
\ No newline at end of file
+        pass
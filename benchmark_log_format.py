@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark of the log formats behind headless mode.
+
+The panels fast-agent rendered into an existing agent log (agents/all.log by
+default) are extracted and measured against a synthetic structured event of
+the shape headless mode writes per orchestration. When rich is installed, the
+extracted panels are also re-rendered off-screen and timed against formatting
+that event. No agent is run: this compares the two output formats, not
+orchestrate_with_events against an orchestration with console rendering, so
+model calls, tool calls and fast-agent's own logging are not included.
+"""
+
+import io
+import logging
+import os
+import re
+import sys
+import time
+
+from structured_logging import JSONLineFormatter
+
+LOG_PATH = os.environ.get('BENCH_LOG', 'agents/all.log')
+# Orchestrations recorded in the log (all.log holds a single three-step run)
+ORCHESTRATIONS = int(os.environ.get('BENCH_ORCHESTRATIONS', '1'))
+ROUNDS = int(os.environ.get('BENCH_ROUNDS', '20'))
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+TITLE_PATTERN = re.compile(r'^╭─*\s*(.*?)\s*─*╮$')
+
+
+def extract_panels(lines):
+    """
+    Split a log into rendered panels. Returns a list of (title, body_lines,
+    rendered_text); lines outside panels are ignored.
+    """
+    panels = []
+    current = None
+    for line in lines:
+        if current is None:
+            match = TITLE_PATTERN.match(line)
+            if match:
+                current = (match.group(1), [], [line])
+            continue
+        current[2].append(line)
+        if line.startswith('╰'):
+            panels.append((current[0], current[1], ''.join(current[2])))
+            current = None
+        else:
+            current[1].append(line.strip().strip('│').strip())
+    return panels
+
+
+def headless_event(panels):
+    """A synthetic event shaped like the line headless mode writes for one orchestration"""
+    record = logging.LogRecord("headless", logging.INFO, __file__, 0, "orchestration finished", None, None)
+    response = panels[-1][1] if panels else []
+    record.__dict__.update({
+        "event": "orchestration",
+        "status": "ok",
+        "duration_ms": 0.0,
+        "cpu_ms": 0.0,
+        "task_chars": len(' '.join(panels[0][1])) if panels else 0,
+        "response_chars": len(' '.join(response)),
+        "partition": "0",
+    })
+    formatter = JSONLineFormatter({"agent": "bench"})
+    return formatter, record
+
+
+def time_rich_rendering(panels, rounds):
+    """CPU seconds to render every panel rounds times, or None without rich"""
+    try:
+        from rich.console import Console
+        from rich.markdown import Markdown
+        from rich.panel import Panel
+    except ImportError:
+        return None
+    started = time.process_time()
+    for _ in range(rounds):
+        console = Console(file=io.StringIO(), width=80, force_terminal=False)
+        for title, body, _ in panels:
+            console.print(Panel(Markdown('\n'.join(body)), title=title))
+    return time.process_time() - started
+
+
+def main():
+    if not os.path.exists(LOG_PATH):
+        logger.error(f"Log file {LOG_PATH} not found (set BENCH_LOG)")
+        return 1
+    with open(LOG_PATH, encoding='utf-8') as f:
+        lines = f.readlines()
+
+    panels = extract_panels(lines)
+    if not panels:
+        logger.error(f"No rendered panels found in {LOG_PATH}")
+        return 1
+    panel_bytes = sum(len(text.encode('utf-8')) for _, _, text in panels)
+
+    formatter, record = headless_event(panels)
+    event_bytes = len(formatter.format(record).encode('utf-8')) + 1
+    started = time.process_time()
+    for _ in range(ROUNDS):
+        formatter.format(record)
+    event_cpu = (time.process_time() - started) / ROUNDS
+
+    logger.info(f"{LOG_PATH}: {len(lines)} lines, {len(panels)} panels, {panel_bytes} bytes of panels")
+    logger.info(f"Per orchestration: panels {panel_bytes / ORCHESTRATIONS:.0f} bytes, "
+                f"headless event {event_bytes} bytes "
+                f"({panel_bytes / ORCHESTRATIONS / event_bytes:.0f}x smaller)")
+
+    render_cpu = time_rich_rendering(panels, ROUNDS)
+    if render_cpu is None:
+        logger.info("rich is not installed; skipping the rendering CPU comparison")
+    else:
+        render_ms = render_cpu / ROUNDS / ORCHESTRATIONS * 1000
+        logger.info(f"CPU per orchestration: rich rendering {render_ms:.2f} ms, "
+                    f"headless event {event_cpu * 1000:.3f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
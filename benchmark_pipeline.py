@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Benchmark the agent message pipeline in a single process using the in-memory
+transport: publish -> receive_batch -> per-partition workers -> ack.
+
+The orchestrator is replaced by a stub that sleeps for BENCH_HANDLER_MS, so
+the numbers show the runtime overhead without any broker or LLM.
+"""
+
+import asyncio
+import logging
+import os
+import time
+
+from partition_workers import PartitionWorkerPool
+from transports import MemoryBroker, MemoryTransport
+
+NUM_MESSAGES = int(os.environ.get('BENCH_MESSAGES', '20000'))
+HANDLER_MS = float(os.environ.get('BENCH_HANDLER_MS', '0'))
+CONTENT_TYPE = os.environ.get('BENCH_CONTENT_TYPE', 'json')
+BATCH_SIZE = int(os.environ.get('BENCH_BATCH_SIZE', '100'))
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+async def run_benchmark(num_messages=NUM_MESSAGES, handler_ms=HANDLER_MS,
+                        content_type=CONTENT_TYPE, batch_size=BATCH_SIZE):
+    """
+    Push num_messages through the pipeline and return (elapsed seconds, bytes received)
+    """
+    broker = MemoryBroker()
+    config = {"backend": "memory", "channel_name": "bench", "content_type": content_type}
+    consumer_side = MemoryTransport(config, broker=broker, max_queue=num_messages)
+    producer_side = MemoryTransport(config, broker=broker)
+
+    done = asyncio.Event()
+    processed = 0
+    received_bytes = 0
+
+    async def handler(message):
+        nonlocal processed
+        if handler_ms:
+            await asyncio.sleep(handler_ms / 1000)
+        processed += 1
+        if processed == num_messages:
+            done.set()
+
+    pool = PartitionWorkerPool(handler, max_pending=batch_size * 10,
+                               on_processed=lambda partition, message: consumer_side.ack(message))
+    await consumer_side.subscribe("bench", on_assign=pool.assign, on_revoke=pool.revoke)
+
+    async def consume():
+        nonlocal received_bytes
+        while not done.is_set():
+            for message in await consumer_side.receive_batch(max_records=batch_size, timeout_ms=100):
+                received_bytes += message.size
+                pool.submit(message.partition, message)
+
+    started = time.perf_counter()
+    consume_task = asyncio.create_task(consume())
+    for i in range(num_messages):
+        await producer_side.publish("bench", {
+            "type": "user",
+            "content": f"tell me price of polygon #{i}",
+            "channel_id": "agent:bench",
+            "metadata": {"model": "haiku", "name": "default"}
+        })
+    await done.wait()
+    elapsed = time.perf_counter() - started
+
+    consume_task.cancel()
+    try:
+        await consume_task
+    except asyncio.CancelledError:
+        pass
+    await pool.close()
+    await consumer_side.close()
+    return elapsed, received_bytes
+
+async def main():
+    """
+    Main async function
+    """
+    logger.info("In-memory agent pipeline benchmark")
+    logger.info("=" * 40)
+    elapsed, received_bytes = await run_benchmark()
+    logger.info(f"Messages: {NUM_MESSAGES} ({CONTENT_TYPE}, {received_bytes} bytes on the wire)")
+    logger.info(f"Elapsed: {elapsed:.3f}s -> {NUM_MESSAGES / elapsed:.0f} msg/s, "
+                f"{elapsed / NUM_MESSAGES * 1e6:.1f} µs/msg")
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        logger.info("Benchmark interrupted by user")
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Measure how long other agents stall when one agent restarts, per consumer group layout.
+
+BENCH_AGENTS consumers each read their own topic while a producer writes to
+every topic at BENCH_RATE messages per second. After a warm-up, the first
+consumer is stopped and started again BENCH_RESTART_DELAY seconds later (as
+supervisord would restart an agent). The longest gap between messages seen
+by each of the other consumers around the restart is their pause. Layouts:
+
+- shared: one group for all agents (the old "mcp_agent_consumer" default),
+  so leaving and rejoining rebalances every agent
+- per-agent: one group per agent
+- static: one group per agent plus a group_instance_id, so the restarted
+  agent rejoins without a rebalance
+
+Needs a Kafka broker (BENCH_BOOTSTRAP, PLAINTEXT); topics are created with
+the bench_rebalance_ prefix.
+"""
+
+import asyncio
+import logging
+import os
+import statistics
+import sys
+import time
+import uuid
+
+from kafka_transport import KafkaTransport
+
+BOOTSTRAP = os.environ.get('BENCH_BOOTSTRAP', 'localhost:9092').split(',')
+NUM_AGENTS = int(os.environ.get('BENCH_AGENTS', '4'))
+RATE = float(os.environ.get('BENCH_RATE', '50'))
+WARMUP_SECONDS = float(os.environ.get('BENCH_WARMUP', '10'))
+RESTART_DELAY = float(os.environ.get('BENCH_RESTART_DELAY', '2'))
+# Seconds after the restart during which gaps are counted
+WINDOW_SECONDS = float(os.environ.get('BENCH_WINDOW', '30'))
+SESSION_TIMEOUT_MS = int(os.environ.get('BENCH_SESSION_TIMEOUT_MS', '30000'))
+LAYOUTS = os.environ.get('BENCH_LAYOUTS', 'shared,per-agent,static').split(',')
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+logging.getLogger('aiokafka').setLevel(logging.WARNING)
+logging.getLogger('kafka_transport').setLevel(logging.WARNING)
+
+
+def pubsub_config():
+    return {
+        "backend": "kafka",
+        "channel_name": "bench",
+        "kafka": {
+            "bootstrap_servers": BOOTSTRAP,
+            "topic_prefix": "bench_rebalance_",
+            "consumer_config": {"auto_offset_reset": "latest", "session_timeout_ms": SESSION_TIMEOUT_MS},
+        },
+    }
+
+
+class BenchAgent:
+    """One consumer reading its own topic and recording when messages arrive"""
+
+    def __init__(self, index: int, layout: str, run_id: str):
+        self.index = index
+        self.options = {"consumer_group": f"bench_{run_id}_shared"}
+        if layout != "shared":
+            self.options["consumer_group"] = f"bench_{run_id}_{index}"
+        if layout == "static":
+            self.options["group_instance_id"] = f"bench_{run_id}_{index}"
+        self.channel = f"bench_rebalance_{run_id}_{index}"
+        self.arrivals = []
+        self.transport = None
+        self.task = None
+
+    async def start(self):
+        self.transport = KafkaTransport(pubsub_config(), **self.options)
+        await self.transport.start()
+        await self.transport.subscribe(self.channel)
+        self.task = asyncio.create_task(self._consume())
+
+    async def _consume(self):
+        while True:
+            for message in await self.transport.receive_batch(max_records=500, timeout_ms=100):
+                self.arrivals.append(time.monotonic())
+                await self.transport.ack(message)
+
+    async def stop(self):
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        await self.transport.close()
+
+    def max_gap(self, start: float, end: float) -> float:
+        """Longest stretch without a message between start and end"""
+        times = [start] + [t for t in self.arrivals if start < t < end] + [min(end, time.monotonic())]
+        return max(b - a for a, b in zip(times, times[1:]))
+
+
+async def produce(producer, channels, stop: asyncio.Event):
+    interval = 1 / RATE
+    while not stop.is_set():
+        started = time.monotonic()
+        await producer.publish_many([(channel, {"sent": time.time()}, None) for channel in channels])
+        await asyncio.sleep(max(0.0, interval - (time.monotonic() - started)))
+
+
+async def run_layout(layout: str) -> dict:
+    run_id = uuid.uuid4().hex[:8]
+    agents = [BenchAgent(i, layout, run_id) for i in range(NUM_AGENTS)]
+    for agent in agents:
+        await agent.start()
+    producer = KafkaTransport(pubsub_config())
+    await producer.start()
+    await producer.warm()
+    stop = asyncio.Event()
+    producer_task = asyncio.create_task(produce(producer, [agent.channel for agent in agents], stop))
+    try:
+        await asyncio.sleep(WARMUP_SECONDS)
+        restarted, others = agents[0], agents[1:]
+        baseline = max(agent.max_gap(time.monotonic() - WARMUP_SECONDS / 2, time.monotonic()) for agent in others)
+
+        restart_at = time.monotonic()
+        await restarted.stop()
+        await asyncio.sleep(RESTART_DELAY)
+        await restarted.start()
+        rejoined_at = time.monotonic()
+        await asyncio.sleep(WINDOW_SECONDS)
+
+        end = time.monotonic()
+        pauses = [agent.max_gap(restart_at, end) for agent in others]
+        resumed = next((t for t in restarted.arrivals if t > rejoined_at), None)
+        return {
+            "layout": layout,
+            "baseline_gap_ms": baseline * 1000,
+            "max_pause_ms": max(pauses) * 1000,
+            "median_pause_ms": statistics.median(pauses) * 1000,
+            "restarted_resume_ms": (resumed - rejoined_at) * 1000 if resumed else None,
+        }
+    finally:
+        stop.set()
+        await producer_task
+        await producer.close()
+        for agent in agents:
+            if agent.task is not None and not agent.task.done():
+                await agent.stop()
+
+
+async def main():
+    logger.info(f"Rebalance pause benchmark: {NUM_AGENTS} agents, {RATE:.0f} msg/s each, "
+                f"restart delay {RESTART_DELAY}s, session timeout {SESSION_TIMEOUT_MS}ms")
+    logger.info("=" * 40)
+    for layout in LAYOUTS:
+        result = await run_layout(layout)
+        resume = f"{result['restarted_resume_ms']:.0f} ms" if result["restarted_resume_ms"] is not None else "no messages"
+        logger.info(f"{layout:>9}: other agents paused max {result['max_pause_ms']:.0f} ms, "
+                    f"median {result['median_pause_ms']:.0f} ms (baseline gap {result['baseline_gap_ms']:.0f} ms); "
+                    f"restarted agent resumed after {resume}")
+    return 0
+
+
+if __name__ == "__main__":
+    try:
+        sys.exit(asyncio.run(main()))
+    except KeyboardInterrupt:
+        logger.info("Benchmark interrupted by user")
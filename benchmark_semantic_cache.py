@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Check the semantic cache's built-in embedder against known request pairs.
+
+Rephrasings of the same request must hit the cache, and near misses (same
+wording, different chain, time window, amount or parties) must not. Each
+pair is scored with the embedder, then looked up in a SemanticCache with the
+default settings. Exits non-zero if any pair gets the wrong outcome.
+"""
+
+import asyncio
+import logging
+import sys
+
+import numpy as np
+
+from semantic_cache import SemanticCache, hashed_ngram_embedding
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Same request, different phrasing: should be answered from the cache
+REPHRASINGS = [
+    ("tell me price of polygon", "polygon price now"),
+    ("tell me price of polygon", "What is the price of polygon?"),
+    ("what is the price of bitcoin?", "bitcoin price"),
+    ("what's the current price of ethereum", "price of ethereum please"),
+]
+# Different request with nearly the same wording: must not be answered from the cache
+NEAR_MISSES = [
+    ("what is the current price of ETH on polygon over the last week",
+     "what is the current price of ETH on solana over the last week"),
+    ("show me the average daily trading volume of uniswap on ethereum over the last week",
+     "show me the average daily trading volume of uniswap on ethereum over the last month"),
+    ("send 5 eth from alice to bob", "send 5 eth from bob to alice"),
+    ("send 5 eth to bob", "send 6 eth to bob"),
+    ("swap usdc for eth", "swap eth for usdc"),
+]
+
+
+def similarity(first: str, second: str) -> float:
+    vectors = hashed_ngram_embedding([first, second])
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return float(vectors[0] @ vectors[1])
+
+
+async def check(pairs, expect_hit: bool) -> int:
+    """Number of pairs whose lookup outcome is not expect_hit"""
+    failures = 0
+    for cached, asked in pairs:
+        cache = SemanticCache()
+        await cache.add(cached, "cached answer")
+        hit = await cache.lookup(asked) is not None
+        if hit != expect_hit:
+            failures += 1
+        logger.info(f"{'ok  ' if hit == expect_hit else 'FAIL'} {'hit ' if hit else 'miss'} "
+                    f"similarity {similarity(cached, asked):.3f}: {cached!r} / {asked!r}")
+    return failures
+
+async def main():
+    """
+    Main async function
+    """
+    logger.info(f"Semantic cache check (threshold {SemanticCache().threshold})")
+    logger.info("=" * 40)
+    failures = await check(REPHRASINGS, expect_hit=True)
+    failures += await check(NEAR_MISSES, expect_hit=False)
+    logger.info(f"{failures} of {len(REPHRASINGS) + len(NEAR_MISSES)} pairs failed")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
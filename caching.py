@@ -0,0 +1,143 @@
+"""
+Building blocks for the agent runtime caches.
+
+- TTLCache: in-process LRU with per-entry expiry
+- RedisStore: optional shared tier, so agents on a host share entries
+- Coalescer: concurrent callers of the same key share one in-flight call
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Dict
+
+logger = logging.getLogger(__name__)
+
+
+class TTLCache:
+    """Least-recently-used cache whose entries also expire after their TTL"""
+
+    def __init__(self, max_entries: int = 1000):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        """Cached value, or None if missing or expired"""
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return value
+
+    def set(self, key, value, ttl: float):
+        self.entries[key] = (value, time.monotonic() + ttl)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def pop(self, key):
+        entry = self.entries.pop(key, None)
+        return entry[0] if entry else None
+
+    def __len__(self):
+        return len(self.entries)
+
+
+def redis_settings(json_config: Dict = None) -> Dict:
+    """Redis connection for caches: the agent's pubsub_config["redis"], else REDIS_HOST/REDIS_PORT"""
+    redis_config = ((json_config or {}).get("pubsub_config") or {}).get("redis") or {}
+    return {
+        "host": redis_config.get("host", os.environ.get("REDIS_HOST", "localhost")),
+        "port": int(redis_config.get("port", os.environ.get("REDIS_PORT", 6379))),
+        "db": redis_config.get("db", 0),
+    }
+
+
+class RedisStore:
+    """
+    JSON values in Redis under a key prefix. Redis errors are logged and
+    treated as misses so a cache outage never fails a request.
+    """
+
+    def __init__(self, prefix: str, host: str = "localhost", port: int = 6379, db: int = 0):
+        self.prefix = prefix
+        self.host = host
+        self.port = port
+        self.db = db
+        self.client = None
+
+    def _client(self):
+        if self.client is None:
+            import redis.asyncio as aioredis
+            self.client = aioredis.Redis(host=self.host, port=self.port, db=self.db)
+        return self.client
+
+    async def get(self, key):
+        try:
+            data = await self._client().get(self.prefix + key)
+        except Exception as e:
+            logger.warning(f"Redis cache read failed: {e}")
+            return None
+        return json.loads(data) if data is not None else None
+
+    async def get_with_ttl(self, key):
+        """(value, seconds until it expires in Redis), or (None, 0) on a miss"""
+        try:
+            pipeline = self._client().pipeline(transaction=False)
+            pipeline.get(self.prefix + key)
+            pipeline.pttl(self.prefix + key)
+            data, pttl = await pipeline.execute()
+        except Exception as e:
+            logger.warning(f"Redis cache read failed: {e}")
+            return None, 0
+        if data is None:
+            return None, 0
+        return json.loads(data), max(pttl, 0) / 1000
+
+    async def set(self, key, value, ttl: float):
+        try:
+            await self._client().set(self.prefix + key, json.dumps(value, default=str), px=max(1, int(ttl * 1000)))
+        except Exception as e:
+            logger.warning(f"Redis cache write failed: {e}")
+
+    async def close(self):
+        if self.client:
+            await self.client.close()
+            self.client = None
+
+
+class Coalescer:
+    """Runs one call per key at a time; concurrent callers await the same result"""
+
+    def __init__(self):
+        self.in_flight = {}
+
+    def pending(self, key) -> bool:
+        return key in self.in_flight
+
+    async def run(self, key, factory):
+        """
+        Await factory() for key, or the call already running for it.
+        Returns (result, shared) where shared is True for callers that joined.
+        """
+        future = self.in_flight.get(key)
+        if future is not None:
+            # shield: a cancelled waiter must not cancel the shared call
+            return await asyncio.shield(future), True
+        future = asyncio.ensure_future(factory())
+        self.in_flight[key] = future
+        try:
+            return await asyncio.shield(future), False
+        finally:
+            if future.done():
+                self.in_flight.pop(key, None)
+            else:
+                # The leader was cancelled; drop the entry once the call finishes
+                future.add_done_callback(lambda _: self.in_flight.pop(key, None))
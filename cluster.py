@@ -0,0 +1,251 @@
+"""
+Cluster mode for agent_manager: several manager/worker containers sharing one Redis.
+
+Every node registers itself in Redis (id, URL, capacity weight) and
+refreshes a heartbeat timestamp there. A user's agents live on one node. That node is picked by
+consistent hashing of the username over the live nodes, with virtual nodes in
+proportion to each node's weight, and pinned in Redis when the user's first
+agent is created. Requests for a user's agents that reach another replica are
+forwarded to the owning node over HTTP.
+
+Adding a container adds ring capacity for new users. Existing users are moved
+with move_user: the target node creates (and starts) the agents before the
+placement flips and the source stops its copies, so consumers overlap
+instead of leaving a gap. Draining a node moves all of its users away.
+
+Enabled by CLUSTER_REDIS_HOST; NODE_ID, NODE_URL and NODE_WEIGHT describe
+this node.
+"""
+
+import asyncio
+import bisect
+import hashlib
+import json
+import logging
+import os
+import socket
+import time
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "agent_cluster:"
+NODES_KEY = KEY_PREFIX + "nodes"
+PLACEMENT_KEY = KEY_PREFIX + "placement"
+HEARTBEAT_INTERVAL = float(os.environ.get('CLUSTER_HEARTBEAT_INTERVAL', '5'))
+# A node whose heartbeat is this old is treated as down
+HEARTBEAT_TTL = float(os.environ.get('CLUSTER_HEARTBEAT_TTL', '15'))
+VIRTUAL_NODES = 64
+# Marks requests already forwarded by a replica, so they are served where they land
+FORWARDED_HEADER = "x-cluster-forwarded"
+HOP_BY_HOP_HEADERS = {"connection", "keep-alive", "transfer-encoding", "te", "upgrade", "host", "content-length"}
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """Consistent hash ring with virtual nodes in proportion to each node's weight"""
+
+    def __init__(self, weights: Dict[str, float], virtual_nodes: int = VIRTUAL_NODES):
+        points = []
+        for node_id, weight in weights.items():
+            for replica in range(max(1, round(virtual_nodes * weight))):
+                points.append((_hash(f"{node_id}#{replica}"), node_id))
+        points.sort()
+        self.hashes = [point for point, _ in points]
+        self.nodes = [node_id for _, node_id in points]
+
+    def lookup(self, key: str) -> Optional[str]:
+        if not self.hashes:
+            return None
+        index = bisect.bisect(self.hashes, _hash(key)) % len(self.hashes)
+        return self.nodes[index]
+
+
+class Cluster:
+    """This node's membership in the cluster, plus placement and request forwarding"""
+
+    def __init__(self, node_id: str, url: str, weight: float = 1.0, redis_config: Dict = None):
+        self.node_id = node_id
+        self.url = url.rstrip("/")
+        self.weight = weight
+        self.redis_config = redis_config or {}
+        self.client = None
+        self.http = None
+        self.heartbeat_task = None
+        self.draining = False
+        self._nodes = {}
+        self._nodes_at = 0.0
+        self._ring = HashRing({})
+
+    @classmethod
+    def from_env(cls, port: int = 8080):
+        """Cluster membership configured by the environment, or None for a single-node manager"""
+        host = os.environ.get('CLUSTER_REDIS_HOST')
+        if not host:
+            return None
+        node_id = os.environ.get('NODE_ID', socket.gethostname())
+        return cls(
+            node_id,
+            os.environ.get('NODE_URL', f"http://{socket.gethostname()}:{port}"),
+            float(os.environ.get('NODE_WEIGHT', '1')),
+            {
+                "host": host,
+                "port": int(os.environ.get('CLUSTER_REDIS_PORT', '6379')),
+                "db": int(os.environ.get('CLUSTER_REDIS_DB', '0')),
+            }
+        )
+
+    async def start(self):
+        import httpx
+        import redis.asyncio as aioredis
+        self.client = aioredis.Redis(**self.redis_config, decode_responses=True)
+        self.http = httpx.AsyncClient(timeout=httpx.Timeout(30.0, read=None))
+        await self._register()
+        self.heartbeat_task = asyncio.create_task(self._heartbeat_loop(), name="cluster-heartbeat")
+        logger.info(f"Joined cluster as '{self.node_id}' ({self.url}, weight {self.weight})", extra={
+            "event": "cluster_join", "node": self.node_id
+        })
+
+    def _info(self) -> Dict:
+        return {"url": self.url, "weight": self.weight, "draining": self.draining, "heartbeat": time.time()}
+
+    async def _register(self):
+        await self.client.hset(NODES_KEY, self.node_id, json.dumps(self._info()))
+
+    async def _heartbeat_loop(self):
+        while True:
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+            try:
+                await self._register()
+            except Exception as e:
+                logger.warning(f"Cluster heartbeat failed: {e}")
+
+    async def nodes(self, refresh: bool = False) -> Dict[str, Dict]:
+        """Live nodes by id, cached for one heartbeat interval"""
+        if refresh or time.monotonic() - self._nodes_at > HEARTBEAT_INTERVAL:
+            now = time.time()
+            nodes = {}
+            for node_id, data in (await self.client.hgetall(NODES_KEY)).items():
+                info = json.loads(data)
+                if now - info.get("heartbeat", 0) <= HEARTBEAT_TTL:
+                    nodes[node_id] = info
+            self._nodes = nodes
+            self._nodes_at = time.monotonic()
+            self._ring = HashRing({
+                node_id: info.get("weight", 1.0) for node_id, info in nodes.items() if not info.get("draining")
+            })
+        return self._nodes
+
+    async def ring_owner(self, username: str) -> Optional[str]:
+        """Node the ring assigns a user to, ignoring existing placements"""
+        await self.nodes()
+        return self._ring.lookup(username)
+
+    async def owner(self, username: str, pin: bool = False) -> str:
+        """
+        Node holding a user's agents: its pinned placement, else the ring's
+        choice (pinned when pin is set, i.e. when an agent is created)
+        """
+        node_id = await self.client.hget(PLACEMENT_KEY, username)
+        if node_id:
+            return node_id
+        node_id = await self.ring_owner(username) or self.node_id
+        if pin and await self.client.hsetnx(PLACEMENT_KEY, username, node_id) == 0:
+            # Another replica pinned the user first
+            node_id = await self.client.hget(PLACEMENT_KEY, username)
+        return node_id
+
+    async def place(self, username: str, node_id: str):
+        await self.client.hset(PLACEMENT_KEY, username, node_id)
+
+    async def unplace(self, username: str):
+        await self.client.hdel(PLACEMENT_KEY, username)
+
+    async def node_url(self, node_id: str) -> Optional[str]:
+        info = (await self.nodes()).get(node_id) or (await self.nodes(refresh=True)).get(node_id)
+        return info["url"] if info else None
+
+    async def users(self, node_id: str = None) -> List[str]:
+        """Users placed on a node (this one by default)"""
+        node_id = node_id or self.node_id
+        return [user for user, owner in (await self.client.hgetall(PLACEMENT_KEY)).items() if owner == node_id]
+
+    async def set_draining(self, draining: bool):
+        self.draining = draining
+        await self._register()
+        await self.nodes(refresh=True)
+
+    async def request(self, node_id: str, method: str, path: str, **kwargs):
+        """Call another node's API; raises ConnectionError when the node is not live"""
+        url = await self.node_url(node_id)
+        if url is None:
+            raise ConnectionError(f"Cluster node '{node_id}' is not available")
+        headers = {**kwargs.pop("headers", {}), FORWARDED_HEADER: self.node_id}
+        try:
+            return await self.http.request(method, url + path, headers=headers, **kwargs)
+        except self._transport_errors() as e:
+            raise ConnectionError(f"Cluster node '{node_id}' did not answer: {e}") from e
+
+    async def forward(self, node_id: str, request, body: bytes):
+        """Proxy a FastAPI request to node_id, streaming the response back"""
+        from fastapi.responses import StreamingResponse
+
+        url = await self.node_url(node_id)
+        if url is None:
+            raise ConnectionError(f"Cluster node '{node_id}' is not available")
+        headers = {k: v for k, v in request.headers.items() if k.lower() not in HOP_BY_HOP_HEADERS}
+        headers[FORWARDED_HEADER] = self.node_id
+        try:
+            upstream = await self.http.send(self.http.build_request(
+                request.method, url + request.url.path, params=request.query_params, headers=headers, content=body
+            ), stream=True)
+        except self._transport_errors() as e:
+            raise ConnectionError(f"Cluster node '{node_id}' did not answer: {e}") from e
+        response_headers = {k: v for k, v in upstream.headers.items() if k.lower() not in HOP_BY_HOP_HEADERS}
+        response_headers["x-cluster-node"] = node_id
+        return StreamingResponse(
+            upstream.aiter_raw(), status_code=upstream.status_code, headers=response_headers,
+            background=_Close(upstream)
+        )
+
+    @staticmethod
+    def _transport_errors():
+        import httpx
+        return httpx.TransportError
+
+    async def status(self) -> Dict:
+        nodes = await self.nodes(refresh=True)
+        placement = await self.client.hgetall(PLACEMENT_KEY)
+        users = {}
+        for owner in placement.values():
+            users[owner] = users.get(owner, 0) + 1
+        return {
+            "node": self.node_id,
+            "nodes": {node_id: {**info, "users": users.get(node_id, 0)} for node_id, info in nodes.items()},
+            "users": len(placement),
+        }
+
+    async def close(self):
+        if self.heartbeat_task:
+            self.heartbeat_task.cancel()
+        if self.client:
+            try:
+                await self.client.hdel(NODES_KEY, self.node_id)
+            except Exception as e:
+                logger.warning(f"Failed to leave cluster: {e}")
+            await self.client.close()
+        if self.http:
+            await self.http.aclose()
+
+
+class _Close:
+    """Background task closing a streamed upstream response"""
+
+    def __init__(self, response):
+        self.response = response
+
+    async def __call__(self):
+        await self.response.aclose()
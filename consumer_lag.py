@@ -0,0 +1,202 @@
+"""
+Consumer lag of each Kafka / MSK agent on its topic.
+
+Every refresh interval the manager compares each agent's committed offsets
+with the high watermarks of its topic. Queries go through the shared
+producer transport of each broker (one admin client and one offsets consumer
+per broker), and are batched: one metadata and one end-offset request for
+all topics of a broker, one offset fetch per consumer group. API calls read
+the cached result.
+
+A partition the agent's group has never committed (every new per-agent
+group starts that way) lags from where the group's auto_offset_reset
+starts it: the log start offset for "earliest", and for "latest" the end
+offset when the monitor first saw the partition without a commit.
+
+A short history per agent gives the lag trend: how fast lag grows or
+shrinks, the consume and produce rates behind it, and the time to drain
+at the current rate. These are the inputs for scaling an agent out (more
+partitions / instances) or back in.
+
+Redis pub/sub has no offsets, so agents on it report no lag.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional
+
+from producer_pool import ProducerPool
+
+logger = logging.getLogger(__name__)
+
+REFRESH_INTERVAL = float(os.environ.get('CONSUMER_LAG_REFRESH_INTERVAL', '15'))
+# Samples kept per agent for the trend (window = TREND_SAMPLES * REFRESH_INTERVAL)
+TREND_SAMPLES = int(os.environ.get('CONSUMER_LAG_TREND_SAMPLES', '20'))
+
+
+class ConsumerLagMonitor:
+    """
+    Cached consumer lag and lag trend per agent
+
+    Args:
+        list_agents: Returns the Kafka / MSK agents as dicts with key,
+            pubsub_config, channel_name and group
+        get_transport: Async pubsub_config -> started shared transport of the broker
+    """
+
+    def __init__(self, list_agents: Callable[[], List[Dict]], get_transport, interval: float = REFRESH_INTERVAL):
+        self.list_agents = list_agents
+        self.get_transport = get_transport
+        self.interval = interval
+        self.lag = {}
+        self.history = {}
+        # (agent key, partition) -> assumed start position of a "latest" partition without a commit
+        self.reset_positions = {}
+        self.errors = {}
+        self.refreshed_at = None
+        self.refresh_ms = None
+        self.task = None
+
+    def start(self):
+        self.task = asyncio.create_task(self._loop(), name="consumer-lag")
+
+    async def _loop(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.warning(f"Consumer lag refresh failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def refresh(self):
+        started = time.perf_counter()
+        agents = await asyncio.get_running_loop().run_in_executor(None, self.list_agents)
+        brokers = {}
+        for agent in agents:
+            brokers.setdefault(ProducerPool.pool_key(agent["pubsub_config"]), []).append(agent)
+        results = await asyncio.gather(*(self._refresh_broker(group) for group in brokers.values()), return_exceptions=True)
+        for broker_agents, result in zip(brokers.values(), results):
+            if isinstance(result, BaseException):
+                for agent in broker_agents:
+                    self.errors[agent["key"]] = str(result)
+        known = {agent["key"] for agent in agents}
+        for key in set(self.lag) - known:
+            self.lag.pop(key, None)
+            self.history.pop(key, None)
+            self.errors.pop(key, None)
+        for key, partition in [k for k in self.reset_positions if k[0] not in known]:
+            del self.reset_positions[(key, partition)]
+        self.refreshed_at = time.time()
+        self.refresh_ms = round((time.perf_counter() - started) * 1000, 1)
+
+    async def _refresh_broker(self, agents: List[Dict]):
+        transport = await self.get_transport(agents[0]["pubsub_config"])
+        topics = {agent["key"]: transport.resolve_channel(agent["channel_name"]) for agent in agents}
+        groups = {}
+        for agent in agents:
+            groups.setdefault(agent["group"], set()).add(topics[agent["key"]])
+        offsets = await transport.consumer_lag({group: sorted(group_topics) for group, group_topics in groups.items()})
+        now = time.time()
+        for agent in agents:
+            key, topic = agent["key"], topics[agent["key"]]
+            partitions = offsets.get(agent["group"], {}).get(topic, {})
+            self._record(key, agent["group"], topic, partitions, now, _offset_reset(agent["pubsub_config"]))
+            self.errors.pop(key, None)
+
+    def _from_reset(self, key: str, partition: int, offsets: Dict, reset: str) -> Dict:
+        """Offsets of a partition, with the lag of one never committed counted from the reset position"""
+        if offsets["committed"] is not None:
+            self.reset_positions.pop((key, partition), None)
+            return offsets
+        if offsets["end"] is None:
+            return offsets
+        if reset == "earliest" and offsets.get("start") is not None:
+            position = offsets["start"]
+        else:
+            position = self.reset_positions.setdefault((key, partition), offsets["end"])
+        return {**offsets, "position": position, "lag": max(offsets["end"] - position, 0)}
+
+    def _record(self, key: str, group: str, topic: str, partitions: Dict[int, Dict], now: float, reset: str = "latest"):
+        partitions = {partition: self._from_reset(key, partition, offsets, reset) for partition, offsets in partitions.items()}
+        known = [p for p in partitions.values() if p["lag"] is not None]
+        lag = sum(p["lag"] for p in known) if known else None
+        committed = sum(p["committed"] if p["committed"] is not None else p["position"] for p in known)
+        end = sum(p["end"] for p in known)
+        history = self.history.setdefault(key, deque(maxlen=TREND_SAMPLES))
+        if lag is not None:
+            history.append((now, lag, committed, end))
+        self.lag[key] = {
+            "group": group,
+            "topic": topic,
+            "lag": lag,
+            "partitions": partitions,
+            **self._trend(history, lag),
+            "updated_at": now,
+        }
+
+    @staticmethod
+    def _trend(history, lag: Optional[int]) -> Dict:
+        if len(history) < 2:
+            return {"trend": None, "lag_rate_per_s": None, "consume_rate_per_s": None,
+                    "produce_rate_per_s": None, "drain_eta_s": None}
+        (t0, lag0, committed0, end0), (t1, lag1, committed1, end1) = history[0], history[-1]
+        elapsed = max(t1 - t0, 1e-6)
+        lag_rate = (lag1 - lag0) / elapsed
+        if lag_rate > 0:
+            trend = "growing"
+        elif lag_rate < 0:
+            trend = "shrinking"
+        else:
+            trend = "steady"
+        return {
+            "trend": trend,
+            "lag_rate_per_s": round(lag_rate, 3),
+            # Offsets only grow, so a drop means the partitions were recreated: no rate
+            "consume_rate_per_s": round((committed1 - committed0) / elapsed, 3) if committed1 >= committed0 else None,
+            "produce_rate_per_s": round((end1 - end0) / elapsed, 3) if end1 >= end0 else None,
+            "drain_eta_s": round(lag / -lag_rate) if lag and lag_rate < 0 else None,
+        }
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Last lag of an agent; None for agents without offsets (Redis, memory) or not yet refreshed"""
+        lag = self.lag.get(key)
+        if lag is None and key in self.errors:
+            return {"error": self.errors[key]}
+        return lag
+
+    def metrics(self) -> List[str]:
+        """Prometheus text exposition lines for the cached lag"""
+        lines = []
+        for name, field, help_text in (
+            ("agent_consumer_lag", "lag", "Records between the agent's committed offsets and the high watermarks"),
+            ("agent_consumer_lag_rate", "lag_rate_per_s", "Change of the consumer lag per second over the trend window"),
+            ("agent_consume_rate", "consume_rate_per_s", "Records committed per second over the trend window"),
+            ("agent_produce_rate", "produce_rate_per_s", "Records produced to the agent's topic per second over the trend window"),
+        ):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            for key, lag in sorted(self.lag.items()):
+                if lag[field] is not None:
+                    lines.append(f'{name}{{agent="{key}",topic="{lag["topic"]}",group="{lag["group"]}"}} {lag[field]}')
+        return lines
+
+    def stats(self) -> Dict:
+        return {
+            "agents": len(self.lag),
+            "refreshed_at": self.refreshed_at,
+            "refresh_ms": self.refresh_ms,
+            "errors": dict(self.errors),
+        }
+
+    async def close(self):
+        if self.task:
+            self.task.cancel()
+
+
+def _offset_reset(pubsub_config: Dict) -> str:
+    """auto_offset_reset of the agent's consumer (the Kafka transport defaults to "latest")"""
+    backend_config = pubsub_config.get(pubsub_config.get("backend", "msk"), {})
+    return backend_config.get("consumer_config", {}).get("auto_offset_reset", "latest")
@@ -0,0 +1,181 @@
+"""
+Deduplication window for the agent runtime.
+
+Kafka redelivers records after rebalances and restarts, and clients retry;
+each duplicate would otherwise cost a full orchestration. A message is
+identified by its envelope id (message_id / correlation_id), else by its
+broker position (channel, partition, offset), or, in "content" mode, by a
+hash of its task text. Processed ids are remembered for a time window in:
+
+- an LRU of recent ids (exact, bounded by max_entries)
+- optionally a Bloom filter, which remembers far more ids in fixed memory
+  at the cost of a small false-positive rate; two generations rotate every
+  window so old ids age out
+- optionally Redis, shared by every consumer of the agent and surviving restarts
+
+Ids are recorded once a message has been processed, together with its
+response, so a duplicate is answered with the stored reply instead of being
+dropped silently. A message whose processing was interrupted by a crash is
+processed again on redelivery.
+"""
+
+import hashlib
+import json
+import logging
+import math
+import time
+from typing import Dict, Optional
+
+from caching import TTLCache, redis_settings
+
+logger = logging.getLogger(__name__)
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter sized for a capacity and false-positive rate"""
+
+    def __init__(self, capacity: int, error_rate: float = 1e-6):
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+        return ((first + i * second) % self.size for i in range(self.hashes))
+
+    def add(self, item: str):
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class DedupWindow:
+    """Remembers processed message ids for window_seconds"""
+
+    def __init__(self, window_seconds: float = 600, max_entries: int = 10000, key_mode: str = "id",
+                 bloom_capacity: int = 0, bloom_error_rate: float = 1e-6,
+                 redis_config: Dict = None, namespace: str = ""):
+        self.window_seconds = window_seconds
+        self.key_mode = key_mode
+        self.recent = TTLCache(max_entries)
+        self.in_flight = set()
+        self.bloom_capacity = bloom_capacity
+        self.bloom_error_rate = bloom_error_rate
+        self.blooms = [BloomFilter(bloom_capacity, bloom_error_rate)] if bloom_capacity else []
+        self.bloom_started = time.monotonic()
+        self.redis_config = redis_config
+        self.redis_prefix = f"agent_dedup:{namespace}:"
+        self.client = None
+        self.duplicates = 0
+        self.processed = 0
+
+    @classmethod
+    def from_runtime_config(cls, runtime_config: Dict, json_config: Dict, namespace: str):
+        """Window configured by the agent's runtime_config, or None when it is disabled"""
+        window_seconds = runtime_config.get("dedup_window_seconds", 600)
+        if not window_seconds or window_seconds <= 0:
+            return None
+        redis_config = None
+        if runtime_config.get("dedup_backend", "memory") == "redis":
+            redis_config = redis_settings(json_config)
+        return cls(
+            window_seconds=window_seconds,
+            max_entries=runtime_config.get("dedup_max_entries", 10000),
+            key_mode=runtime_config.get("dedup_key", "id"),
+            bloom_capacity=runtime_config.get("dedup_bloom_capacity", 0),
+            redis_config=redis_config,
+            namespace=namespace
+        )
+
+    def message_key(self, message, envelope: Dict, task: str = None) -> Optional[str]:
+        """Identity of a message, or None if it cannot be deduplicated"""
+        if self.key_mode == "content":
+            if task is None:
+                return None
+            return "content:" + hashlib.sha256(f"{message.channel}\0{task}".encode("utf-8")).hexdigest()
+        message_id = envelope.get("message_id") or envelope.get("correlation_id")
+        if message_id:
+            return f"id:{message_id}"
+        if message.offset is not None:
+            return f"offset:{message.channel}:{message.partition}:{message.offset}"
+        return None
+
+    def _redis(self):
+        if self.client is None:
+            import redis.asyncio as aioredis
+            self.client = aioredis.Redis(**self.redis_config)
+        return self.client
+
+    def _rotate_blooms(self):
+        if self.blooms and time.monotonic() - self.bloom_started >= self.window_seconds:
+            # Keep the previous generation so ids live between one and two windows
+            self.blooms = [BloomFilter(self.bloom_capacity, self.bloom_error_rate), self.blooms[0]]
+            self.bloom_started = time.monotonic()
+
+    async def check(self, key: str) -> bool:
+        """
+        True if key was already processed (or is being processed); otherwise
+        marks it in flight until record() or release() is called.
+        """
+        duplicate = key in self.in_flight or self.recent.get(key) is not None
+        if not duplicate and self.blooms:
+            self._rotate_blooms()
+            duplicate = any(key in bloom for bloom in self.blooms)
+        if not duplicate and self.redis_config:
+            try:
+                duplicate = bool(await self._redis().exists(self.redis_prefix + key))
+            except Exception as e:
+                logger.warning(f"Redis dedup lookup failed: {e}")
+        if duplicate:
+            self.duplicates += 1
+            return True
+        self.in_flight.add(key)
+        return False
+
+    async def record(self, key: str, response=None):
+        """Remember key as processed for the window, along with the response it was answered with"""
+        self.in_flight.discard(key)
+        self.recent.set(key, {"response": response}, self.window_seconds)
+        if self.blooms:
+            self._rotate_blooms()
+            self.blooms[0].add(key)
+        self.processed += 1
+        if self.redis_config:
+            try:
+                await self._redis().set(
+                    self.redis_prefix + key, json.dumps({"response": response}, default=str),
+                    px=int(self.window_seconds * 1000)
+                )
+            except Exception as e:
+                logger.warning(f"Redis dedup write failed: {e}")
+
+    async def stored(self, key: str) -> Optional[Dict]:
+        """
+        {"response": ...} recorded for a processed key, or None if it is still
+        in flight or only known to the Bloom filter
+        """
+        entry = self.recent.get(key)
+        if entry is None and self.redis_config:
+            try:
+                data = await self._redis().get(self.redis_prefix + key)
+                entry = json.loads(data) if data is not None else None
+            except Exception as e:
+                logger.warning(f"Redis dedup lookup failed: {e}")
+        return entry if isinstance(entry, dict) else None
+
+    def release(self, key: str):
+        """Forget an in-flight key without recording it (processing was abandoned)"""
+        self.in_flight.discard(key)
+
+    def stats(self) -> Dict:
+        return {"duplicates": self.duplicates, "processed": self.processed, "recent": len(self.recent)}
+
+    async def close(self):
+        if self.client:
+            await self.client.close()
+            self.client = None
@@ -0,0 +1,87 @@
+"""
+Parallel fan-out workflow for agents whose subagents are independent.
+
+The orchestrator plans and runs steps as the planner sequences them, so
+three independent price lookups cost three subagent calls back to back plus
+the planning calls. With runtime_config["workflow"] == "parallel" every
+fan-out subagent gets the task at once (at most max_concurrency at a time),
+and wall-clock time follows the slowest subagent instead of the sum.
+
+The responses are merged by the fan_in subagent when one is configured, in
+the same <fastagent:response> format as fast-agent's parallel workflow, or
+otherwise concatenated under one heading per subagent.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional
+
+from progress import report
+
+logger = logging.getLogger(__name__)
+
+PARALLEL_ROUTE = "parallel"
+
+
+class FanOutWorkflow:
+    """Sends a task to every fan-out subagent concurrently and merges the responses"""
+
+    name = PARALLEL_ROUTE
+
+    def __init__(self, agent_names: List[str], max_concurrency: int = 0, fan_in: Optional[str] = None,
+                 include_request: bool = True):
+        self.agent_names = list(agent_names)
+        self.max_concurrency = max_concurrency
+        self.fan_in = fan_in
+        self.include_request = include_request
+
+    @classmethod
+    def from_runtime_config(cls, runtime_config: Dict, agent_names: List[str]):
+        """Workflow configured by runtime_config, or None when tasks go to the orchestrator"""
+        if runtime_config.get("workflow", "orchestrator") != PARALLEL_ROUTE:
+            return None
+        fan_in = runtime_config.get("parallel_fan_in")
+        fan_out = runtime_config.get("parallel_agents") or [name for name in agent_names if name != fan_in]
+        return cls(fan_out, runtime_config.get("parallel_max_concurrency", 0), fan_in)
+
+    async def run(self, agent, task: str) -> str:
+        semaphore = asyncio.Semaphore(self.max_concurrency or len(self.agent_names) or 1)
+
+        async def call(name):
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    response = await agent[name].send(task)
+                    report("subagent", subagent=name, content=response)
+                    return response
+                finally:
+                    logger.debug(f"Fan-out call to '{name}' took {(time.perf_counter() - started) * 1000:.1f}ms")
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*(call(name) for name in self.agent_names), return_exceptions=True)
+        failures = [name for name, result in zip(self.agent_names, results) if isinstance(result, BaseException)]
+        logger.info("Fan-out finished", extra={
+            "event": "fan_out",
+            "agents": len(self.agent_names),
+            "failed": failures,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 1)
+        })
+        if failures and len(failures) == len(results):
+            raise results[0]
+        responses = {
+            name: f"ERROR: {result}" if isinstance(result, BaseException) else result
+            for name, result in zip(self.agent_names, results)
+        }
+        if self.fan_in:
+            return await agent[self.fan_in].send(self._fan_in_prompt(task, responses))
+        return "\n\n".join(f"## {name}\n{response}" for name, response in responses.items())
+
+    def _fan_in_prompt(self, task: str, responses: Dict[str, str]) -> str:
+        parts = []
+        if self.include_request:
+            parts.append("The following request was sent to the agents:")
+            parts.append(f"<fastagent:request>\n{task}\n</fastagent:request>")
+        for name, response in responses.items():
+            parts.append(f'<fastagent:response agent="{name}">\n{response}\n</fastagent:response>')
+        return "\n\n".join(parts)
@@ -0,0 +1,85 @@
+"""
+Headless runtime mode for agents.
+
+Under supervisord no terminal is attached, yet fast-agent still renders a
+box-drawn rich panel (plus markdown) for every chat turn and tool call and
+writes it to the log. In headless mode that rendering is switched off and
+each orchestration is reported as one compact structured log event instead.
+"""
+
+import logging
+import sys
+import time
+from typing import Dict
+
+logger = logging.getLogger(__name__)
+
+
+def is_headless(runtime_config: Dict = None) -> bool:
+    """
+    Headless unless forced off: runtime_config["headless"] wins when set,
+    otherwise the mode is on whenever stdout is not a TTY.
+    """
+    headless = (runtime_config or {}).get("headless")
+    if headless is not None:
+        return bool(headless)
+    return not sys.stdout.isatty()
+
+
+def apply_headless_config(json_config: Dict) -> Dict:
+    """
+    Turn off fast-agent's console rendering in a json_config before it is
+    passed to FastAgent: chat panels, tool call panels and the progress display.
+    """
+    logger_config = json_config.setdefault("logger", {})
+    logger_config["show_chat"] = False
+    logger_config["show_tools"] = False
+    logger_config["progress_display"] = False
+    return json_config
+
+
+def silence_console():
+    """
+    Mute fast-agent's shared rich console, catching output not covered by the
+    settings above. The error console is left alone so failures still surface.
+    """
+    try:
+        from mcp_agent import console as mcp_console
+    except ImportError:
+        return
+    rich_console = getattr(mcp_console, "console", None)
+    if rich_console is not None:
+        rich_console.quiet = True
+
+
+async def orchestrate_with_events(agent, task: str, router=None, target: str = None, **fields):
+    """
+    Run agent.orchestrate (or, through router, send the task straight to the
+    target subagent) and log one structured event with its wall-clock time,
+    CPU time and response size instead of rendering the transcript.
+    """
+    started = time.perf_counter()
+    cpu_started = time.process_time()
+    status = "ok"
+    response = None
+    try:
+        if router is not None:
+            response = await router.run(agent, task, target)
+        else:
+            response = await agent.orchestrate(task)
+        return response
+    except Exception:
+        status = "error"
+        raise
+    finally:
+        logger.info("orchestration finished", extra={
+            "event": "orchestration",
+            "status": status,
+            "route": target or (router.default_route if router is not None else "orchestrator"),
+            "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+            # Process-wide CPU time, so concurrent partitions overlap
+            "cpu_ms": round((time.process_time() - cpu_started) * 1000, 1),
+            "task_chars": len(task),
+            "response_chars": len(response) if isinstance(response, str) else 0,
+            **fields
+        })
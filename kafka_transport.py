@@ -0,0 +1,359 @@
+"""
+Kafka / AWS MSK transport for the agent runtime (see transports.py).
+"""
+
+import asyncio
+import logging
+import ssl
+from typing import Dict, List
+
+from aiokafka import AIOKafkaConsumer, AIOKafkaProducer
+from aiokafka.abc import AbstractTokenProvider, ConsumerRebalanceListener
+from aiokafka.admin import AIOKafkaAdminClient, NewTopic, NewPartitions
+from aiokafka.structs import TopicPartition
+from aiokafka.errors import TopicAlreadyExistsError, InvalidPartitionsError
+
+import serializers
+from transports import Transport, TransportMessage
+
+logger = logging.getLogger(__name__)
+
+
+def create_ssl_context():
+    ssl_context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    ssl_context.options |= ssl.OP_NO_SSLv2
+    ssl_context.options |= ssl.OP_NO_SSLv3
+    ssl_context.check_hostname = False
+    ssl_context.verify_mode = ssl.CERT_NONE
+    ssl_context.load_default_certs()
+    return ssl_context
+
+
+class AWSTokenProvider(AbstractTokenProvider):
+    def __init__(self, region="ap-south-1"):
+        self.region = region
+
+    async def token(self):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self._generate_token)
+
+    def _generate_token(self):
+        from aws_msk_iam_sasl_signer import MSKAuthTokenProvider
+        try:
+            token, _ = MSKAuthTokenProvider.generate_auth_token(self.region)
+            return token
+        except Exception as e:
+            logger.error(f"Failed to generate auth token: {e}")
+            raise
+
+
+class PartitionRebalanceListener(ConsumerRebalanceListener):
+    """Forwards group rebalances to the subscriber's callbacks"""
+    def __init__(self, on_assign=None, on_revoke=None):
+        self.on_assign = on_assign
+        self.on_revoke = on_revoke
+
+    async def on_partitions_revoked(self, revoked):
+        if self.on_revoke:
+            await self.on_revoke(revoked)
+
+    async def on_partitions_assigned(self, assigned):
+        if self.on_assign:
+            self.on_assign(assigned)
+
+
+class KafkaTransport(Transport):
+    """
+    Kafka transport. The "msk" backend authenticates with AWS IAM over
+    SASL_SSL; the "kafka" backend uses the security settings from
+    pubsub_config["kafka"] (PLAINTEXT by default).
+
+    Offsets are committed per message through ack(), after processing.
+
+    With group_instance_id the consumer is a static group member (KIP-345):
+    it does not leave the group on close, and rejoining under the same id
+    within the session timeout gets its partitions back without a rebalance.
+    """
+
+    def __init__(self, pubsub_config: Dict = None, num_partitions: int = 1, replication_factor: int = 1,
+                 consumer_group: str = "mcp_agent_consumer", content_type=None, group_instance_id: str = None,
+                 **kwargs):
+        super().__init__(pubsub_config, content_type)
+        self.backend = self.pubsub_config.get("backend", "msk")
+        self.config = self.pubsub_config.get(self.backend, {})
+        self.bootstrap_servers = self.config.get("bootstrap_servers", ["localhost:9092"])
+        self.topic_prefix = self.config.get("topic_prefix", "mcp_agent_")
+        self.num_partitions = num_partitions
+        self.replication_factor = replication_factor
+        self.consumer_group = consumer_group
+        self.group_instance_id = group_instance_id
+        self.consumer = None
+        self.producer = None
+        self._producer_lock = asyncio.Lock()
+        # Admin client and group-less consumer used for lag queries, started on first use
+        self._lag_admin = None
+        self._lag_consumer = None
+        self._lag_lock = asyncio.Lock()
+        self._known_topics = set()
+
+    def resolve_channel(self, channel_name: str) -> str:
+        if channel_name.startswith(self.topic_prefix):
+            return channel_name
+        return self.topic_prefix + channel_name
+
+    def _connection_kwargs(self) -> Dict:
+        """Security settings shared by the consumer, producer and admin client"""
+        if self.backend == "msk":
+            return {
+                "security_protocol": "SASL_SSL",
+                "ssl_context": create_ssl_context(),
+                "sasl_mechanism": "OAUTHBEARER",
+                "sasl_oauth_token_provider": AWSTokenProvider(self.config.get("aws_region", "ap-south-1")),
+            }
+        kwargs = {"security_protocol": self.config.get("security_protocol", "PLAINTEXT")}
+        if kwargs["security_protocol"] in ("SSL", "SASL_SSL"):
+            kwargs["ssl_context"] = create_ssl_context()
+        if self.config.get("sasl_mechanism"):
+            kwargs["sasl_mechanism"] = self.config["sasl_mechanism"]
+            kwargs["sasl_plain_username"] = self.config.get("sasl_plain_username")
+            kwargs["sasl_plain_password"] = self.config.get("sasl_plain_password")
+        return kwargs
+
+    async def ensure_topic_exists(self, topic_name):
+        """Ensure Kafka topic exists with at least num_partitions, create if it doesn't"""
+        admin_client = None
+        try:
+            admin_client = AIOKafkaAdminClient(
+                bootstrap_servers=self.bootstrap_servers,
+                client_id=f'admin_client_{topic_name}',
+                **self._connection_kwargs()
+            )
+            await admin_client.start()
+
+            try:
+                new_topic = NewTopic(
+                    name=topic_name,
+                    num_partitions=self.num_partitions,
+                    replication_factor=self.replication_factor
+                )
+                await admin_client.create_topics([new_topic])
+                logger.info(f"Topic '{topic_name}' created successfully")
+
+            except TopicAlreadyExistsError:
+                logger.info(f"Topic '{topic_name}' already exists")
+                # Grow existing topics to the configured partition count
+                try:
+                    await admin_client.create_partitions({topic_name: NewPartitions(total_count=self.num_partitions)})
+                    logger.info(f"Topic '{topic_name}' increased to {self.num_partitions} partitions")
+                except InvalidPartitionsError:
+                    pass
+                except Exception as e:
+                    logger.warning(f"Error increasing partitions of topic '{topic_name}': {e}")
+            except Exception as e:
+                logger.warning(f"Error creating topic '{topic_name}': {e}")
+
+        except Exception as e:
+            logger.error(f"Failed to connect to Kafka admin client: {e}")
+        finally:
+            if admin_client:
+                try:
+                    await admin_client.close()
+                except Exception:
+                    pass
+
+    async def _ensure_publish_topic(self, topic_name):
+        """Create reply topics on first use; MSK does not auto-create them"""
+        if topic_name not in self._known_topics:
+            await self.ensure_topic_exists(topic_name)
+            self._known_topics.add(topic_name)
+
+    async def subscribe(self, channel: str, on_assign=None, on_revoke=None):
+        await self.ensure_topic_exists(channel)
+        self._known_topics.add(channel)
+        consumer_config = self.config.get("consumer_config", {})
+        self.consumer = AIOKafkaConsumer(
+            bootstrap_servers=self.bootstrap_servers,
+            group_id=self.consumer_group,
+            # Values are decoded per record from the content-type header
+            key_deserializer=lambda k: k.decode('utf-8') if k else None,
+            auto_offset_reset=consumer_config.get("auto_offset_reset", "latest"),
+            # Offsets are committed by ack() once a record has been processed
+            enable_auto_commit=False,
+            client_id=consumer_config.get("client_id", "mcp_agent_consumer"),
+            group_instance_id=self.group_instance_id,
+            # Static membership needs JoinGroup v5 (Kafka 2.3+); pinned to 0.11.5 the instance id is dropped
+            api_version=consumer_config.get("api_version", "auto" if self.group_instance_id else "0.11.5"),
+            session_timeout_ms=consumer_config.get("session_timeout_ms", 30000),
+            heartbeat_interval_ms=consumer_config.get("heartbeat_interval_ms", 10000),
+            **self._connection_kwargs()
+        )
+        self.consumer.subscribe([channel], listener=PartitionRebalanceListener(on_assign, on_revoke))
+        await self.consumer.start()
+        logger.info(f"Kafka consumer subscribed to topic '{channel}' (group '{self.consumer_group}'"
+                    + (f", instance '{self.group_instance_id}')" if self.group_instance_id else ")"))
+
+    async def wait_for_assignment(self, timeout: float = 30.0) -> Dict[TopicPartition, int]:
+        """
+        Wait until the group has assigned partitions to this consumer and resolve
+        their start positions (auto_offset_reset) now; returns the positions
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        # The group join runs in the background from consumer.start()
+        while not self.consumer.assignment():
+            if loop.time() > deadline:
+                raise asyncio.TimeoutError(f"No partitions of {self.consumer.subscription()} assigned after {timeout}s")
+            await asyncio.sleep(0.05)
+        return {tp: await self.consumer.position(tp) for tp in self.consumer.assignment()}
+
+    async def receive_batch(self, max_records: int = 100, timeout_ms: int = 1000) -> List[TransportMessage]:
+        batches = await self.consumer.getmany(timeout_ms=timeout_ms, max_records=max_records)
+        messages = []
+        for tp, records in batches.items():
+            for record in records:
+                try:
+                    value = serializers.decode_record(record)
+                except Exception as e:
+                    logger.warning(f"Could not decode record {tp.partition}@{record.offset}: {e}")
+                    value = None
+                messages.append(TransportMessage(
+                    value=value, channel=record.topic, partition=tp, offset=record.offset,
+                    key=record.key, headers=record.headers,
+                    size=max(record.serialized_value_size, 0), raw=record.value
+                ))
+        return messages
+
+    async def ack(self, message: TransportMessage):
+        await self.consumer.commit({message.partition: message.offset + 1})
+
+    def pause(self, partition):
+        self.consumer.pause(partition)
+
+    def resume(self, partition):
+        # The partition may have been revoked while paused
+        if partition in self.consumer.assignment():
+            self.consumer.resume(partition)
+
+    async def _get_producer(self):
+        """Long-lived producer, started on first publish"""
+        async with self._producer_lock:
+            if self.producer is None:
+                producer_config = self.config.get("producer_config", {})
+                producer = AIOKafkaProducer(
+                    bootstrap_servers=self.bootstrap_servers,
+                    key_serializer=lambda k: k.encode('utf-8') if k else None,
+                    acks=producer_config.get("acks", "all"),
+                    # Let concurrent sends share a request instead of one round trip each
+                    linger_ms=producer_config.get("linger_ms", 5),
+                    client_id=producer_config.get("client_id", "mcp_agent_producer"),
+                    api_version="0.11.5",
+                    **self._connection_kwargs()
+                )
+                await producer.start()
+                self.producer = producer
+        return self.producer
+
+    async def warm(self):
+        await self._get_producer()
+
+    async def publish(self, channel: str, value, key=None, content_type=None):
+        producer = await self._get_producer()
+        await self._ensure_publish_topic(channel)
+        payload, headers = serializers.encode(value, content_type or self.content_type)
+        metadata = await producer.send_and_wait(channel, value=payload, key=key, headers=headers)
+        return {"channel": metadata.topic, "partition": metadata.partition, "offset": metadata.offset}
+
+    async def publish_many(self, items):
+        """Queue every record on the producer first, then wait for all acks together"""
+        producer = await self._get_producer()
+        futures = []
+        for channel, value, key in items:
+            await self._ensure_publish_topic(channel)
+            payload, headers = serializers.encode(value, self.content_type)
+            futures.append(await producer.send(channel, value=payload, key=key, headers=headers))
+        results = []
+        for metadata in await asyncio.gather(*futures):
+            results.append({"channel": metadata.topic, "partition": metadata.partition, "offset": metadata.offset})
+        return results
+
+    async def _get_lag_clients(self):
+        async with self._lag_lock:
+            if self._lag_admin is None:
+                admin = AIOKafkaAdminClient(
+                    bootstrap_servers=self.bootstrap_servers,
+                    client_id="mcp_agent_lag_admin",
+                    **self._connection_kwargs()
+                )
+                await admin.start()
+                consumer = AIOKafkaConsumer(
+                    bootstrap_servers=self.bootstrap_servers,
+                    group_id=None,
+                    enable_auto_commit=False,
+                    client_id="mcp_agent_lag_offsets",
+                    api_version="0.11.5",
+                    **self._connection_kwargs()
+                )
+                try:
+                    await consumer.start()
+                except Exception:
+                    await admin.close()
+                    raise
+                self._lag_admin, self._lag_consumer = admin, consumer
+        return self._lag_admin, self._lag_consumer
+
+    async def consumer_lag(self, groups: Dict[str, List[str]], timeout: float = 10.0) -> Dict[str, Dict[str, Dict[int, Dict]]]:
+        """
+        Committed offset, log start offset, high watermark and lag of every
+        partition, by group and topic
+
+        One metadata request covers all topics, one beginning- and one
+        end-offset request all partitions, and one offset fetch each group. A
+        partition the group has never committed has committed and lag None;
+        its lag depends on where the group's auto_offset_reset starts it.
+        """
+        admin, consumer = await self._get_lag_clients()
+        topics = sorted({topic for group_topics in groups.values() for topic in group_topics})
+        partitions = {}
+        for topic in await admin.describe_topics(topics):
+            if not topic["error_code"]:
+                partitions[topic["topic"]] = [TopicPartition(topic["topic"], p["partition"]) for p in topic["partitions"]]
+        all_partitions = [tp for tps in partitions.values() for tp in tps]
+        start_offsets, end_offsets = {}, {}
+        if all_partitions:
+            start_offsets, end_offsets = await asyncio.wait_for(asyncio.gather(
+                consumer.beginning_offsets(all_partitions), consumer.end_offsets(all_partitions)
+            ), timeout)
+
+        async def committed(group):
+            return group, await admin.list_consumer_group_offsets(group)
+
+        results = {}
+        for group, offsets in await asyncio.gather(*(committed(group) for group in groups)):
+            results[group] = {}
+            for topic in groups[group]:
+                results[group][topic] = {}
+                for tp in partitions.get(topic, []):
+                    end = end_offsets.get(tp)
+                    offset = offsets.get(tp)
+                    position = offset.offset if offset is not None and offset.offset >= 0 else None
+                    results[group][topic][tp.partition] = {
+                        "committed": position,
+                        "start": start_offsets.get(tp),
+                        "end": end,
+                        "lag": max(end - position, 0) if position is not None and end is not None else None,
+                    }
+        return results
+
+    async def close(self):
+        if self._lag_admin:
+            await self._lag_admin.close()
+            await self._lag_consumer.stop()
+            self._lag_admin = self._lag_consumer = None
+        if self.consumer:
+            # A dynamic member leaves the group so its partitions move on; a static
+            # member keeps them for the session timeout, in case it restarts
+            await self.consumer.stop()
+            self.consumer = None
+        if self.producer:
+            await self.producer.stop()
+            self.producer = None
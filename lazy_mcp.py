@@ -0,0 +1,215 @@
+"""
+Lazy MCP server startup with idle shutdown for the agent runtime.
+
+fast.run() normally connects every MCP server of every subagent up front,
+only to list their tools. With lazy startup the tool and prompt lists are
+kept in a manifest file next to the agent. A server whose manifest entry
+matches its current definition is indexed from the manifest and only
+spawned on its first tool call. Servers without a valid entry start eagerly
+once so the manifest can be written. A reaper disconnects servers that have
+had no call for the idle timeout; the next call starts them again.
+
+fast-agent has no hooks for this, so install() wraps MCPAggregator.load_servers,
+MCPAggregator._execute_on_server and MCPConnectionManager.get_server.
+Start and stop events are logged with their timings.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+import weakref
+from typing import Dict
+
+from result_cache import config_fingerprint
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_IDLE_TIMEOUT = 600.0
+
+
+class LazyMcpServers:
+    """Manifest-backed lazy startup and idle reaping of an agent's MCP servers"""
+
+    def __init__(self, manifest_file: str, servers: Dict, idle_timeout: float = DEFAULT_IDLE_TIMEOUT):
+        self.manifest_file = manifest_file
+        self.fingerprints = {name: config_fingerprint(config) for name, config in servers.items()}
+        self.idle_timeout = idle_timeout
+        self.manifest = self._load_manifest()
+        self.last_used = {}
+        self.in_use = {}
+        self.started_at = {}
+        self.connection_managers = weakref.WeakSet()
+        self.reaper_task = None
+        self.starts = 0
+        self.stops = 0
+
+    @classmethod
+    def from_runtime_config(cls, runtime_config: Dict, json_config: Dict):
+        """Lazy startup as configured by runtime_config, or None when it is disabled"""
+        if not runtime_config.get("mcp_lazy_start", True) or not runtime_config.get("mcp_manifest_file"):
+            return None
+        servers = (json_config.get("mcp") or {}).get("servers") or {}
+        return cls(
+            runtime_config["mcp_manifest_file"],
+            servers,
+            runtime_config.get("mcp_idle_timeout_seconds", DEFAULT_IDLE_TIMEOUT)
+        )
+
+    def _load_manifest(self) -> Dict:
+        try:
+            with open(self.manifest_file) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable MCP manifest {self.manifest_file}: {e}")
+            return {}
+
+    def _save_manifest(self):
+        temp_file = f"{self.manifest_file}.tmp"
+        try:
+            with open(temp_file, "w") as f:
+                json.dump(self.manifest, f)
+            os.replace(temp_file, self.manifest_file)
+        except OSError as e:
+            logger.warning(f"Failed to write MCP manifest {self.manifest_file}: {e}")
+
+    def cached_entry(self, server_name: str):
+        """Manifest entry for a server, if it was written for its current definition"""
+        entry = self.manifest.get(server_name)
+        if entry and entry.get("fingerprint") == self.fingerprints.get(server_name):
+            return entry
+        return None
+
+    def remember(self, server_name: str, tools, prompts):
+        entry = {
+            "fingerprint": self.fingerprints.get(server_name),
+            "tools": [tool.model_dump(mode="json") for tool in tools],
+            "prompts": [prompt.model_dump(mode="json") for prompt in prompts],
+        }
+        if self.manifest.get(server_name) != entry:
+            self.manifest[server_name] = entry
+            self._save_manifest()
+
+    def install(self) -> bool:
+        """Patch fast-agent; returns False (servers start eagerly) if it could not be patched"""
+        try:
+            from mcp.types import Prompt, Tool
+            from mcp_agent.mcp.common import create_namespaced_name
+            from mcp_agent.mcp.mcp_aggregator import MCPAggregator, NamespacedTool
+            from mcp_agent.mcp.mcp_connection_manager import MCPConnectionManager
+        except ImportError as e:
+            logger.warning(f"Lazy MCP startup disabled: {e}")
+            return False
+
+        lazy = self
+        original_load_servers = MCPAggregator.load_servers
+        original_execute = MCPAggregator._execute_on_server
+        original_get_server = MCPConnectionManager.get_server
+
+        async def load_servers(aggregator):
+            if aggregator.initialized or not aggregator.connection_persistence:
+                return await original_load_servers(aggregator)
+            server_names = list(aggregator.server_names)
+            cached = {name: lazy.cached_entry(name) for name in server_names}
+            cached = {name: entry for name, entry in cached.items() if entry}
+            # Only servers without a manifest entry are connected now
+            aggregator.server_names = [name for name in server_names if name not in cached]
+            try:
+                await original_load_servers(aggregator)
+            finally:
+                aggregator.server_names = server_names
+            for name in aggregator.server_names:
+                if name in cached:
+                    continue
+                tools = [namespaced.tool for namespaced in aggregator._server_to_tool_map.get(name, [])]
+                prompts = aggregator._prompt_cache.get(name, [])
+                # An empty listing may be a failed one; never defer a server on that basis
+                if tools or prompts:
+                    lazy.remember(name, tools, prompts)
+            for name, entry in cached.items():
+                aggregator._server_to_tool_map[name] = []
+                for tool_data in entry["tools"]:
+                    tool = Tool.model_validate(tool_data)
+                    namespaced_name = create_namespaced_name(name, tool.name)
+                    namespaced = NamespacedTool(tool=tool, server_name=name, namespaced_tool_name=namespaced_name)
+                    aggregator._namespaced_tool_map[namespaced_name] = namespaced
+                    aggregator._server_to_tool_map[name].append(namespaced)
+                aggregator._prompt_cache[name] = [Prompt.model_validate(p) for p in entry["prompts"]]
+            if cached:
+                logger.info(f"Deferred MCP servers {sorted(cached)} until first use", extra={
+                    "event": "mcp_lazy", "agent_name": aggregator.agent_name, "deferred": sorted(cached)
+                })
+
+        async def _execute_on_server(aggregator, server_name, *args, **kwargs):
+            # Busy servers are never reaped
+            lazy.in_use[server_name] = lazy.in_use.get(server_name, 0) + 1
+            try:
+                return await original_execute(aggregator, server_name, *args, **kwargs)
+            finally:
+                lazy.in_use[server_name] -= 1
+                lazy.last_used[server_name] = time.monotonic()
+
+        async def get_server(manager, server_name, *args, **kwargs):
+            lazy.connection_managers.add(manager)
+            connection = manager.running_servers.get(server_name)
+            launching = connection is None or not connection.is_healthy()
+            started = time.perf_counter()
+            connection = await original_get_server(manager, server_name, *args, **kwargs)
+            lazy.last_used[server_name] = time.monotonic()
+            if launching:
+                lazy.starts += 1
+                lazy.started_at[server_name] = time.monotonic()
+                logger.info(f"Started MCP server '{server_name}'", extra={
+                    "event": "mcp_server_start", "server": server_name,
+                    "elapsed_ms": round((time.perf_counter() - started) * 1000, 1)
+                })
+            return connection
+
+        MCPAggregator.load_servers = load_servers
+        MCPAggregator._execute_on_server = _execute_on_server
+        MCPConnectionManager.get_server = get_server
+        return True
+
+    def start(self):
+        """Start reaping idle servers (no-op without an idle timeout)"""
+        if self.idle_timeout and self.idle_timeout > 0:
+            self.reaper_task = asyncio.create_task(self._reap_loop(), name="mcp-idle-reaper")
+
+    async def _reap_loop(self):
+        interval = min(30.0, max(1.0, self.idle_timeout / 4))
+        while True:
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            for manager in list(self.connection_managers):
+                for server_name in list(manager.running_servers):
+                    idle = now - self.last_used.get(server_name, now)
+                    if self.in_use.get(server_name, 0) or idle < self.idle_timeout:
+                        continue
+                    started = time.perf_counter()
+                    try:
+                        await manager.disconnect_server(server_name)
+                    except Exception as e:
+                        logger.warning(f"Failed to stop idle MCP server '{server_name}': {e}")
+                        continue
+                    self.stops += 1
+                    uptime = now - self.started_at.pop(server_name, now)
+                    logger.info(f"Stopped idle MCP server '{server_name}'", extra={
+                        "event": "mcp_server_stop", "server": server_name,
+                        "idle_s": round(idle, 1), "uptime_s": round(uptime, 1),
+                        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1)
+                    })
+
+    def stats(self) -> Dict:
+        running = sorted({name for manager in self.connection_managers for name in manager.running_servers})
+        return {"starts": self.starts, "stops": self.stops, "running": running}
+
+    async def close(self):
+        if self.reaper_task:
+            self.reaper_task.cancel()
+            try:
+                await self.reaper_task
+            except asyncio.CancelledError:
+                pass
@@ -0,0 +1,219 @@
+"""
+Tail and follow agent log files for agent_manager.
+
+Tailing reads backwards from the end of the file in fixed-size blocks until
+enough lines are found, so the cost depends on the bytes requested and not on
+the size of the log. Following watches the log's directory with inotify
+(polling where inotify is unavailable) and notices rotation: when the file is
+renamed, recreated or truncated, whatever was left in the old file is read and
+the new file is followed from its start.
+"""
+
+import asyncio
+import ctypes
+import ctypes.util
+import logging
+import os
+import struct
+from typing import Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+BLOCK_SIZE = 64 * 1024
+# Upper bound on bytes scanned for one tail request (guards against huge lines)
+MAX_TAIL_BYTES = int(os.environ.get('LOG_TAIL_MAX_BYTES', str(16 * 1024 * 1024)))
+# Bytes read from a followed file per wakeup
+READ_CHUNK = 1024 * 1024
+POLL_INTERVAL = 1.0
+# With inotify the file is still re-checked this often, in case an event is missed
+WATCH_RECHECK_INTERVAL = 5.0
+
+
+def tail_lines(path, lines: int, include_partial: bool = True,
+               block_size: int = BLOCK_SIZE, max_bytes: int = MAX_TAIL_BYTES) -> Tuple[List[str], int]:
+    """
+    Last lines of a file, read backwards from the end
+
+    Args:
+        path: Log file
+        lines: Number of lines to return
+        include_partial: Include a final line that has no newline yet
+        block_size: Bytes read per backwards step
+        max_bytes: Stop scanning after this many bytes
+
+    Returns:
+        (lines, offset), where offset is where a follower should continue
+        reading: the end of the file, or the start of the excluded partial line
+    """
+    with open(path, 'rb') as f:
+        end = f.seek(0, os.SEEK_END)
+        position = end
+        buffer = b""
+        # One extra newline is needed to know the first returned line is complete
+        while position > 0 and buffer.count(b"\n") <= lines and end - position < max_bytes:
+            size = min(block_size, position)
+            position -= size
+            f.seek(position)
+            buffer = f.read(size) + buffer
+
+    offset = end
+    chunks = buffer.split(b"\n")
+    partial = chunks.pop()
+    if partial and not include_partial:
+        offset -= len(partial)
+    elif partial:
+        chunks.append(partial)
+    if position > 0 and chunks:
+        # The first chunk starts mid-line
+        chunks.pop(0)
+    selected = chunks[-lines:] if lines > 0 else []
+    return [chunk.decode('utf-8', errors='replace') for chunk in selected], offset
+
+
+class InotifyWatch:
+    """Calls back when a file in a directory is modified, created, moved or deleted"""
+
+    IN_MODIFY = 0x002
+    IN_MOVED_FROM = 0x040
+    IN_MOVED_TO = 0x080
+    IN_CREATE = 0x100
+    IN_DELETE = 0x200
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+    EVENT_HEADER = struct.Struct("iIII")
+
+    _libc = None
+
+    def __init__(self, fd: int, name: str, callback):
+        self.fd = fd
+        self.name = os.fsencode(name)
+        self.callback = callback
+        self.loop = asyncio.get_running_loop()
+        self.loop.add_reader(fd, self._on_readable)
+
+    @classmethod
+    def create(cls, path, callback):
+        """Watch path's directory for events on path, or None if inotify is unavailable"""
+        try:
+            if cls._libc is None:
+                cls._libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+            fd = cls._libc.inotify_init1(cls.IN_NONBLOCK | cls.IN_CLOEXEC)
+        except (OSError, AttributeError):
+            return None
+        if fd < 0:
+            return None
+        directory = os.path.dirname(os.path.abspath(path))
+        mask = cls.IN_MODIFY | cls.IN_MOVED_FROM | cls.IN_MOVED_TO | cls.IN_CREATE | cls.IN_DELETE
+        if cls._libc.inotify_add_watch(fd, os.fsencode(directory), mask) < 0:
+            os.close(fd)
+            return None
+        return cls(fd, os.path.basename(path), callback)
+
+    def _on_readable(self):
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return
+        position = 0
+        matched = False
+        # struct inotify_event: wd, mask, cookie, len, then a NUL-padded name
+        while position + self.EVENT_HEADER.size <= len(data):
+            _, _, _, name_len = self.EVENT_HEADER.unpack_from(data, position)
+            start = position + self.EVENT_HEADER.size
+            if data[start:start + name_len].rstrip(b"\0") == self.name:
+                matched = True
+            position = start + name_len
+        if matched:
+            self.callback()
+
+    def close(self):
+        self.loop.remove_reader(self.fd)
+        os.close(self.fd)
+
+
+class LogFollower:
+    """Streams lines appended to a log file, across rotations"""
+
+    def __init__(self, path, offset: int = None, poll_interval: float = POLL_INTERVAL):
+        self.path = str(path)
+        self.offset = offset
+        self.poll_interval = poll_interval
+        self.file = None
+        self.inode = None
+        self.partial = b""
+        self.changed = asyncio.Event()
+        self.watch = None
+
+    def start(self):
+        self._open(self.offset)
+        self.watch = InotifyWatch.create(self.path, self.changed.set)
+        if self.watch is None:
+            logger.debug(f"inotify unavailable, polling {self.path} every {self.poll_interval}s")
+
+    def _open(self, offset=None):
+        if self.file:
+            self.file.close()
+        self.file = open(self.path, 'rb')
+        self.inode = os.fstat(self.file.fileno()).st_ino
+        size = self.file.seek(0, os.SEEK_END)
+        if offset is not None:
+            self.file.seek(min(offset, size))
+        self.partial = b""
+
+    def _rotated(self) -> bool:
+        """True once the path points at a new file or the file was truncated"""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            # Between the rename and the new file being created
+            return False
+        return stat.st_ino != self.inode or stat.st_size < self.file.tell()
+
+    def _split(self, data: bytes) -> List[Dict]:
+        chunks = (self.partial + data).split(b"\n")
+        self.partial = chunks.pop()
+        return [{"type": "log", "line": chunk.decode('utf-8', errors='replace')} for chunk in chunks]
+
+    def _read_available(self) -> Tuple[List[Dict], bool]:
+        """(new events, whether more can be read right away); blocking file I/O, runs in an executor"""
+        data = self.file.read(READ_CHUNK)
+        events = self._split(data) if data else []
+        if len(data) == READ_CHUNK:
+            # More is waiting; read it on the next call
+            return events, True
+        if self._rotated():
+            if self.partial:
+                events.append({"type": "log", "line": self.partial.decode('utf-8', errors='replace')})
+            self._open(0)
+            events.append({"type": "log_rotated"})
+            return events, True
+        return events, False
+
+    async def next_events(self, timeout: float) -> List[Dict]:
+        """New log events, or an empty list if nothing was written within timeout seconds"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            self.changed.clear()
+            # Reads of up to READ_CHUNK (and reopening after a rotation) stay off the event loop
+            events, more = await loop.run_in_executor(None, self._read_available)
+            if more:
+                self.changed.set()
+            if events:
+                return events
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return []
+            interval = WATCH_RECHECK_INTERVAL if self.watch else self.poll_interval
+            try:
+                await asyncio.wait_for(self.changed.wait(), min(remaining, interval))
+            except asyncio.TimeoutError:
+                pass
+
+    def close(self):
+        if self.watch:
+            self.watch.close()
+            self.watch = None
+        if self.file:
+            self.file.close()
+            self.file = None
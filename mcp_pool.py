@@ -0,0 +1,323 @@
+"""
+Host-level pool of shared MCP servers, served by agent_manager.
+
+Each agent normally spawns its own stdio MCP servers, i.e. one Node/Python
+runtime per server per agent. Servers marked ``"shared": true`` in
+json_config["mcp"]["servers"] are instead started once per distinct
+definition (command, args, env) by the manager. Agents reach them over
+MCP's streamable HTTP transport at ``{MCP_POOL_URL}/{key}``.
+
+The pool multiplexes every agent's JSON-RPC requests onto the one stdio
+session, remapping request ids. It answers ``initialize`` and ``ping``
+itself, limits concurrent requests per server and restarts servers that
+exit or stop answering health-check pings.
+"""
+
+import asyncio
+import copy
+import itertools
+import json
+import logging
+import os
+import time
+import uuid
+from typing import Callable, Dict, Optional
+
+from result_cache import config_fingerprint
+
+logger = logging.getLogger(__name__)
+
+MCP_POOL_URL = os.environ.get('MCP_POOL_URL', 'http://127.0.0.1:8080/mcp/servers')
+PROTOCOL_VERSION = "2025-03-26"
+DEFAULT_MAX_CONCURRENCY = 8
+REQUEST_TIMEOUT = float(os.environ.get('MCP_POOL_REQUEST_TIMEOUT', '300'))
+HEALTH_INTERVAL = float(os.environ.get('MCP_POOL_HEALTH_INTERVAL', '30'))
+PING_TIMEOUT = 10.0
+MAX_RESTART_BACKOFF = 60.0
+# Tool results (e.g. fetched pages) can be far larger than asyncio's 64 KiB line limit
+STREAM_LIMIT = 32 * 1024 * 1024
+
+# Settings that describe how to launch a server, replaced by the pool URL in agents
+LAUNCH_KEYS = ("command", "args", "env", "cwd", "transport", "shared", "max_concurrency")
+
+
+def is_shared(server_config: Dict) -> bool:
+    return bool(server_config.get("shared")) and server_config.get("transport", "stdio") == "stdio"
+
+
+def server_key(server_config: Dict) -> str:
+    """Servers with the same launch definition share one process"""
+    return config_fingerprint(
+        server_config.get("command"), server_config.get("args"), server_config.get("env"), server_config.get("cwd")
+    )
+
+
+def pooled_json_config(json_config: Dict, base_url: str = MCP_POOL_URL) -> Dict:
+    """Copy of json_config whose shared stdio servers point at the pool"""
+    servers = (json_config.get("mcp") or {}).get("servers") or {}
+    if not any(isinstance(config, dict) and is_shared(config) for config in servers.values()):
+        return json_config
+    json_config = copy.deepcopy(json_config)
+    for name, server_config in json_config["mcp"]["servers"].items():
+        if isinstance(server_config, dict) and is_shared(server_config):
+            pooled = {key: value for key, value in server_config.items() if key not in LAUNCH_KEYS}
+            pooled.update({"transport": "http", "url": f"{base_url}/{server_key(server_config)}"})
+            json_config["mcp"]["servers"][name] = pooled
+    return json_config
+
+
+def _error(request_id, code: int, message: str) -> Dict:
+    return {"jsonrpc": "2.0", "id": request_id, "error": {"code": code, "message": message}}
+
+
+class PooledServer:
+    """One stdio MCP server process shared by many client sessions"""
+
+    def __init__(self, key: str, config: Dict):
+        self.key = key
+        self.config = config
+        self.name = config.get("name", key)
+        self.semaphore = asyncio.Semaphore(config.get("max_concurrency", DEFAULT_MAX_CONCURRENCY))
+        self.process = None
+        self.reader_task = None
+        self.stderr_task = None
+        self.pending = {}
+        self.ids = itertools.count(1)
+        self.initialize_result = None
+        self.started_at = None
+        self.restarts = 0
+        self.failures = 0
+        self.requests = 0
+        self._lock = asyncio.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self.process is not None and self.process.returncode is None and self.initialize_result is not None
+
+    async def start(self):
+        started = time.perf_counter()
+        env = {**os.environ, **{k: str(v) for k, v in (self.config.get("env") or {}).items()}}
+        self.process = await asyncio.create_subprocess_exec(
+            self.config["command"], *self.config.get("args", []),
+            stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+            env=env, cwd=self.config.get("cwd"), limit=STREAM_LIMIT
+        )
+        self.reader_task = asyncio.create_task(self._read_loop(self.process), name=f"mcp-pool-{self.key}")
+        self.stderr_task = asyncio.create_task(self._drain_stderr(self.process))
+        response = await self._send_request("initialize", {
+            "protocolVersion": PROTOCOL_VERSION,
+            "capabilities": {},
+            "clientInfo": {"name": "agent-manager-mcp-pool", "version": "1.0.0"},
+        }, timeout=REQUEST_TIMEOUT)
+        if "error" in response:
+            await self.stop()
+            raise RuntimeError(f"MCP server '{self.name}' failed to initialize: {response['error']}")
+        await self._write({"jsonrpc": "2.0", "method": "notifications/initialized"})
+        self.initialize_result = response["result"]
+        self.started_at = time.time()
+        self.failures = 0
+        logger.info(f"Started pooled MCP server '{self.name}'", extra={
+            "event": "mcp_pool_start", "server": self.name, "key": self.key, "pid": self.process.pid,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 1)
+        })
+
+    async def _write(self, message: Dict):
+        if self.process is None:
+            raise ConnectionError("process is not running")
+        self.process.stdin.write(json.dumps(message, separators=(',', ':')).encode("utf-8") + b"\n")
+        await self.process.stdin.drain()
+
+    async def _read_loop(self, process):
+        try:
+            while True:
+                line = await process.stdout.readline()
+                if not line:
+                    break
+                try:
+                    message = json.loads(line)
+                except ValueError:
+                    logger.debug(f"Non JSON-RPC output from '{self.name}': {line[:200]!r}")
+                    continue
+                if "method" not in message:
+                    future = self.pending.pop(message.get("id"), None)
+                    if future and not future.done():
+                        future.set_result(message)
+                elif "id" in message:
+                    # The pool declares no client capabilities (sampling, roots), so refuse server requests
+                    await self._write(_error(message["id"], -32601, "Method not supported by the MCP pool"))
+                else:
+                    logger.debug(f"Notification from '{self.name}': {message.get('method')}")
+        finally:
+            # After a restart the pending requests belong to the new process
+            if process is self.process:
+                self._fail_pending(f"MCP server '{self.name}' exited")
+
+    async def _drain_stderr(self, process):
+        while True:
+            line = await process.stderr.readline()
+            if not line:
+                break
+            logger.debug(f"[{self.name}] {line.decode('utf-8', errors='replace').rstrip()}")
+
+    def _fail_pending(self, reason: str):
+        pending, self.pending = self.pending, {}
+        for request_id, future in pending.items():
+            if not future.done():
+                future.set_result(_error(request_id, -32603, reason))
+
+    async def _send_request(self, method: str, params, timeout: float) -> Dict:
+        request_id = next(self.ids)
+        future = asyncio.get_running_loop().create_future()
+        self.pending[request_id] = future
+        message = {"jsonrpc": "2.0", "id": request_id, "method": method}
+        if params is not None:
+            message["params"] = params
+        try:
+            await self._write(message)
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            return _error(request_id, -32603, f"MCP server '{self.name}' timed out after {timeout}s")
+        except (ConnectionError, RuntimeError) as e:
+            return _error(request_id, -32603, f"MCP server '{self.name}' is unavailable: {e}")
+        finally:
+            self.pending.pop(request_id, None)
+
+    async def request(self, message: Dict) -> Dict:
+        """Forward a client request, returning the response under the client's id"""
+        async with self.semaphore:
+            self.requests += 1
+            response = await self._send_request(message["method"], message.get("params"), REQUEST_TIMEOUT)
+        return {**response, "id": message["id"]}
+
+    async def check_health(self):
+        """Restart the server if it exited or does not answer a ping"""
+        async with self._lock:
+            if self.process is None:
+                return
+            healthy = self.process.returncode is None
+            if healthy:
+                response = await self._send_request("ping", None, PING_TIMEOUT)
+                healthy = "error" not in response
+            if healthy:
+                return
+            self.failures += 1
+            logger.warning(f"Pooled MCP server '{self.name}' is unhealthy, restarting", extra={
+                "event": "mcp_pool_restart", "server": self.name, "key": self.key, "failures": self.failures
+            })
+            await self.stop()
+            await asyncio.sleep(min(MAX_RESTART_BACKOFF, 2 ** (self.failures - 1)))
+            self.restarts += 1
+            try:
+                await self.start()
+            except Exception as e:
+                logger.error(f"Failed to restart pooled MCP server '{self.name}': {e}")
+
+    async def stop(self):
+        process, self.process = self.process, None
+        self.initialize_result = None
+        if process is not None and process.returncode is None:
+            process.terminate()
+            try:
+                await asyncio.wait_for(process.wait(), 5)
+            except asyncio.TimeoutError:
+                process.kill()
+                await process.wait()
+        for task in (self.reader_task, self.stderr_task):
+            if task:
+                task.cancel()
+        self._fail_pending(f"MCP server '{self.name}' stopped")
+
+    def stats(self) -> Dict:
+        return {
+            "name": self.name,
+            "running": self.running,
+            "pid": self.process.pid if self.process else None,
+            "in_flight": len(self.pending),
+            "requests": self.requests,
+            "restarts": self.restarts,
+            "started_at": self.started_at,
+        }
+
+
+class McpServerPool:
+    """Shared MCP servers keyed by server_key, started on first use"""
+
+    def __init__(self, resolve_definition: Callable[[str], Optional[Dict]]):
+        self.resolve_definition = resolve_definition
+        self.servers = {}
+        self._lock = asyncio.Lock()
+        self.health_task = None
+
+    def start(self):
+        self.health_task = asyncio.create_task(self._health_loop(), name="mcp-pool-health")
+
+    async def _health_loop(self):
+        while True:
+            await asyncio.sleep(HEALTH_INTERVAL)
+            for server in list(self.servers.values()):
+                try:
+                    await server.check_health()
+                except Exception as e:
+                    logger.warning(f"Health check of pooled MCP server '{server.name}' failed: {e}")
+
+    async def get(self, key: str) -> Optional[PooledServer]:
+        server = self.servers.get(key)
+        if server is not None and server.running:
+            return server
+        async with self._lock:
+            server = self.servers.get(key)
+            if server is None:
+                config = self.resolve_definition(key)
+                if config is None:
+                    return None
+                server = PooledServer(key, config)
+                self.servers[key] = server
+        # Per-server lock, shared with health checks, so only one caller (re)starts it
+        async with server._lock:
+            if not server.running:
+                await server.stop()
+                await server.start()
+        return server
+
+    async def handle(self, key: str, payload, session_id: str = None):
+        """
+        Serve one streamable-HTTP POST body (a JSON-RPC message or batch)
+
+        Returns:
+            (response body or None for 202 Accepted, response headers)
+        """
+        server = await self.get(key)
+        if server is None:
+            raise KeyError(key)
+        headers = {}
+        messages = payload if isinstance(payload, list) else [payload]
+        calls = []
+        for message in messages:
+            if "method" not in message or "id" not in message:
+                # Notifications and client responses: the pooled session is shared, nothing to forward
+                continue
+            if message["method"] == "initialize":
+                headers["mcp-session-id"] = session_id or uuid.uuid4().hex
+                calls.append(self._reply(message, server.initialize_result))
+            elif message["method"] == "ping":
+                calls.append(self._reply(message, {}))
+            else:
+                calls.append(server.request(message))
+        responses = await asyncio.gather(*calls)
+        if not responses:
+            return None, headers
+        return (responses if isinstance(payload, list) else responses[0]), headers
+
+    @staticmethod
+    async def _reply(message: Dict, result) -> Dict:
+        return {"jsonrpc": "2.0", "id": message["id"], "result": result}
+
+    def stats(self) -> Dict:
+        return {key: server.stats() for key, server in self.servers.items()}
+
+    async def close(self):
+        if self.health_task:
+            self.health_task.cancel()
+        for server in list(self.servers.values()):
+            await server.stop()
+        self.servers = {}
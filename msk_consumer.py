@@ -10,6 +10,9 @@ from aws_msk_iam_sasl_signer import MSKAuthTokenProvider
 import ssl
 import signal
 import sys
+import time
+
+import serializers
 
 def load_msk_config(config_dict=None):
     """
@@ -27,6 +30,12 @@ def load_msk_config(config_dict=None):
             'topic_name': config_dict.get('topic_name', TOPIC_NAME),
             'aws_region': config_dict.get('aws_region', AWS_REGION),
             'consumer_group': config_dict.get('consumer_group', CONSUMER_GROUP),
+            'consume_mode': config_dict.get('consume_mode', CONSUME_MODE),
+            'batch_max_records': config_dict.get('batch_max_records', BATCH_MAX_RECORDS),
+            'batch_timeout_ms': config_dict.get('batch_timeout_ms', BATCH_TIMEOUT_MS),
+            'output_mode': config_dict.get('output_mode', OUTPUT_MODE),
+            'summary_interval': config_dict.get('summary_interval', SUMMARY_INTERVAL),
+            'sample_every': config_dict.get('sample_every', SAMPLE_EVERY),
         }
     
     return {
@@ -34,6 +43,12 @@ def load_msk_config(config_dict=None):
         'topic_name': TOPIC_NAME,
         'aws_region': AWS_REGION,
         'consumer_group': CONSUMER_GROUP,
+        'consume_mode': CONSUME_MODE,
+        'batch_max_records': BATCH_MAX_RECORDS,
+        'batch_timeout_ms': BATCH_TIMEOUT_MS,
+        'output_mode': OUTPUT_MODE,
+        'summary_interval': SUMMARY_INTERVAL,
+        'sample_every': SAMPLE_EVERY,
     }
 
 # Configuration - Load from environment variables with defaults
@@ -42,6 +57,15 @@ BOOTSTRAP_SERVERS = os.environ.get('MSK_BOOTSTRAP_SERVERS',
 TOPIC_NAME = os.environ.get('MSK_TOPIC_NAME', 'my-test-topic')
 AWS_REGION = os.environ.get('AWS_REGION', 'ap-south-1')
 CONSUMER_GROUP = os.environ.get('MSK_CONSUMER_GROUP', 'my-consumer-group')
+# "stream" handles one record at a time, "batch" uses getmany()
+CONSUME_MODE = os.environ.get('MSK_CONSUME_MODE', 'stream')
+BATCH_MAX_RECORDS = int(os.environ.get('MSK_BATCH_MAX_RECORDS', '500'))
+BATCH_TIMEOUT_MS = int(os.environ.get('MSK_BATCH_TIMEOUT_MS', '1000'))
+# Batch output: "summary" (periodic stats only), "sampled" (stats plus every
+# Nth record on one line) or "verbose" (full details for every record)
+OUTPUT_MODE = os.environ.get('MSK_OUTPUT_MODE', 'summary')
+SUMMARY_INTERVAL = float(os.environ.get('MSK_SUMMARY_INTERVAL', '5'))
+SAMPLE_EVERY = int(os.environ.get('MSK_SAMPLE_EVERY', '1000'))
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -101,7 +125,8 @@ async def create_consumer(bootstrap_servers, topic_name, consumer_group):
             ssl_context=create_ssl_context(),
             sasl_mechanism='OAUTHBEARER',
             sasl_oauth_token_provider=tp,
-            value_deserializer=lambda m: json.loads(m.decode('utf-8')) if m else None,
+            # Values stay raw bytes; they are decoded per record according
+            # to the content-type header (JSON when absent)
             key_deserializer=lambda k: k.decode('utf-8') if k else None,
             auto_offset_reset='earliest',  # Start from beginning if no committed offset
             enable_auto_commit=True,
@@ -121,6 +146,46 @@ async def create_consumer(bootstrap_servers, topic_name, consumer_group):
         logger.error(f"Failed to create consumer: {str(e)}")
         return None
 
+def decode_value(msg):
+    """
+    Decode a record value, falling back to the raw bytes if it can't be decoded
+    """
+    try:
+        return serializers.decode_record(msg)
+    except Exception as e:
+        logger.warning(f"   Could not decode value: {e}")
+        return msg.value
+
+def log_message_details(msg, message_count):
+    """
+    Log every field of a single record, pretty printing its value
+    """
+    logger.info(f"📨 Message #{message_count}")
+    logger.info(f"   Topic: {msg.topic}")
+    logger.info(f"   Partition: {msg.partition}")
+    logger.info(f"   Offset: {msg.offset}")
+    logger.info(f"   Timestamp: {msg.timestamp}")
+    logger.info(f"   Key: {msg.key}")
+    
+    value = decode_value(msg)
+    logger.info(f"   Content-Type: {serializers.content_type_from_headers(msg.headers)}")
+    
+    # Pretty print the message value
+    if value:
+        logger.info("   Value:")
+        try:
+            # Pretty print JSON
+            formatted_json = json.dumps(value, indent=4)
+            for line in formatted_json.split('\n'):
+                logger.info(f"     {line}")
+        except Exception as e:
+            logger.info(f"     {value}")
+            logger.warning(f"     (Could not format as JSON: {e})")
+    else:
+        logger.info("   Value: None")
+    
+    logger.info("-" * 60)
+
 async def consume_messages(consumer):
     """
     Consume messages from the Kafka topic
@@ -136,37 +201,115 @@ async def consume_messages(consumer):
                 break
                 
             message_count += 1
+            log_message_details(msg, message_count)
             
-            # Display message information
-            logger.info(f"📨 Message #{message_count}")
-            logger.info(f"   Topic: {msg.topic}")
-            logger.info(f"   Partition: {msg.partition}")
-            logger.info(f"   Offset: {msg.offset}")
-            logger.info(f"   Timestamp: {msg.timestamp}")
-            logger.info(f"   Key: {msg.key}")
+    except asyncio.CancelledError:
+        logger.info("Consumer cancelled")
+    except Exception as e:
+        logger.error(f"Error consuming messages: {str(e)}")
+    finally:
+        logger.info(f"Total messages consumed: {message_count}")
+
+class ConsumerStats:
+    """
+    Running counters for batch mode, reported as one summary line per interval
+    """
+    def __init__(self):
+        self.started = time.monotonic()
+        self.total_messages = 0
+        self.total_bytes = 0
+        self.interval_started = self.started
+        self.interval_messages = 0
+        self.interval_bytes = 0
+        self.lag = {}
+    
+    def record_batch(self, consumer, tp, records):
+        """
+        Count a batch of records from one partition and update its lag
+        """
+        size = 0
+        for record in records:
+            size += max(record.serialized_value_size, 0) + max(record.serialized_key_size, 0)
+        self.total_messages += len(records)
+        self.total_bytes += size
+        self.interval_messages += len(records)
+        self.interval_bytes += size
+        
+        # Lag is the distance between the high watermark and the next offset to read
+        highwater = consumer.highwater(tp)
+        if highwater is not None:
+            self.lag[tp] = max(highwater - (records[-1].offset + 1), 0)
+    
+    def summary(self):
+        """
+        Build the summary line for the current interval and reset its counters
+        """
+        now = time.monotonic()
+        elapsed = max(now - self.interval_started, 1e-6)
+        rate = self.interval_messages / elapsed
+        throughput_kb = self.interval_bytes / elapsed / 1024
+        total_lag = sum(self.lag.values())
+        per_partition = ", ".join(f"{tp.partition}={lag}" for tp, lag in sorted(self.lag.items()))
+        line = (f"📊 {self.interval_messages} msgs ({self.interval_bytes} bytes) in {elapsed:.1f}s | "
+                f"{rate:.1f} msg/s, {throughput_kb:.1f} KiB/s | total {self.total_messages} msgs | "
+                f"lag {total_lag} [{per_partition}]")
+        self.interval_started = now
+        self.interval_messages = 0
+        self.interval_bytes = 0
+        return line
+
+async def consume_batches(consumer, max_records=BATCH_MAX_RECORDS, timeout_ms=BATCH_TIMEOUT_MS,
+                          output_mode=OUTPUT_MODE, summary_interval=SUMMARY_INTERVAL,
+                          sample_every=SAMPLE_EVERY):
+    """
+    Consume messages in batches with consumer.getmany()
+    
+    Args:
+        consumer: Started AIOKafkaConsumer
+        max_records: Upper bound on records returned per getmany() call
+        timeout_ms: How long getmany() waits for data when the topic is idle
+        output_mode: "summary", "sampled" or "verbose"
+        summary_interval: Seconds between summary lines
+        sample_every: In "sampled" mode, log one line for every Nth record
+    """
+    stats = ConsumerStats()
+    next_summary = time.monotonic() + summary_interval
+    
+    try:
+        logger.info(f"Starting batch consumption (max_records={max_records}, timeout_ms={timeout_ms}, "
+                    f"output={output_mode})... (Press Ctrl+C to stop)")
+        logger.info("=" * 60)
+        
+        while not shutdown_event.is_set():
+            batches = await consumer.getmany(timeout_ms=timeout_ms, max_records=max_records)
             
-            # Pretty print the message value
-            if msg.value:
-                logger.info("   Value:")
-                try:
-                    # Pretty print JSON
-                    formatted_json = json.dumps(msg.value, indent=4)
-                    for line in formatted_json.split('\n'):
-                        logger.info(f"     {line}")
-                except Exception as e:
-                    logger.info(f"     {msg.value}")
-                    logger.warning(f"     (Could not format as JSON: {e})")
-            else:
-                logger.info("   Value: None")
+            for tp, records in batches.items():
+                if not records:
+                    continue
+                first_count = stats.total_messages
+                stats.record_batch(consumer, tp, records)
+                
+                if output_mode == 'verbose':
+                    for i, msg in enumerate(records, start=1):
+                        log_message_details(msg, first_count + i)
+                elif output_mode == 'sampled':
+                    for i, msg in enumerate(records, start=1):
+                        if (first_count + i) % sample_every == 0:
+                            logger.info(f"🔎 #{first_count + i} {msg.topic}[{msg.partition}]@{msg.offset} "
+                                        f"key={msg.key} value={decode_value(msg)}")
             
-            logger.info("-" * 60)
+            if time.monotonic() >= next_summary:
+                logger.info(stats.summary())
+                next_summary = time.monotonic() + summary_interval
             
     except asyncio.CancelledError:
         logger.info("Consumer cancelled")
     except Exception as e:
         logger.error(f"Error consuming messages: {str(e)}")
     finally:
-        logger.info(f"Total messages consumed: {message_count}")
+        elapsed = max(time.monotonic() - stats.started, 1e-6)
+        logger.info(f"Total messages consumed: {stats.total_messages} "
+                    f"({stats.total_bytes} bytes, {stats.total_messages / elapsed:.1f} msg/s average)")
 
 def signal_handler(signum, frame):
     """
@@ -186,9 +329,11 @@ async def main():
     signal.signal(signal.SIGINT, signal_handler)
     signal.signal(signal.SIGTERM, signal_handler)
     
+    config = load_msk_config()
+    
     # Create consumer
-    logger.info(f"Creating consumer for topic '{TOPIC_NAME}'...")
-    consumer = await create_consumer(BOOTSTRAP_SERVERS, TOPIC_NAME, CONSUMER_GROUP)
+    logger.info(f"Creating consumer for topic '{config['topic_name']}'...")
+    consumer = await create_consumer(config['bootstrap_servers'], config['topic_name'], config['consumer_group'])
     if not consumer:
         logger.error("Failed to create consumer. Exiting.")
         return
@@ -200,7 +345,17 @@ async def main():
             logger.info(f"Assigned partitions: {[tp.partition for tp in partitions]}")
         
         # Start consuming messages
-        consume_task = asyncio.create_task(consume_messages(consumer))
+        if config['consume_mode'] == 'batch':
+            consume_task = asyncio.create_task(consume_batches(
+                consumer,
+                max_records=config['batch_max_records'],
+                timeout_ms=config['batch_timeout_ms'],
+                output_mode=config['output_mode'],
+                summary_interval=config['summary_interval'],
+                sample_every=config['sample_every']
+            ))
+        else:
+            consume_task = asyncio.create_task(consume_messages(consumer))
         
         # Wait for shutdown signal
         await shutdown_event.wait()
@@ -1,7 +1,6 @@
 #!/usr/bin/env python3
 
 import asyncio
-import json
 import time
 import logging
 import os
@@ -14,6 +13,8 @@ from aiokafka.abc import AbstractTokenProvider
 from aws_msk_iam_sasl_signer import MSKAuthTokenProvider
 import ssl
 
+import serializers
+
 def load_msk_config(config_dict=None):
     """
     Load MSK configuration from dictionary or environment variables
@@ -31,6 +32,7 @@ def load_msk_config(config_dict=None):
             'aws_region': config_dict.get('aws_region', AWS_REGION),
             'aws_access_key_id': config_dict.get('aws_access_key_id'),
             'aws_secret_access_key': config_dict.get('aws_secret_access_key'),
+            'content_type': config_dict.get('content_type', CONTENT_TYPE),
         }
     
     return {
@@ -39,6 +41,7 @@ def load_msk_config(config_dict=None):
         'aws_region': AWS_REGION,
         'aws_access_key_id': AWS_ACCESS_KEY_ID,
         'aws_secret_access_key': AWS_SECRET_ACCESS_KEY,
+        'content_type': CONTENT_TYPE,
     }
 
 # Configuration - Load from environment variables with defaults
@@ -48,6 +51,8 @@ TOPIC_NAME = os.environ.get('MSK_TOPIC_NAME', 'my-test-topic')
 AWS_ACCESS_KEY_ID = os.environ.get('AWS_ACCESS_KEY_ID')
 AWS_SECRET_ACCESS_KEY = os.environ.get('AWS_SECRET_ACCESS_KEY')
 AWS_REGION = os.environ.get('AWS_REGION', 'ap-south-1')
+# Wire format for message values: "json" (default) or "msgpack"
+CONTENT_TYPE = os.environ.get('MSK_CONTENT_TYPE', serializers.JSON_CONTENT_TYPE)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -148,7 +153,8 @@ async def create_producer(bootstrap_servers):
             ssl_context=create_ssl_context(),
             sasl_mechanism='OAUTHBEARER',
             sasl_oauth_token_provider=tp,
-            value_serializer=lambda v: json.dumps(v).encode('utf-8'),
+            # Values are encoded per message by serializers.encode so the
+            # content-type header always matches the payload
             key_serializer=lambda k: k.encode('utf-8') if k else None,
             acks='all',  # Wait for all replicas to acknowledge
             client_id='msk_producer',
@@ -163,7 +169,15 @@ async def create_producer(bootstrap_servers):
         logger.error(f"Failed to create producer: {str(e)}")
         return None
 
-async def send_messages(producer, topic_name, num_messages=10):
+async def send_message(producer, topic_name, value, key=None, content_type=None):
+    """
+    Encode a value with the requested wire format and send it with a
+    matching content-type header. Returns the record metadata.
+    """
+    payload, headers = serializers.encode(value, content_type or CONTENT_TYPE)
+    return await producer.send_and_wait(topic_name, value=payload, key=key, headers=headers)
+
+async def send_messages(producer, topic_name, num_messages=10, content_type=None):
     """
     Send sample messages to the Kafka topic asynchronously
     """
@@ -185,7 +199,7 @@ async def send_messages(producer, topic_name, num_messages=10):
             key = f'key_{i}'
             
             # Send and wait for acknowledgment
-            record_metadata = await producer.send_and_wait(topic_name, key=key, value=message)
+            record_metadata = await send_message(producer, topic_name, message, key=key, content_type=content_type)
             
             logger.info(f"Message {i} sent to topic '{record_metadata.topic}' "
                        f"partition {record_metadata.partition} offset {record_metadata.offset}")
@@ -0,0 +1,140 @@
+"""
+Per-partition worker tasks for the agent runtime.
+
+Each assigned partition gets its own queue and worker task, so records from
+one partition are processed strictly in order while different partitions
+are processed concurrently. The pool is broker agnostic: the consume loop
+submits records keyed by partition and reacts to rebalances by calling
+assign() and revoke().
+"""
+
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class PartitionWorker:
+    """Sequential worker for a single partition"""
+
+    def __init__(self, partition, pool):
+        self.partition = partition
+        self.pool = pool
+        self.queue = asyncio.Queue()
+        self.in_flight = None
+        self.paused = False
+        self.processed = 0
+        self.task = asyncio.create_task(self._run(), name=f"partition-worker-{partition}")
+
+    async def _run(self):
+        while True:
+            record = await self.queue.get()
+            self.in_flight = record
+            try:
+                try:
+                    await self.pool.handler(record)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.error(f"Error processing record from partition {self.partition}: {e}")
+                self.processed += 1
+                # Offsets are only reported once the handler has finished so that
+                # anything still queued is redelivered to the next owner
+                if self.pool.on_processed:
+                    try:
+                        await self.pool.on_processed(self.partition, record)
+                    except Exception as e:
+                        logger.warning(f"Failed to acknowledge record from partition {self.partition}: {e}")
+            finally:
+                # Marked done only after the acknowledgement, so stop() waits for the commit too
+                self.in_flight = None
+                self.queue.task_done()
+            if self.paused and self.queue.qsize() <= self.pool.resume_threshold:
+                self.paused = False
+                if self.pool.on_resume:
+                    self.pool.on_resume(self.partition)
+
+    def drop_pending(self):
+        """Discard queued records that have not started processing"""
+        dropped = 0
+        while not self.queue.empty():
+            self.queue.get_nowait()
+            self.queue.task_done()
+            dropped += 1
+        return dropped
+
+    async def stop(self, timeout):
+        """Let the in-flight record finish and be acknowledged (up to timeout), then cancel the worker"""
+        dropped = self.drop_pending()
+        if self.in_flight is not None:
+            try:
+                await asyncio.wait_for(asyncio.shield(self.queue.join()), timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"Partition {self.partition} still busy after {timeout}s, cancelling in-flight record")
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        return dropped
+
+
+class PartitionWorkerPool:
+    """
+    Keeps one PartitionWorker per assigned partition
+
+    Args:
+        handler: Coroutine function called with each record
+        max_pending: Queued records per partition before on_pause is called
+        revoke_timeout: Seconds to wait for an in-flight record when its
+            partition is revoked
+        on_processed: Optional coroutine (partition, record) run after each record
+        on_pause / on_resume: Optional callbacks (partition) used for backpressure
+    """
+
+    def __init__(self, handler, max_pending=100, revoke_timeout=10.0,
+                 on_processed=None, on_pause=None, on_resume=None):
+        self.handler = handler
+        self.max_pending = max(1, max_pending)
+        self.resume_threshold = self.max_pending // 2
+        self.revoke_timeout = revoke_timeout
+        self.on_processed = on_processed
+        self.on_pause = on_pause
+        self.on_resume = on_resume
+        self.workers = {}
+
+    def assign(self, partitions):
+        """Start workers for newly assigned partitions"""
+        for partition in partitions:
+            if partition not in self.workers:
+                self.workers[partition] = PartitionWorker(partition, self)
+                logger.info(f"Started worker for partition {partition}")
+
+    async def revoke(self, partitions):
+        """Stop the workers of revoked partitions concurrently"""
+        workers = [self.workers.pop(p) for p in list(partitions) if p in self.workers]
+        if not workers:
+            return
+        results = await asyncio.gather(*(w.stop(self.revoke_timeout) for w in workers))
+        for worker, dropped in zip(workers, results):
+            logger.info(f"Stopped worker for partition {worker.partition} "
+                        f"({worker.processed} processed, {dropped} returned for redelivery)")
+
+    def submit(self, partition, record):
+        """
+        Queue a record on its partition's worker.
+        Returns False if the partition is not (or no longer) assigned.
+        """
+        worker = self.workers.get(partition)
+        if worker is None:
+            return False
+        worker.queue.put_nowait(record)
+        if not worker.paused and worker.queue.qsize() >= self.max_pending:
+            worker.paused = True
+            if self.on_pause:
+                self.on_pause(partition)
+        return True
+
+    async def close(self):
+        """Stop every worker"""
+        await self.revoke(list(self.workers))
@@ -0,0 +1,164 @@
+"""
+Cache of orchestrator plans for recurring objectives.
+
+Agents often run the same kind of objective again and again (the initial
+price check, a periodic "tweet about price action"), and each run asks the
+planner model for the same plan. The cache stores the plans of a completed
+run under the normalized objective plus a fingerprint of the subagents and
+orchestrator settings, and replays them on the next matching objective. The
+steps themselves still run against the subagents, so results stay fresh;
+only the planning round trips are skipped. The synthesis call still runs.
+
+Entries expire after a TTL. Changing the subagent set changes the
+fingerprint, and a cached plan that names an agent the orchestrator no
+longer has is dropped. If a replay needs more planning rounds than were
+cached, the planner takes over and the cache entry is refreshed.
+
+fast-agent has no hook around planning, so install() wraps
+OrchestratorAgent._execute_plan, _get_full_plan and _get_next_step.
+"""
+
+import contextvars
+import hashlib
+import logging
+from typing import Dict, List, Optional
+
+from caching import RedisStore, TTLCache, redis_settings
+from result_cache import normalize_task
+
+logger = logging.getLogger(__name__)
+
+# Planning state of the orchestration running in the current task
+_replay = contextvars.ContextVar("plan_cache_replay", default=None)
+
+
+class PlanCache:
+    """Orchestrator plans by (normalized objective, subagent/orchestrator fingerprint)"""
+
+    def __init__(self, fingerprint: str, ttl_seconds: float, max_entries: int = 1000, store: RedisStore = None):
+        self.fingerprint = fingerprint
+        self.ttl_seconds = ttl_seconds
+        self.local = TTLCache(max_entries)
+        self.store = store
+        self.hits = 0
+        self.misses = 0
+        self.invalidated = 0
+        self.planning_calls_saved = 0
+
+    @classmethod
+    def from_runtime_config(cls, runtime_config: Dict, json_config: Dict, fingerprint: str):
+        """Cache configured by the agent's runtime_config, or None when plan caching is off"""
+        ttl_seconds = runtime_config.get("plan_cache_ttl_seconds") or 0
+        if ttl_seconds <= 0:
+            return None
+        store = None
+        if runtime_config.get("plan_cache_backend", "memory") == "redis":
+            store = RedisStore("agent_plan_cache:", **redis_settings(json_config))
+        return cls(fingerprint, ttl_seconds, runtime_config.get("plan_cache_max_entries", 1000), store)
+
+    def key(self, objective: str) -> str:
+        digest = hashlib.sha256(normalize_task(objective).encode("utf-8")).hexdigest()
+        return f"{self.fingerprint}:{digest}"
+
+    async def get(self, objective: str, agent_names) -> Optional[List[Dict]]:
+        """Cached planning rounds for objective, if every agent they name still exists"""
+        key = self.key(objective)
+        plans = self.local.get(key)
+        if plans is None and self.store is not None:
+            plans, remaining = await self.store.get_with_ttl(key)
+            if plans is not None and remaining > 0:
+                # Only for what is left of the Redis TTL, so a plan never outlives ttl_seconds
+                self.local.set(key, plans, min(remaining, self.ttl_seconds))
+        if plans is None:
+            return None
+        named = {task["agent"] for plan in plans for step in _steps(plan) for task in step.get("tasks", [])}
+        if not named <= set(agent_names):
+            self.invalidated += 1
+            self.local.pop(key)
+            logger.info("Dropped cached plan naming unknown agents", extra={
+                "event": "plan_cache", "outcome": "invalidated", "agents": sorted(named - set(agent_names))
+            })
+            return None
+        return plans
+
+    async def put(self, objective: str, plans: List[Dict]):
+        key = self.key(objective)
+        self.local.set(key, plans, self.ttl_seconds)
+        if self.store is not None:
+            await self.store.set(key, plans, self.ttl_seconds)
+
+    def install(self) -> bool:
+        """Patch fast-agent's orchestrator; returns False (plans are never cached) if it could not be patched"""
+        try:
+            from mcp_agent.agents.workflow.orchestrator_agent import OrchestratorAgent
+            from mcp_agent.agents.workflow.orchestrator_models import NextStep, Plan
+        except ImportError as e:
+            logger.warning(f"Plan cache disabled: {e}")
+            return False
+
+        cache = self
+        original_execute_plan = OrchestratorAgent._execute_plan
+
+        async def _execute_plan(orchestrator, objective, request_params):
+            cached = await cache.get(objective, orchestrator.agents.keys())
+            state = {"cached": cached or [], "recorded": [], "planned": 0}
+            token = _replay.set(state)
+            try:
+                plan_result = await original_execute_plan(orchestrator, objective, request_params)
+            finally:
+                _replay.reset(token)
+            replayed = len(state["recorded"]) - state["planned"]
+            if cached is not None:
+                cache.hits += 1
+                cache.planning_calls_saved += replayed
+            else:
+                cache.misses += 1
+            logger.info("Plan cache " + ("hit" if cached is not None else "miss"), extra={
+                "event": "plan_cache", "outcome": "hit" if cached is not None else "miss",
+                "replayed": replayed, "planned": state["planned"], **cache.stats()
+            })
+            # Only plans that carried a run to completion are worth replaying
+            completed = plan_result.is_complete and not getattr(plan_result, "max_iterations_reached", False)
+            if state["planned"] and state["recorded"] and completed:
+                await cache.put(objective, state["recorded"])
+            return plan_result
+
+        def replaying(original, model):
+            async def plan(orchestrator, objective, plan_result, request_params):
+                state = _replay.get()
+                if state is None:
+                    return await original(orchestrator, objective, plan_result, request_params)
+                round_index = len(state["recorded"])
+                if round_index < len(state["cached"]) and not state["planned"]:
+                    planned = model.model_validate(state["cached"][round_index])
+                else:
+                    planned = await original(orchestrator, objective, plan_result, request_params)
+                    if planned is None:
+                        return None
+                    state["planned"] += 1
+                state["recorded"].append(planned.model_dump(mode="json"))
+                return planned
+            return plan
+
+        OrchestratorAgent._execute_plan = _execute_plan
+        OrchestratorAgent._get_full_plan = replaying(OrchestratorAgent._get_full_plan, Plan)
+        OrchestratorAgent._get_next_step = replaying(OrchestratorAgent._get_next_step, NextStep)
+        return True
+
+    def stats(self) -> Dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidated": self.invalidated,
+            "planning_calls_saved": self.planning_calls_saved,
+            "entries": len(self.local),
+        }
+
+    async def close(self):
+        if self.store is not None:
+            await self.store.close()
+
+
+def _steps(plan: Dict) -> List[Dict]:
+    """Steps of a cached Plan, or the single step of a cached NextStep"""
+    return plan["steps"] if "steps" in plan else [plan]
@@ -0,0 +1,65 @@
+"""
+Long-lived, shared publishing transports for agent_manager.
+
+Agents that use the same broker share one started transport (and therefore
+one producer connection), so submitting a message costs a publish round trip
+rather than a full connect/authenticate/create-topic cycle.
+"""
+
+import asyncio
+import json
+import logging
+from typing import Dict, List
+
+from transports import backend_of, create_transport
+
+logger = logging.getLogger(__name__)
+
+
+class ProducerPool:
+    """Started transports keyed by broker connection settings"""
+
+    def __init__(self):
+        self.transports = {}
+        self._lock = asyncio.Lock()
+
+    @staticmethod
+    def pool_key(pubsub_config: Dict) -> str:
+        """Agents on the same backend, broker settings and content type share a producer"""
+        backend = backend_of(pubsub_config)
+        settings = pubsub_config.get(backend, {})
+        content_type = pubsub_config.get("content_type")
+        return f"{backend}:{content_type or ''}:{json.dumps(settings, sort_keys=True, default=str)}"
+
+    async def get(self, pubsub_config: Dict):
+        """Return the shared transport for a pubsub_config, starting it on first use"""
+        key = self.pool_key(pubsub_config)
+        transport = self.transports.get(key)
+        if transport is not None:
+            return transport
+        async with self._lock:
+            transport = self.transports.get(key)
+            if transport is None:
+                transport = create_transport(pubsub_config)
+                await transport.start()
+                await transport.warm()
+                self.transports[key] = transport
+                logger.info(f"Started shared {transport.backend} producer")
+        return transport
+
+    async def warm(self, pubsub_configs: List[Dict]):
+        """Connect producers ahead of the first request; failures are only logged"""
+        for pubsub_config in pubsub_configs:
+            try:
+                await self.get(pubsub_config)
+            except Exception as e:
+                logger.warning(f"Failed to warm {backend_of(pubsub_config)} producer: {e}")
+
+    async def close(self):
+        async with self._lock:
+            transports, self.transports = list(self.transports.values()), {}
+        for transport in transports:
+            try:
+                await transport.close()
+            except Exception as e:
+                logger.warning(f"Error closing shared producer: {e}")
@@ -0,0 +1,90 @@
+"""
+Progress events of the task being processed.
+
+A reply only carries the final result of an orchestration, so streaming
+clients would see nothing until the whole plan has run. While a task is
+processed, its intermediate output is published to the request's reply
+channel (which the manager's SSE / WebSocket stream subscribes to) as
+"progress" events:
+
+- plan: the orchestrator's plan (full planning) or next step (iterative)
+- step: a completed plan step with the result of each subagent task
+- subagent: a subagent's response in the parallel workflow
+
+fast-agent has no hook for these, so install() wraps
+OrchestratorAgent._get_full_plan, _get_next_step and _execute_step. The
+reporter is bound to the task through a context variable, so concurrent
+partitions never mix their events.
+"""
+
+import contextvars
+import logging
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_reporter = contextvars.ContextVar("progress_reporter", default=None)
+
+
+@contextmanager
+def reporting(reporter: Optional[Callable]):
+    """Send the progress events raised inside the block to reporter(stage, **fields)"""
+    token = _reporter.set(reporter)
+    try:
+        yield
+    finally:
+        _reporter.reset(token)
+
+
+def report(stage: str, **fields):
+    """Progress event for the task being processed; dropped when nobody listens"""
+    reporter = _reporter.get()
+    if reporter is None:
+        return
+    try:
+        reporter(stage, **fields)
+    except Exception as e:
+        logger.debug(f"Failed to report {stage} progress: {e}")
+
+
+def _steps(steps) -> List[Dict]:
+    return [{"description": step.description, "agents": [task.agent for task in step.tasks]} for step in steps]
+
+
+def install() -> bool:
+    """Patch fast-agent's orchestrator; returns False (no plan or step events) if it could not be patched"""
+    try:
+        from mcp_agent.agents.workflow.orchestrator_agent import OrchestratorAgent
+    except ImportError as e:
+        logger.warning(f"Orchestrator progress events disabled: {e}")
+        return False
+
+    original_get_full_plan = OrchestratorAgent._get_full_plan
+    original_get_next_step = OrchestratorAgent._get_next_step
+    original_execute_step = OrchestratorAgent._execute_step
+
+    async def _get_full_plan(orchestrator, objective, plan_result, request_params):
+        plan = await original_get_full_plan(orchestrator, objective, plan_result, request_params)
+        if plan is not None:
+            report("plan", steps=_steps(plan.steps), is_complete=plan.is_complete)
+        return plan
+
+    async def _get_next_step(orchestrator, objective, plan_result, request_params):
+        step = await original_get_next_step(orchestrator, objective, plan_result, request_params)
+        if step is not None:
+            report("plan", steps=_steps([step]), is_complete=step.is_complete)
+        return step
+
+    async def _execute_step(orchestrator, step, previous_result, request_params):
+        step_result = await original_execute_step(orchestrator, step, previous_result, request_params)
+        report("step", description=step.description, results=[
+            {"agent": task.agent, "description": task.description, "content": task.result}
+            for task in step_result.task_results
+        ])
+        return step_result
+
+    OrchestratorAgent._get_full_plan = _get_full_plan
+    OrchestratorAgent._get_next_step = _get_next_step
+    OrchestratorAgent._execute_step = _execute_step
+    return True
@@ -0,0 +1,137 @@
+"""
+Reply path for the agent runtime.
+
+Every orchestrator result is published back to a reply channel together with
+the correlation id of the request, so clients wait on one channel instead of
+scraping logs. Replies are queued and flushed in small batches through the
+transport's long-lived producer. Progress events of a request still being
+processed (see progress.py) take the same path.
+"""
+
+import asyncio
+import logging
+import time
+import uuid
+from typing import Dict
+
+logger = logging.getLogger(__name__)
+
+REPLY_SUFFIX = "_replies"
+
+
+def correlation_id_for(envelope: Dict, message=None) -> str:
+    """Correlation id from the envelope, the record key, or a fresh one"""
+    for field in ("correlation_id", "id", "message_id"):
+        if envelope.get(field) is not None:
+            return str(envelope[field])
+    if message is not None and getattr(message, "key", None):
+        return str(message.key)
+    return uuid.uuid4().hex
+
+
+def reply_channel_name(envelope: Dict, default_channel_name: str) -> str:
+    """
+    Logical reply channel for a request: its explicit "reply_to", otherwise
+    "<name>_replies" where name comes from channel_id ("agent:<name>") or the
+    agent's own channel.
+    """
+    if envelope.get("reply_to"):
+        return envelope["reply_to"]
+    channel_id = envelope.get("channel_id") or default_channel_name
+    return channel_id.rsplit(":", 1)[-1] + REPLY_SUFFIX
+
+
+class ReplyPublisher:
+    """
+    Queues replies and publishes them in batches
+
+    Args:
+        transport: Started transport used for publishing
+        agent_name: Included in every reply
+        default_channel_name: Agent channel used when a request names no channel
+        max_batch: Replies published together at most
+        linger_ms: How long to wait for more replies before flushing a batch
+    """
+
+    def __init__(self, transport, agent_name: str, default_channel_name: str,
+                 max_batch: int = 100, linger_ms: float = 5, max_queue: int = 10000):
+        self.transport = transport
+        self.agent_name = agent_name
+        self.default_channel_name = default_channel_name
+        self.max_batch = max_batch
+        self.linger = linger_ms / 1000
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        self.task = None
+        self.published = 0
+        self.failed = 0
+
+    def start(self):
+        self.task = asyncio.create_task(self._run(), name="reply-publisher")
+
+    def reply(self, envelope: Dict, content, status: str = "ok", message=None, correlation_id: str = None):
+        """Queue a reply for a request without waiting for it to be published"""
+        return self._queue(envelope, {"type": "assistant", "status": status, "content": content}, message, correlation_id)
+
+    def progress(self, envelope: Dict, stage: str, message=None, correlation_id: str = None, **fields):
+        """Queue an intermediate event (plan, step, subagent response) of a request still being processed"""
+        return self._queue(envelope, {"type": "progress", "stage": stage, **fields}, message, correlation_id)
+
+    def _queue(self, envelope: Dict, value: Dict, message=None, correlation_id: str = None):
+        channel = self.transport.resolve_channel(reply_channel_name(envelope, self.default_channel_name))
+        correlation_id = correlation_id or correlation_id_for(envelope, message)
+        value = {
+            **value,
+            "correlation_id": correlation_id,
+            "channel_id": envelope.get("channel_id"),
+            "agent": self.agent_name,
+            "timestamp": time.time()
+        }
+        try:
+            self.queue.put_nowait((channel, value, correlation_id))
+        except asyncio.QueueFull:
+            self.failed += 1
+            logger.warning(f"Reply queue full, dropping {value['type']} event {correlation_id} for '{channel}'")
+        return correlation_id
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        closing = False
+        while not closing:
+            item = await self.queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = loop.time() + self.linger
+            while len(batch) < self.max_batch:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    closing = True
+                    break
+                batch.append(item)
+            await self._publish(batch)
+
+    async def _publish(self, batch):
+        try:
+            await self.transport.publish_many(batch)
+            self.published += len(batch)
+        except Exception as e:
+            self.failed += len(batch)
+            logger.error(f"Failed to publish {len(batch)} replies: {e}")
+
+    async def close(self, timeout: float = 10):
+        """Publish whatever is still queued, then stop the background task"""
+        if not self.task:
+            return
+        # The sentinel is queued behind pending replies so they are flushed first
+        await self.queue.put(None)
+        try:
+            await asyncio.wait_for(self.task, timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Reply publisher did not flush within {timeout}s, {self.queue.qsize()} replies dropped")
+        self.task = None
@@ -0,0 +1,354 @@
+"""
+Per-agent resource accounting from /proc, with optional memory and CPU limits.
+
+A background collector samples every agent's process tree once per interval:
+the supervisord-started process and all of its descendants (the agent
+interpreter and the MCP servers it spawned). One pass over /proc/*/stat per
+sample builds the parent map for every agent at once, so API calls only
+read the last sample and never touch /proc themselves.
+
+Per agent: RSS, CPU time and CPU percent over the last interval, open file
+descriptors, uptime and the child processes. Agents with limits are
+contained by the manager:
+
+- memory_limit_mb: the agent is restarted once the tree's RSS exceeds it.
+- cpu_limit_percent (of one core): once a sample finds the tree above it,
+  a CpuThrottle caps it until the agent is restarted. Every
+  CPU_THROTTLE_PERIOD it compares the tree's CPU time with its share and
+  stops the processes (SIGSTOP) for as long as it takes the average to get
+  back down to the limit, then resumes them (SIGCONT). Agents under the
+  limit are never stopped.
+
+Without /proc (e.g. macOS) the collector stays off and agents report no
+resources.
+"""
+
+import asyncio
+import logging
+import os
+import signal
+import time
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_INTERVAL = float(os.environ.get('RESOURCE_SAMPLE_INTERVAL', '10'))
+# Seconds between CPU checks of a capped agent
+CPU_THROTTLE_PERIOD = float(os.environ.get('RESOURCE_CPU_THROTTLE_PERIOD', '0.1'))
+# Longest single stop, so a capped agent still answers heartbeats and SIGTERM promptly
+CPU_MAX_PAUSE = float(os.environ.get('RESOURCE_CPU_MAX_PAUSE', '1'))
+PROC = "/proc"
+
+
+def _read_stat(pid: int) -> Optional[Dict]:
+    """Fields of /proc/<pid>/stat we use, or None if the process is gone"""
+    try:
+        with open(f"{PROC}/{pid}/stat", "rb") as f:
+            data = f.read().decode("utf-8", "replace")
+    except OSError:
+        return None
+    # comm is in parentheses and may itself contain spaces or parentheses
+    comm = data[data.index("(") + 1:data.rindex(")")]
+    fields = data[data.rindex(")") + 2:].split()
+    return {
+        "pid": pid,
+        "name": comm,
+        "ppid": int(fields[1]),
+        "cpu_ticks": int(fields[11]) + int(fields[12]),
+        "start_ticks": int(fields[19]),
+        "rss_pages": int(fields[21]),
+    }
+
+
+def _open_fds(pid: int) -> Optional[int]:
+    try:
+        return len(os.listdir(f"{PROC}/{pid}/fd"))
+    except OSError:
+        # Not ours to inspect (or already gone)
+        return None
+
+
+def scan_processes() -> Dict[int, Dict]:
+    """stat of every process, by pid"""
+    processes = {}
+    for entry in os.listdir(PROC):
+        if entry.isdigit():
+            stat = _read_stat(int(entry))
+            if stat is not None:
+                processes[stat["pid"]] = stat
+    return processes
+
+
+class CpuThrottle:
+    """
+    Caps the CPU of an agent's process tree at limit_percent of one core
+    by stopping it once it has used its share of the time since the last check
+    """
+
+    def __init__(self, pid: int, processes: Dict[int, int], limit_percent: float, clock_ticks: int,
+                 period: float = CPU_THROTTLE_PERIOD):
+        self.pid = pid
+        # pid -> start_ticks of the tree's processes when it was last sampled
+        self.processes = processes
+        self.limit_percent = limit_percent
+        self.clock_ticks = clock_ticks
+        self.period = period
+        self.throttled_s = 0.0
+        self.task = asyncio.create_task(self._run(), name=f"cpu-throttle-{pid}")
+
+    def _stats(self) -> Dict[int, Dict]:
+        """Current stat of the sampled processes that still exist; a reused pid has another start time"""
+        stats = {pid: _read_stat(pid) for pid in self.processes}
+        return {
+            pid: stat for pid, stat in stats.items()
+            if stat is not None and stat["start_ticks"] == self.processes[pid]
+        }
+
+    def _members(self) -> List[int]:
+        """Sampled processes still in the tree: the root, and processes whose parent is a member"""
+        stats = self._stats()
+        members = {self.pid} if self.pid in stats else set()
+        added = bool(members)
+        while added:
+            added = False
+            for pid, stat in stats.items():
+                if pid not in members and stat["ppid"] in members:
+                    members.add(pid)
+                    added = True
+        return list(members)
+
+    def _cpu_seconds(self) -> float:
+        return sum(stat["cpu_ticks"] for stat in self._stats().values()) / self.clock_ticks
+
+    @staticmethod
+    def _signal(pids: List[int], signum: int):
+        for pid in pids:
+            try:
+                os.kill(pid, signum)
+            except OSError as e:
+                logger.debug(f"Could not signal {pid}: {e}")
+
+    async def _run(self):
+        used, since = self._cpu_seconds(), time.monotonic()
+        while True:
+            await asyncio.sleep(self.period)
+            now_used, now = self._cpu_seconds(), time.monotonic()
+            share = self.limit_percent / 100
+            # Stopped for pause, the window's average comes back down to the share
+            excess = (now_used - used) - share * (now - since)
+            if excess > 0:
+                pause = min(excess / share, CPU_MAX_PAUSE)
+                # Re-checked right before stopping: processes that exited since the sample, reused
+                # pids and processes that left the tree are never stopped
+                stopped = self._members()
+                self._signal(stopped, signal.SIGSTOP)
+                try:
+                    await asyncio.sleep(pause)
+                finally:
+                    # Every process stopped above is continued, even if it was reparented meanwhile
+                    self._signal([pid for pid in stopped if pid in self._stats()], signal.SIGCONT)
+                self.throttled_s += pause
+            used, since = self._cpu_seconds(), time.monotonic()
+
+    async def close(self):
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+
+
+class ResourceMonitor:
+    """
+    Cached resource usage of every running agent
+
+    Args:
+        list_pids: Returns {agent key: supervisord pid} for the running agents
+        list_limits: Returns {agent key: {"memory_limit_mb": ..., "cpu_limit_percent": ...}}
+            for agents with limits
+        restart_agent: Async agent key -> restart, used when an agent exceeds its memory limit
+    """
+
+    def __init__(self, list_pids: Callable[[], Dict[str, int]], list_limits: Callable[[], Dict[str, Dict]],
+                 restart_agent, interval: float = SAMPLE_INTERVAL):
+        self.list_pids = list_pids
+        self.list_limits = list_limits
+        self.restart_agent = restart_agent
+        self.interval = interval
+        self.enabled = os.path.isdir(PROC)
+        self.page_size = os.sysconf("SC_PAGE_SIZE") if self.enabled else 4096
+        self.clock_ticks = os.sysconf("SC_CLK_TCK") if self.enabled else 100
+        self.samples = {}
+        self.sampled_at = None
+        # key -> CpuThrottle of an agent run found above its CPU limit
+        self.throttles = {}
+        self.enforcements = []
+        self.enforcement_counts = {}
+        self.task = None
+        # key -> (cpu seconds, monotonic time) of the previous sample
+        self._previous = {}
+
+    def start(self):
+        if not self.enabled:
+            logger.info(f"No {PROC}; per-agent resource accounting is off")
+            return
+        self.task = asyncio.create_task(self._loop(), name="resource-monitor")
+
+    async def _loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                pids = await loop.run_in_executor(None, self.list_pids)
+                self.samples = await loop.run_in_executor(None, self.sample, pids)
+                self.sampled_at = time.time()
+                await self._enforce(await loop.run_in_executor(None, self.list_limits))
+            except Exception as e:
+                logger.warning(f"Resource sampling failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    def sample(self, pids: Dict[str, int]) -> Dict[str, Dict]:
+        """Usage of each agent's process tree; runs in an executor"""
+        processes = scan_processes()
+        children = {}
+        for stat in processes.values():
+            children.setdefault(stat["ppid"], []).append(stat["pid"])
+        with open(f"{PROC}/uptime") as f:
+            system_uptime = float(f.read().split()[0])
+        now = time.monotonic()
+
+        samples = {}
+        for key, pid in pids.items():
+            root = processes.get(pid)
+            if root is None:
+                continue
+            tree, stack = [], [pid]
+            while stack:
+                current = stack.pop()
+                if current in processes:
+                    tree.append(processes[current])
+                    stack.extend(children.get(current, []))
+            cpu_seconds = sum(stat["cpu_ticks"] for stat in tree) / self.clock_ticks
+            fds = [_open_fds(stat["pid"]) for stat in tree]
+            previous = self._previous.get(key)
+            cpu_percent = None
+            if previous is not None and now > previous[1] and cpu_seconds >= previous[0]:
+                cpu_percent = round((cpu_seconds - previous[0]) / (now - previous[1]) * 100, 1)
+            self._previous[key] = (cpu_seconds, now)
+            samples[key] = {
+                "pid": pid,
+                "rss_mb": round(sum(stat["rss_pages"] for stat in tree) * self.page_size / 2 ** 20, 1),
+                "cpu_seconds": round(cpu_seconds, 2),
+                "cpu_percent": cpu_percent,
+                "open_fds": sum(fd for fd in fds if fd is not None) if any(fd is not None for fd in fds) else None,
+                "processes": len(tree),
+                "uptime_s": round(system_uptime - root["start_ticks"] / self.clock_ticks),
+                "start_ticks": root["start_ticks"],
+                "children": [
+                    {"pid": stat["pid"], "ppid": stat["ppid"], "name": stat["name"], "start_ticks": stat["start_ticks"],
+                     "rss_mb": round(stat["rss_pages"] * self.page_size / 2 ** 20, 1)}
+                    for stat in tree if stat["pid"] != pid
+                ],
+            }
+        for key in set(self._previous) - set(pids):
+            del self._previous[key]
+        return samples
+
+    async def _enforce(self, limits: Dict[str, Dict]):
+        for key in list(self.throttles):
+            usage = self.samples.get(key)
+            limit = limits.get(key) or {}
+            if usage is None or self.throttles[key].pid != usage["pid"] or not limit.get("cpu_limit_percent"):
+                # Stopped, restarted or no longer limited: a new run starts uncapped
+                await self.throttles.pop(key).close()
+        for key, limit in limits.items():
+            usage = self.samples.get(key)
+            if usage is None:
+                continue
+            memory_limit = limit.get("memory_limit_mb") or 0
+            if memory_limit and usage["rss_mb"] > memory_limit:
+                self._record(key, "restart", f"rss {usage['rss_mb']}MB > {memory_limit}MB")
+                self.samples.pop(key, None)
+                if key in self.throttles:
+                    # Never leave the tree stopped while supervisord stops it
+                    await self.throttles.pop(key).close()
+                try:
+                    await self.restart_agent(key)
+                except Exception as e:
+                    logger.error(f"Failed to restart agent '{key}' over its memory limit: {e}")
+                continue
+            cpu_limit = limit.get("cpu_limit_percent") or 0
+            processes = {usage["pid"]: usage["start_ticks"]}
+            processes.update((child["pid"], child["start_ticks"]) for child in usage["children"])
+            throttle = self.throttles.get(key)
+            if throttle is not None:
+                # MCP servers come and go; the cap follows the current tree and limit
+                throttle.processes = processes
+                throttle.limit_percent = cpu_limit
+            elif cpu_limit and usage["cpu_percent"] is not None and usage["cpu_percent"] > cpu_limit:
+                self.throttles[key] = CpuThrottle(usage["pid"], processes, cpu_limit, self.clock_ticks)
+                self._record(key, "throttle", f"cpu {usage['cpu_percent']}% > {cpu_limit}%")
+
+    def _record(self, key: str, action: str, reason: str):
+        logger.warning(f"Agent '{key}' exceeded its limit: {reason}", extra={
+            "event": "agent_limit_exceeded", "agent": key, "action": action, "reason": reason
+        })
+        self.enforcements.append({"agent": key, "action": action, "reason": reason, "ts": time.time()})
+        del self.enforcements[:-100]
+        self.enforcement_counts[(key, action)] = self.enforcement_counts.get((key, action), 0) + 1
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Last sample of an agent, None if it was not running (or accounting is off)"""
+        usage = self.samples.get(key)
+        if usage is None:
+            return None
+        throttle = self.throttles.get(key)
+        return {
+            **usage,
+            "cpu_throttled_s": round(throttle.throttled_s, 1) if throttle is not None else None,
+            "sampled_at": self.sampled_at
+        }
+
+    def metrics(self) -> List[str]:
+        """Prometheus text exposition lines for the last sample"""
+        lines = []
+        for name, field, help_text in (
+            ("agent_rss_bytes", "rss_mb", "Resident memory of the agent's process tree"),
+            ("agent_cpu_seconds_total", "cpu_seconds", "CPU time of the agent's process tree"),
+            ("agent_open_fds", "open_fds", "Open file descriptors of the agent's process tree"),
+            ("agent_processes", "processes", "Processes in the agent's tree (agent plus MCP servers)"),
+            ("agent_uptime_seconds", "uptime_s", "Seconds since the agent process started"),
+        ):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {'counter' if name.endswith('_total') else 'gauge'}")
+            for key, usage in sorted(self.samples.items()):
+                value = usage[field]
+                if value is None:
+                    continue
+                if field == "rss_mb":
+                    value = int(value * 2 ** 20)
+                lines.append(f'{name}{{agent="{key}"}} {value}')
+        lines.append("# HELP agent_cpu_throttled_seconds_total Time the agent's processes were stopped by its CPU limit")
+        lines.append("# TYPE agent_cpu_throttled_seconds_total counter")
+        for key, throttle in sorted(self.throttles.items()):
+            lines.append(f'agent_cpu_throttled_seconds_total{{agent="{key}"}} {round(throttle.throttled_s, 3)}')
+        lines.append("# HELP agent_limit_enforcements_total Limit actions taken by the manager")
+        lines.append("# TYPE agent_limit_enforcements_total counter")
+        for (key, action), count in sorted(self.enforcement_counts.items()):
+            lines.append(f'agent_limit_enforcements_total{{agent="{key}",action="{action}"}} {count}')
+        return lines
+
+    def stats(self) -> Dict:
+        return {
+            "enabled": self.enabled,
+            "sampled_at": self.sampled_at,
+            "agents": len(self.samples),
+            "cpu_throttled": sorted(self.throttles),
+            "enforcements": self.enforcements[-20:],
+        }
+
+    async def close(self):
+        if self.task:
+            self.task.cancel()
+        for throttle in self.throttles.values():
+            await throttle.close()
+        self.throttles = {}
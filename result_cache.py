@@ -0,0 +1,100 @@
+"""
+Opt-in cache of orchestration results for the agent runtime.
+
+Entries are keyed on the normalized task text plus a fingerprint of the
+agent's configuration (subagents, models, servers), so changing the agent
+invalidates its cache. Results live in an in-process LRU and, optionally, in
+Redis where agents with the same configuration share them. Concurrent
+identical tasks share a single in-flight orchestration.
+"""
+
+import hashlib
+import json
+import logging
+import re
+from typing import Dict
+
+from caching import Coalescer, RedisStore, TTLCache, redis_settings
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_task(task: str) -> str:
+    """Case, surrounding whitespace/punctuation and repeated spaces do not change the answer"""
+    return _WHITESPACE.sub(" ", task).strip().strip("?!. ").lower()
+
+
+def config_fingerprint(*parts) -> str:
+    """Stable short hash of JSON-serializable configuration"""
+    encoded = json.dumps(parts, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()[:16]
+
+
+class ResultCache:
+    """Orchestration results by (normalized task, config fingerprint)"""
+
+    def __init__(self, fingerprint: str, ttl_seconds: float, max_entries: int = 1000, store: RedisStore = None):
+        self.fingerprint = fingerprint
+        self.ttl_seconds = ttl_seconds
+        self.local = TTLCache(max_entries)
+        self.store = store
+        self.coalescer = Coalescer()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    @classmethod
+    def from_runtime_config(cls, runtime_config: Dict, json_config: Dict, fingerprint: str):
+        """Cache configured by the agent's runtime_config, or None when caching is off"""
+        ttl_seconds = runtime_config.get("result_cache_ttl_seconds") or 0
+        if ttl_seconds <= 0:
+            return None
+        store = None
+        if runtime_config.get("result_cache_backend", "memory") == "redis":
+            store = RedisStore("agent_result_cache:", **redis_settings(json_config))
+        return cls(fingerprint, ttl_seconds, runtime_config.get("result_cache_max_entries", 1000), store)
+
+    def key(self, task: str) -> str:
+        digest = hashlib.sha256(normalize_task(task).encode("utf-8")).hexdigest()
+        return f"{self.fingerprint}:{digest}"
+
+    async def get_or_compute(self, task: str, compute):
+        """
+        Cached result for task, else the result of compute() (an awaitable
+        factory). Failed or empty results are not cached.
+        """
+        key = self.key(task)
+        response = self.local.get(key)
+        if response is None and self.store is not None and not self.coalescer.pending(key):
+            response, remaining = await self.store.get_with_ttl(key)
+            if response is not None and remaining > 0:
+                # Only for what is left of the Redis TTL, so an entry never outlives ttl_seconds
+                self.local.set(key, response, min(remaining, self.ttl_seconds))
+        if response is not None:
+            self.hits += 1
+            logger.info("Result cache hit", extra={"event": "result_cache", "outcome": "hit", **self.stats()})
+            return response
+
+        async def compute_and_store():
+            result = await compute()
+            if isinstance(result, str) and result:
+                self.local.set(key, result, self.ttl_seconds)
+                if self.store is not None:
+                    await self.store.set(key, result, self.ttl_seconds)
+            return result
+
+        response, shared = await self.coalescer.run(key, compute_and_store)
+        if shared:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+        return response
+
+    def stats(self) -> Dict:
+        return {"hits": self.hits, "misses": self.misses, "coalesced": self.coalesced, "entries": len(self.local)}
+
+    async def close(self):
+        if self.store is not None:
+            await self.store.close()
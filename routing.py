@@ -0,0 +1,119 @@
+"""
+Direct routing of tasks to a single subagent, bypassing orchestrator planning.
+
+A task goes straight to a subagent when its envelope names one in "target",
+or when it matches a fast-path rule from runtime_config["routes"]:
+
+    {"agent": "finder", "pattern": "^(price|quote) of \\\\w+"}
+    {"agent": "finder", "keywords": ["price", "market cap"]}
+
+Rules are tried in order; patterns are case-insensitive regexes and keyword
+rules match when any keyword occurs in the task as whole words ("price"
+matches "the price of ETH" but not "pricelist"). Everything else goes to the
+orchestrator, or to the configured workflow (see fan_out.py). Latency is
+tracked per route.
+"""
+
+import logging
+import re
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+ORCHESTRATOR_ROUTE = "orchestrator"
+
+
+def keyword_pattern(keywords: List[str]) -> Optional[re.Pattern]:
+    """Case-insensitive regex matching any of the keywords as whole words, None without keywords"""
+    keywords = [keyword.strip() for keyword in keywords if keyword.strip()]
+    if not keywords:
+        return None
+    alternatives = "|".join(r"\s+".join(map(re.escape, keyword.split())) for keyword in keywords)
+    return re.compile(rf"(?<!\w)(?:{alternatives})(?!\w)", re.IGNORECASE)
+
+
+class RouteStats:
+    """Call count and latency of one route"""
+
+    def __init__(self, window: int = 1000):
+        self.count = 0
+        self.errors = 0
+        self.latencies_ms = deque(maxlen=window)
+
+    def observe(self, elapsed_ms: float, ok: bool = True):
+        self.count += 1
+        if not ok:
+            self.errors += 1
+        self.latencies_ms.append(elapsed_ms)
+
+    def summary(self) -> Dict:
+        latencies = sorted(self.latencies_ms)
+        if not latencies:
+            return {"count": self.count, "errors": self.errors}
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "avg_ms": round(sum(latencies) / len(latencies), 1),
+            "p50_ms": round(latencies[len(latencies) // 2], 1),
+            "p95_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 1),
+        }
+
+
+class TaskRouter:
+    """Chooses the subagent (or the orchestrator) that handles a task"""
+
+    def __init__(self, rules: List[Dict], agent_names: List[str], workflow=None):
+        self.agent_names = set(agent_names)
+        # Handles tasks without a direct route in place of the orchestrator
+        self.workflow = workflow
+        self.default_route = workflow.name if workflow else ORCHESTRATOR_ROUTE
+        self.rules = []
+        for index, rule in enumerate(rules or []):
+            agent_name = rule.get("agent")
+            if agent_name not in self.agent_names:
+                logger.warning(f"Ignoring route {index}: unknown subagent '{agent_name}'")
+                continue
+            pattern = re.compile(rule["pattern"], re.IGNORECASE) if rule.get("pattern") else None
+            keywords = keyword_pattern(rule.get("keywords", []))
+            if pattern is None and keywords is None:
+                logger.warning(f"Ignoring route {index}: it has neither a pattern nor keywords")
+                continue
+            self.rules.append((f"route{index}:{agent_name}", agent_name, pattern, keywords))
+        self.stats = {}
+
+    def route(self, task: str, envelope: Dict = None) -> Tuple[Optional[str], str]:
+        """
+        (subagent name or None for the default route, reason), where reason is
+        "target", the matching rule's id, or the default route
+        """
+        target = (envelope or {}).get("target")
+        if target:
+            if target in self.agent_names:
+                return target, "target"
+            logger.warning(f"Unknown target subagent '{target}', using the {self.default_route}")
+        for rule_id, agent_name, pattern, keywords in self.rules:
+            if (pattern and pattern.search(task)) or (keywords and keywords.search(task)):
+                return agent_name, rule_id
+        return None, self.default_route
+
+    async def run(self, agent, task: str, target: Optional[str]):
+        """Send task to the target subagent, or along the default route when target is None"""
+        route = target or self.default_route
+        started = time.perf_counter()
+        ok = False
+        try:
+            if target is None and self.workflow is not None:
+                response = await self.workflow.run(agent, task)
+            elif target is None:
+                response = await agent.orchestrate(task)
+            else:
+                response = await agent[target].send(task)
+            ok = True
+            return response
+        finally:
+            self.stats.setdefault(route, RouteStats()).observe((time.perf_counter() - started) * 1000, ok)
+
+    def summary(self) -> Dict:
+        return {route: stats.summary() for route, stats in self.stats.items()}
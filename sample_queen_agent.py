@@ -80,8 +80,10 @@ async def ensure_topic_exists(bootstrap_servers, topic_name, num_partitions=1, r
         except:
             pass
 
-async def create_msk_consumer(bootstrap_servers, topic_name, consumer_group="mcp_agent_consumer"):
+async def create_msk_consumer(bootstrap_servers, topic_name, consumer_group=None, group_instance_id=None):
     try:
+        # One group per topic, so other agents starting or stopping never rebalance this one
+        consumer_group = consumer_group or f"{topic_name}_consumer"
         # Ensure topic exists before creating consumer
         await ensure_topic_exists(bootstrap_servers, topic_name)
         
@@ -100,7 +102,9 @@ async def create_msk_consumer(bootstrap_servers, topic_name, consumer_group="mcp
             enable_auto_commit=True,
             auto_commit_interval_ms=1000,
             client_id='mcp_agent_consumer',
-            api_version="0.11.5",
+            # Static membership (group_instance_id) needs Kafka 2.3+ group APIs
+            group_instance_id=group_instance_id,
+            api_version="auto" if group_instance_id else "0.11.5",
             session_timeout_ms=30000,
             heartbeat_interval_ms=10000
         )
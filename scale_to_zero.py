@@ -0,0 +1,398 @@
+"""
+Scale-to-zero for agents: stop them when idle and wake them on traffic.
+
+An agent under supervisord keeps its interpreter, MCP servers and broker
+connections even if it gets one message a day. Agents created with
+``scale_to_zero_idle_minutes`` are stopped by the manager once they have had
+no message for that long. While an agent is stopped this way a dispatcher
+watches its channel:
+
+- Kafka / MSK: a consumer in a separate group only notices new records; the
+  records stay in the topic and the agent's own group picks them up from
+  its committed offsets once it is back. The agent is only stopped once the
+  dispatcher's partitions are assigned and positioned, and records the agent
+  left uncommitted while stopping wake it straight away.
+- Redis: pub/sub keeps nothing for absent subscribers, so the dispatcher
+  buffers the messages and republishes them once the agent is subscribed.
+  The agent logs when it subscribed (agent_ready's subscribed_at); messages
+  the dispatcher received from then on reached the agent too and are not
+  republished, since messages without an id cannot be deduplicated.
+
+The first message starts the agent again. Cold-start latency (wake-up to
+the agent's ``agent_ready`` log event) is logged and kept per agent.
+
+The agent side only touches an activity file as it handles messages
+(ActivityMarker), which the manager reads to decide when it went idle.
+"""
+
+import asyncio
+import copy
+import json
+import logging
+import os
+import time
+from collections import deque
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from log_tail import tail_lines
+from transports import create_transport
+
+logger = logging.getLogger(__name__)
+
+CHECK_INTERVAL = float(os.environ.get('SCALE_TO_ZERO_CHECK_INTERVAL', '30'))
+# Longest wait for a woken agent to report ready before buffered messages are flushed anyway
+READY_TIMEOUT = float(os.environ.get('SCALE_TO_ZERO_READY_TIMEOUT', '180'))
+# Messages a Redis dispatcher holds for one stopped agent
+MAX_BUFFERED_MESSAGES = int(os.environ.get('SCALE_TO_ZERO_MAX_BUFFER', '10000'))
+# Longest wait for a Kafka dispatcher's partition assignment before the agent is left running
+ASSIGN_TIMEOUT = float(os.environ.get('SCALE_TO_ZERO_ASSIGN_TIMEOUT', '60'))
+READY_POLL_INTERVAL = 0.25
+
+
+class ActivityMarker:
+    """Agent side: bumps the mtime of a file at most once per interval"""
+
+    def __init__(self, path: str, interval: float = 1.0):
+        self.path = path
+        self.interval = interval
+        self.touched = 0.0
+
+    def touch(self):
+        now = time.monotonic()
+        if now - self.touched < self.interval:
+            return
+        self.touched = now
+        try:
+            Path(self.path).touch()
+        except OSError as e:
+            logger.debug(f"Could not touch activity file {self.path}: {e}")
+
+
+class Dispatcher:
+    """Watches the channel of one stopped agent until a message arrives"""
+
+    def __init__(self, key: str, pubsub_config: Dict, group: str = None):
+        self.key = key
+        self.pubsub_config = pubsub_config
+        self.group = group
+        self.transport = None
+        self.channel = None
+        # (receive time, value) of the messages a Redis dispatcher holds
+        self.buffered = deque(maxlen=MAX_BUFFERED_MESSAGES)
+        self.dropped = 0
+        self.handed_over = 0
+
+    @property
+    def durable(self) -> bool:
+        """Kafka keeps the records for the agent; Redis pub/sub does not"""
+        return self.pubsub_config.get("backend") in ("kafka", "msk")
+
+    async def start(self):
+        pubsub_config, options = self.pubsub_config, {}
+        if self.durable:
+            # Never committed, so a fresh group position at the end of the topic: only new records wake the agent
+            pubsub_config = copy.deepcopy(pubsub_config)
+            backend_config = pubsub_config.setdefault(pubsub_config["backend"], {})
+            backend_config.setdefault("consumer_config", {})["auto_offset_reset"] = "latest"
+            options["consumer_group"] = f"{self.key.replace('/', '_')}_dispatcher"
+        self.transport = create_transport(pubsub_config, **options)
+        self.channel = self.transport.resolve_channel(self.pubsub_config["channel_name"])
+        await self.transport.start()
+        await self.transport.subscribe(self.channel)
+        if self.durable:
+            # With "latest", a record published before the partitions are assigned and
+            # positioned would wake nobody, so the agent is not stopped until then
+            await self.transport.wait_for_assignment(ASSIGN_TIMEOUT)
+
+    async def backlog(self) -> int:
+        """Records of the agent's topic its consumer group has not committed (Kafka)"""
+        if not self.durable or not self.group:
+            return 0
+        offsets = await self.transport.consumer_lag({self.group: [self.channel]})
+        return sum(p["lag"] or 0 for p in offsets.get(self.group, {}).get(self.channel, {}).values())
+
+    async def wait_for_message(self):
+        """Return once a message arrived for the agent, buffering it when the broker would drop it"""
+        while True:
+            messages = await self.transport.receive_batch(max_records=500, timeout_ms=1000)
+            if not messages:
+                continue
+            if not self.durable:
+                self._buffer(messages)
+            return
+
+    async def collect(self, stop: asyncio.Event):
+        """Keep buffering messages as they arrive until stop is set, so their receive times are accurate"""
+        while not stop.is_set():
+            self._buffer(await self.transport.receive_batch(max_records=500, timeout_ms=50))
+
+    def _buffer(self, messages):
+        received_at = time.time()
+        for message in messages:
+            if len(self.buffered) == self.buffered.maxlen:
+                self.dropped += 1
+            self.buffered.append((received_at, message.value))
+
+    async def drain(self):
+        """Stop watching; messages that arrived meanwhile are buffered too"""
+        if not self.durable:
+            self._buffer(await self.transport.receive_batch(max_records=MAX_BUFFERED_MESSAGES, timeout_ms=0))
+        await self.close()
+
+    async def replay(self, publish_transport, subscribed_at: float = None) -> int:
+        """
+        Republish buffered messages to the agent's channel; with subscribed_at, only
+        those received before the agent subscribed (it got the later ones itself)
+        """
+        buffered, self.buffered = list(self.buffered), deque(maxlen=MAX_BUFFERED_MESSAGES)
+        if subscribed_at is not None:
+            self.handed_over = sum(1 for received_at, _ in buffered if received_at >= subscribed_at)
+            buffered = [(received_at, value) for received_at, value in buffered if received_at < subscribed_at]
+        if buffered:
+            await publish_transport.publish_many([(self.channel, value, None) for _, value in buffered])
+        return len(buffered)
+
+    async def close(self):
+        if self.transport:
+            transport, self.transport = self.transport, None
+            await transport.close()
+
+
+class ScaleToZero:
+    """
+    Idle policy and wake-up dispatchers for the manager's agents
+
+    Args:
+        list_agents: Returns the agents with an idle policy, as dicts with
+            key, username, name, idle_seconds, pubsub_config, group (Kafka
+            consumer group), activity_file, runtime_log and state_file
+        is_running: (name, username) -> whether supervisord runs the agent
+        start_agent / stop_agent: Async (name, username) callables
+        get_producer: Async pubsub_config -> started transport used to replay buffered messages
+    """
+
+    def __init__(self, list_agents: Callable[[], List[Dict]], is_running, start_agent, stop_agent, get_producer,
+                 check_interval: float = CHECK_INTERVAL):
+        self.list_agents = list_agents
+        self.is_running = is_running
+        self.start_agent = start_agent
+        self.stop_agent = stop_agent
+        self.get_producer = get_producer
+        self.check_interval = check_interval
+        self.last_seen = {}
+        self.dispatchers = {}
+        # key -> task waiting for the first message of a stopped agent
+        self.watchers = {}
+        self.closing = set()
+        self.waking = {}
+        # key -> event set once an idle stop in progress has finished
+        self.stopping = {}
+        self.cold_starts = {}
+        self.stops = 0
+        self.task = None
+
+    def start(self):
+        self.task = asyncio.create_task(self._loop(), name="scale-to-zero")
+
+    async def _loop(self):
+        # Agents stopped before the manager restarted are watched again
+        for agent in self.list_agents():
+            if Path(agent["state_file"]).exists():
+                try:
+                    await self._watch(agent)
+                except Exception as e:
+                    logger.error(f"Failed to watch stopped agent '{agent['key']}': {e}")
+        while True:
+            await asyncio.sleep(self.check_interval)
+            for agent in self.list_agents():
+                try:
+                    await self._check(agent)
+                except Exception as e:
+                    logger.warning(f"Idle check of agent '{agent['key']}' failed: {e}")
+
+    def touch(self, key: str):
+        """Record traffic for an agent (e.g. a message submitted through the manager)"""
+        self.last_seen[key] = time.time()
+
+    def hibernating(self, key: str) -> bool:
+        return key in self.dispatchers or key in self.waking or key in self.stopping
+
+    def _last_activity(self, agent: Dict) -> float:
+        try:
+            activity = os.path.getmtime(agent["activity_file"])
+        except OSError:
+            activity = 0.0
+        return max(activity, self.last_seen.get(agent["key"], 0.0))
+
+    async def _check(self, agent: Dict):
+        key = agent["key"]
+        if self.hibernating(key) or not self.is_running(agent["name"], agent["username"]):
+            return
+        # An agent seen running for the first time counts as active from now
+        self.last_seen.setdefault(key, time.time())
+        idle = time.time() - self._last_activity(agent)
+        if idle < agent["idle_seconds"]:
+            return
+        logger.info(f"Stopping idle agent '{key}'", extra={"event": "agent_idle_stop", "agent": key, "idle_s": round(idle)})
+        # A message arriving meanwhile wakes the agent only after the stop below has finished
+        self.stopping[key] = stopped = asyncio.Event()
+        try:
+            # Watch first so nothing published while the agent stops goes unnoticed
+            await self._watch(agent)
+            Path(agent["state_file"]).write_text(json.dumps({"stopped_at": time.time(), "idle_s": round(idle)}))
+            await self.stop_agent(agent["name"], agent["username"])
+        except Exception:
+            Path(agent["state_file"]).unlink(missing_ok=True)
+            self.forget(key)
+            raise
+        finally:
+            self.stopping.pop(key, None)
+            stopped.set()
+        self.stops += 1
+        # Records the agent received but did not commit before it stopped
+        dispatcher = self.dispatchers.get(key)
+        if dispatcher is not None and await dispatcher.backlog():
+            await self.wake(agent, reason="backlog")
+
+    async def _watch(self, agent: Dict):
+        dispatcher = Dispatcher(agent["key"], agent["pubsub_config"], agent.get("group"))
+        try:
+            await dispatcher.start()
+        except Exception:
+            await dispatcher.close()
+            raise
+        self.dispatchers[agent["key"]] = dispatcher
+        self.watchers[agent["key"]] = asyncio.create_task(
+            self._wake_on_message(agent, dispatcher), name=f"dispatch-{agent['key']}"
+        )
+
+    async def _wake_on_message(self, agent: Dict, dispatcher: Dispatcher):
+        try:
+            await dispatcher.wait_for_message()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Dispatcher for agent '{agent['key']}' failed: {e}")
+            if self.dispatchers.get(agent["key"]) is dispatcher:
+                self.dispatchers.pop(agent["key"])
+                self.watchers.pop(agent["key"], None)
+            await dispatcher.close()
+            return
+        await self.wake(agent)
+
+    async def wake(self, agent: Dict, reason: str = "message"):
+        """Start a stopped agent and, once it is ready, hand it the messages buffered meanwhile"""
+        key = agent["key"]
+        dispatcher = self.dispatchers.pop(key, None)
+        if dispatcher is None or key in self.waking:
+            return
+        watcher = self.watchers.pop(key, None)
+        if watcher is not None and watcher is not asyncio.current_task():
+            watcher.cancel()
+        self.waking[key] = started_at = time.time()
+        started = time.perf_counter()
+        # Redis messages keep arriving while the agent starts; their receive times tell
+        # which of them the agent missed
+        stop_collecting = asyncio.Event()
+        collector = None if dispatcher.durable else asyncio.create_task(dispatcher.collect(stop_collecting))
+        try:
+            stopping = self.stopping.get(key)
+            if stopping is not None:
+                await stopping.wait()
+            await self.start_agent(agent["name"], agent["username"])
+            Path(agent["state_file"]).unlink(missing_ok=True)
+            ready = await self._wait_ready(agent["runtime_log"], started_at)
+            cold_start_ms = round((time.perf_counter() - started) * 1000, 1)
+            await self._stop_collecting(stop_collecting, collector)
+            await dispatcher.drain()
+            # Without a ready event (timeout) everything buffered is replayed
+            replayed = await dispatcher.replay(
+                await self.get_producer(agent["pubsub_config"]), (ready or {}).get("subscribed_at")
+            )
+            self.cold_starts.setdefault(key, deque(maxlen=100)).append(cold_start_ms)
+            self.last_seen[key] = time.time()
+            logger.info(f"Woke agent '{key}' in {cold_start_ms}ms", extra={
+                "event": "agent_cold_start", "agent": key, "reason": reason, "ready": ready is not None,
+                "cold_start_ms": cold_start_ms, "replayed": replayed, "handed_over": dispatcher.handed_over,
+                "dropped": dispatcher.dropped
+            })
+        except Exception as e:
+            logger.error(f"Failed to wake agent '{key}': {e}")
+            await self._stop_collecting(stop_collecting, collector)
+            await dispatcher.close()
+        finally:
+            self.waking.pop(key, None)
+
+    @staticmethod
+    async def _stop_collecting(stop: asyncio.Event, collector):
+        stop.set()
+        if collector is not None:
+            try:
+                await collector
+            except Exception as e:
+                logger.warning(f"Dispatcher stopped buffering with an error: {e}")
+
+    async def _wait_ready(self, runtime_log: str, since: float):
+        """Wait for an agent_ready event logged after since and return it; None on timeout"""
+        loop = asyncio.get_running_loop()
+        deadline = time.monotonic() + READY_TIMEOUT
+        while time.monotonic() < deadline:
+            try:
+                lines, _ = await loop.run_in_executor(None, tail_lines, runtime_log, 200, False)
+            except OSError:
+                lines = []
+            for line in reversed(lines):
+                if '"agent_ready"' not in line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record.get("event") == "agent_ready" and record.get("ts", 0) >= since:
+                    return record
+            await asyncio.sleep(READY_POLL_INTERVAL)
+        logger.warning(f"No agent_ready event in {runtime_log} after {READY_TIMEOUT}s")
+        return None
+
+    def forget(self, key: str):
+        """Drop the idle state of an agent started or stopped by hand"""
+        self.last_seen.pop(key, None)
+        watcher = self.watchers.pop(key, None)
+        if watcher is not None:
+            watcher.cancel()
+        dispatcher = self.dispatchers.pop(key, None)
+        if dispatcher is not None:
+            closing = asyncio.create_task(dispatcher.close())
+            self.closing.add(closing)
+            closing.add_done_callback(self.closing.discard)
+
+    def stats(self) -> Dict:
+        cold_starts = {}
+        for key, samples in self.cold_starts.items():
+            ordered = sorted(samples)
+            cold_starts[key] = {
+                "count": len(ordered),
+                "last_ms": samples[-1],
+                "avg_ms": round(sum(ordered) / len(ordered), 1),
+                "p95_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+            }
+        return {
+            "stops": self.stops,
+            "sleeping": sorted(self.dispatchers),
+            "waking": sorted(self.waking),
+            "buffered": {key: len(d.buffered) for key, d in self.dispatchers.items() if d.buffered},
+            "cold_starts": cold_starts,
+        }
+
+    async def close(self):
+        if self.task:
+            self.task.cancel()
+        for watcher in self.watchers.values():
+            watcher.cancel()
+        self.watchers = {}
+        for dispatcher in list(self.dispatchers.values()):
+            await dispatcher.close()
+        self.dispatchers = {}
+        if self.closing:
+            await asyncio.gather(*self.closing, return_exceptions=True)
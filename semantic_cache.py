@@ -0,0 +1,214 @@
+"""
+Semantic cache of orchestration results for the agent runtime.
+
+Tasks are embedded with a pluggable local embedding function and kept as
+rows of a NumPy matrix. A lookup scores the task against every live row with
+a single matrix-vector product (rows are L2-normalized, so that is the cosine
+similarity) and returns the cached answer of the best match when it clears
+the similarity threshold and has not expired. When the matrix is full, an
+expired row is reused if there is one, otherwise the least recently used.
+
+The default embedder hashes words, word pairs and character trigrams, minus
+filler words, into a fixed-size vector. It catches rephrasings that share wording
+("tell me price of polygon" / "polygon price now"); matching synonyms ("MATIC" / "polygon") needs a real
+embedding model, plugged in through runtime_config["semantic_cache_embedder"].
+Word order only counts around role words, so "send 5 eth from alice to bob"
+does not match the same request with the parties swapped, and amounts weigh
+enough that "send 5 eth" does not match "send 6 eth".
+
+In a long request, one differing word ("on polygon" / "on solana", "last week" /
+"last month") barely moves the cosine similarity, yet changes the answer. So
+by default a match must also have exactly the same content terms (words and
+amounts other than filler and role words) as the task; see content_terms().
+"""
+
+import asyncio
+import hashlib
+import importlib
+import logging
+import re
+import time
+from collections import deque
+from typing import Callable, Dict, List
+
+import numpy as np
+
+from result_cache import normalize_task
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DIMENSIONS = 512
+_TOKEN = re.compile(r"\w+")
+_NUMBER = re.compile(r"\d")
+# Filler words that change the phrasing of a request but not what it asks for
+STOP_WORDS = frozenset({
+    "a", "an", "and", "about", "are", "can", "could", "current", "currently", "for", "give", "i",
+    "in", "is", "me", "my", "now", "of", "on", "please", "right", "s", "show", "tell", "the", "to",
+    "today", "what", "whats", "you",
+})
+# Words that give their neighbours a role ("from alice to bob", "swap usdc for eth"): pairs with
+# them keep their order, so requests with the same words in swapped roles do not match
+ROLE_WORDS = frozenset({"from", "to", "for", "into", "by", "via", "with", "than", "per", "versus", "vs"})
+# Whole words count for more than the character trigrams that absorb spelling variants
+WORD_WEIGHT = 2.0
+BIGRAM_WEIGHT = 2.0
+ROLE_BIGRAM_WEIGHT = 4.0
+# Amounts ("send 5 eth" / "send 6 eth") change the answer however long the rest of the request is
+NUMBER_WEIGHT = 6.0
+
+
+def _bucket(feature: str, dimensions: int) -> int:
+    return int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little") % dimensions
+
+
+def hashed_ngram_embedding(texts: List[str], dimensions: int = DEFAULT_DIMENSIONS) -> np.ndarray:
+    """
+    Embed texts as hashed word, word bigram and character trigram counts, ignoring STOP_WORDS.
+    Bigrams are unordered ("polygon price" / "price of polygon") unless they contain a ROLE_WORD.
+    """
+    vectors = np.zeros((len(texts), dimensions), dtype=np.float32)
+    for row, text in enumerate(texts):
+        words = [word for word in _TOKEN.findall(normalize_task(text)) if word not in STOP_WORDS or word in ROLE_WORDS]
+        for word in words:
+            if word in ROLE_WORDS:
+                continue
+            vectors[row, _bucket(word, dimensions)] += NUMBER_WEIGHT if _NUMBER.search(word) else WORD_WEIGHT
+            padded = f" {word} "
+            for i in range(len(padded) - 2):
+                vectors[row, _bucket(padded[i:i + 3], dimensions)] += 1.0
+        for first, second in zip(words, words[1:]):
+            if first in ROLE_WORDS or second in ROLE_WORDS:
+                vectors[row, _bucket(f"{first} {second}", dimensions)] += ROLE_BIGRAM_WEIGHT
+            else:
+                first, second = sorted((first, second))
+                vectors[row, _bucket(f"{first} {second}", dimensions)] += BIGRAM_WEIGHT
+    return vectors
+
+
+def content_terms(text: str) -> frozenset:
+    """Words and amounts of a task that change its answer: everything but STOP_WORDS and ROLE_WORDS"""
+    return frozenset(
+        word for word in _TOKEN.findall(normalize_task(text)) if word not in STOP_WORDS and word not in ROLE_WORDS
+    )
+
+
+def _terms_key(text: str) -> int:
+    terms = "\0".join(sorted(content_terms(text)))
+    return int.from_bytes(hashlib.blake2b(terms.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def load_embedder(path: str = None) -> Callable:
+    """
+    Embedding function named by "package.module:function", or the built-in
+    hashed n-gram embedder. It must map a list of texts to an (n, d) array.
+    """
+    if not path:
+        return hashed_ngram_embedding
+    module_name, _, function_name = path.partition(":")
+    return getattr(importlib.import_module(module_name), function_name)
+
+
+class SemanticCache:
+    """Cached answers looked up by cosine similarity of task embeddings"""
+
+    def __init__(self, embed: Callable = hashed_ngram_embedding, threshold: float = 0.95,
+                 ttl_seconds: float = 300, max_entries: int = 1000, latency_window: int = 1000,
+                 match_terms: bool = True):
+        self.embed = embed
+        self.threshold = threshold
+        # Only tasks with the same content terms match (off for embedders that know synonyms)
+        self.match_terms = match_terms
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.matrix = None
+        self.expires_at = np.zeros(max_entries, dtype=np.float64)
+        self.last_used = np.zeros(max_entries, dtype=np.float64)
+        self.responses = [None] * max_entries
+        self.term_keys = np.zeros(max_entries, dtype=np.uint64)
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.lookup_ms = deque(maxlen=latency_window)
+
+    @classmethod
+    def from_runtime_config(cls, runtime_config: Dict):
+        """Cache configured by the agent's runtime_config, or None when it is disabled"""
+        if not runtime_config.get("semantic_cache_enabled"):
+            return None
+        return cls(
+            embed=load_embedder(runtime_config.get("semantic_cache_embedder")),
+            threshold=runtime_config.get("semantic_cache_threshold", 0.95),
+            ttl_seconds=runtime_config.get("semantic_cache_ttl_seconds", 300),
+            max_entries=runtime_config.get("semantic_cache_max_entries", 1000),
+            match_terms=runtime_config.get("semantic_cache_match_terms", True)
+        )
+
+    async def _embed(self, texts: List[str]) -> np.ndarray:
+        # Embedding models can take milliseconds of CPU; keep them off the event loop
+        loop = asyncio.get_running_loop()
+        vectors = np.asarray(await loop.run_in_executor(None, self.embed, texts), dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+    def _match(self, vectors: np.ndarray, term_keys: np.ndarray = None):
+        """Best live row (with the same content terms, if given) and its similarity for each query vector"""
+        if self.size == 0:
+            return [(None, 0.0)] * len(vectors)
+        scores = vectors @ self.matrix[:self.size].T
+        scores[:, self.expires_at[:self.size] <= time.monotonic()] = -1.0
+        if term_keys is not None:
+            scores[term_keys[:, None] != self.term_keys[None, :self.size]] = -1.0
+        best = scores.argmax(axis=1)
+        return [(int(index), float(scores[row, index])) for row, index in enumerate(best)]
+
+    async def lookup_many(self, tasks: List[str]) -> List:
+        """Cached answers for a batch of tasks (None where there is no close enough match)"""
+        started = time.perf_counter()
+        vectors = await self._embed(tasks)
+        term_keys = np.array([_terms_key(task) for task in tasks], dtype=np.uint64) if self.match_terms else None
+        results = []
+        now = time.monotonic()
+        for index, similarity in self._match(vectors, term_keys):
+            if index is not None and similarity >= self.threshold:
+                self.last_used[index] = now
+                self.hits += 1
+                results.append(self.responses[index])
+            else:
+                self.misses += 1
+                results.append(None)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self.lookup_ms.extend([elapsed_ms / len(tasks)] * len(tasks))
+        return results
+
+    async def lookup(self, task: str):
+        return (await self.lookup_many([task]))[0]
+
+    async def add(self, task: str, response):
+        """Cache a successful answer"""
+        vector = (await self._embed([task]))[0]
+        if self.matrix is None:
+            self.matrix = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+        now = time.monotonic()
+        if self.size < self.max_entries:
+            index = self.size
+            self.size += 1
+        else:
+            expired = np.flatnonzero(self.expires_at <= now)
+            index = int(expired[0]) if expired.size else int(self.last_used.argmin())
+        self.matrix[index] = vector
+        self.expires_at[index] = now + self.ttl_seconds
+        self.last_used[index] = now
+        self.responses[index] = response
+        self.term_keys[index] = _terms_key(task)
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        latencies = np.asarray(self.lookup_ms) if self.lookup_ms else np.zeros(1)
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "entries": self.size,
+            "lookup_ms_avg": round(float(latencies.mean()), 3),
+            "lookup_ms_p95": round(float(np.percentile(latencies, 95)), 3),
+        }
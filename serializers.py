@@ -0,0 +1,144 @@
+"""
+Wire format registry shared by msk_producer, msk_consumer and the agent runtime.
+
+Every Kafka record carries a ``content-type`` header naming the format of its
+value. Records without the header are treated as JSON so that producers which
+predate the registry keep working unchanged.
+"""
+
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE_HEADER = "content-type"
+JSON_CONTENT_TYPE = "application/json"
+MSGPACK_CONTENT_TYPE = "application/msgpack"
+DEFAULT_CONTENT_TYPE = JSON_CONTENT_TYPE
+
+
+class Serializer:
+    """Base class for a wire format: bytes in, Python value out and back"""
+
+    content_type = None
+
+    def dumps(self, value) -> bytes:
+        raise NotImplementedError
+
+    def loads(self, data: bytes):
+        raise NotImplementedError
+
+
+class JSONSerializer(Serializer):
+    content_type = JSON_CONTENT_TYPE
+
+    def dumps(self, value) -> bytes:
+        return json.dumps(value, separators=(',', ':')).encode('utf-8')
+
+    def loads(self, data: bytes):
+        return json.loads(data.decode('utf-8'))
+
+
+class MsgPackSerializer(Serializer):
+    content_type = MSGPACK_CONTENT_TYPE
+
+    def __init__(self):
+        try:
+            import msgpack
+        except ImportError:
+            msgpack = None
+        self._msgpack = msgpack
+
+    def _require(self):
+        if self._msgpack is None:
+            raise RuntimeError("MessagePack support requires the 'msgpack' package (pip install msgpack)")
+        return self._msgpack
+
+    def dumps(self, value) -> bytes:
+        return self._require().packb(value, use_bin_type=True)
+
+    def loads(self, data: bytes):
+        return self._require().unpackb(data, raw=False)
+
+
+_serializers = {}
+
+
+def register_serializer(serializer: Serializer, aliases=()):
+    """
+    Register a serializer under its content type and any short aliases
+
+    Args:
+        serializer: Serializer instance
+        aliases: Extra names (e.g. "json", "msgpack") that resolve to it
+    """
+    _serializers[serializer.content_type] = serializer
+    for alias in aliases:
+        _serializers[alias] = serializer
+
+
+def get_serializer(name=None) -> Serializer:
+    """
+    Look up a serializer by content type or alias, defaulting to JSON
+    """
+    if not name:
+        name = DEFAULT_CONTENT_TYPE
+    if isinstance(name, bytes):
+        name = name.decode('utf-8')
+    # Ignore parameters such as "; charset=utf-8"
+    name = name.split(';', 1)[0].strip().lower()
+    try:
+        return _serializers[name]
+    except KeyError:
+        raise ValueError(f"Unsupported content type '{name}'")
+
+
+def content_type_from_headers(headers):
+    """
+    Extract the content type from Kafka record headers (list of (str, bytes))
+    """
+    for key, value in headers or ():
+        if key.lower() == CONTENT_TYPE_HEADER:
+            return value.decode('utf-8') if isinstance(value, bytes) else value
+    return DEFAULT_CONTENT_TYPE
+
+
+def encode(value, content_type=None):
+    """
+    Serialize a value and build the headers describing it
+
+    Returns:
+        Tuple of (payload bytes, Kafka headers list)
+    """
+    serializer = get_serializer(content_type)
+    payload = serializer.dumps(value)
+    return payload, [(CONTENT_TYPE_HEADER, serializer.content_type.encode('utf-8'))]
+
+
+def decode(data, headers=None):
+    """
+    Deserialize a record value using the content type from its headers.
+    Records without a content-type header are decoded as JSON.
+    """
+    if data is None:
+        return None
+    return get_serializer(content_type_from_headers(headers)).loads(data)
+
+
+def decode_record(record):
+    """
+    Decode an aiokafka ConsumerRecord whose value was left as raw bytes.
+    Falls back to the plain text when a header-less value is not valid JSON,
+    which the agent runtime then processes as a plain-text task.
+    """
+    try:
+        return decode(record.value, record.headers)
+    except (ValueError, UnicodeDecodeError) as e:
+        if content_type_from_headers(record.headers) != DEFAULT_CONTENT_TYPE:
+            raise
+        logger.debug(f"Record is not valid JSON, using raw text: {e}")
+        return record.value.decode('utf-8', errors='replace')
+
+
+register_serializer(JSONSerializer(), aliases=("json",))
+register_serializer(MsgPackSerializer(), aliases=("msgpack", "application/x-msgpack"))
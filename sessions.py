@@ -0,0 +1,237 @@
+"""
+Per-session conversation state that survives agent restarts.
+
+Subagents keep their conversation history in memory, so a restart (a
+deploy, a crash, a scale-to-zero stop) loses it, and getting the context
+back means replaying it through the model. With sessions enabled the
+runtime keeps one history per session instead. A session is the envelope's
+"session_id", else its "channel_id".
+
+- Before a session's task runs, its history is loaded into the subagents,
+  from memory, else from the snapshot store (local files or Redis), else
+  empty. Loading goes through fast-agent's generate() with the history
+  ending on an assistant message, which fills the provider history without
+  calling the model.
+- After the task, a snapshot is written every checkpoint_turns turns. All
+  sessions changed since their last snapshot are written on shutdown.
+
+Snapshots are zlib-compressed JSON of each subagent's PromptMessageMultipart
+history. Tasks of different sessions take turns on the shared subagents.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+import zlib
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from caching import redis_settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600
+
+
+def session_key(envelope: Dict) -> str:
+    return str(envelope.get("session_id") or envelope.get("channel_id") or "default")
+
+
+class SessionStore:
+    """Compressed session snapshots in a directory or in Redis, expiring after ttl_seconds"""
+
+    def __init__(self, directory: str = None, redis_config: Dict = None, namespace: str = "",
+                 ttl_seconds: float = DEFAULT_TTL_SECONDS):
+        self.directory = Path(directory) if directory else None
+        self.redis_config = redis_config
+        self.redis_prefix = f"agent_session:{namespace}:"
+        self.ttl_seconds = ttl_seconds
+        self.client = None
+        if self.directory:
+            self.directory.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, session: str) -> Path:
+        return self.directory / (hashlib.sha256(session.encode("utf-8")).hexdigest()[:32] + ".json.z")
+
+    def _redis(self):
+        if self.client is None:
+            import redis.asyncio as aioredis
+            self.client = aioredis.Redis(**self.redis_config)
+        return self.client
+
+    async def get(self, session: str) -> Optional[Dict]:
+        if self.redis_config:
+            data = await self._redis().get(self.redis_prefix + session)
+        else:
+            path = self._path(session)
+            try:
+                if time.time() - path.stat().st_mtime > self.ttl_seconds:
+                    path.unlink(missing_ok=True)
+                    return None
+                data = await asyncio.get_running_loop().run_in_executor(None, path.read_bytes)
+            except FileNotFoundError:
+                return None
+        return json.loads(zlib.decompress(data)) if data else None
+
+    async def set(self, session: str, snapshot: Dict) -> int:
+        data = zlib.compress(json.dumps(snapshot, separators=(',', ':')).encode("utf-8"))
+        if self.redis_config:
+            await self._redis().set(self.redis_prefix + session, data, px=int(self.ttl_seconds * 1000))
+        else:
+            await asyncio.get_running_loop().run_in_executor(None, self._write, self._path(session), data)
+        return len(data)
+
+    @staticmethod
+    def _write(path: Path, data: bytes):
+        temp_path = path.with_suffix(".tmp")
+        temp_path.write_bytes(data)
+        os.replace(temp_path, path)
+
+    async def close(self):
+        if self.client:
+            await self.client.close()
+            self.client = None
+
+
+class SessionManager:
+    """Swaps per-session histories in and out of the subagents around each task"""
+
+    def __init__(self, agent_names: List[str], store: SessionStore, checkpoint_turns: int = 1,
+                 max_in_memory: int = 100):
+        self.agent_names = list(agent_names)
+        self.store = store
+        self.checkpoint_turns = checkpoint_turns
+        self.max_in_memory = max(1, max_in_memory)
+        # session -> {agent name: [message dicts]}, least recently used first
+        self.states = OrderedDict()
+        self.turns = {}
+        self.current = None
+        # One session is loaded into the shared subagents at a time, so tasks of every
+        # partition run one after another while sessions are enabled
+        self.lock = asyncio.Lock()
+        self.restored = 0
+        self.snapshots = 0
+        self.snapshot_bytes = 0
+
+    @classmethod
+    def from_runtime_config(cls, runtime_config: Dict, json_config: Dict, agent_names: List[str], namespace: str):
+        """Session manager configured by runtime_config, or None when sessions are off"""
+        if not runtime_config.get("sessions_enabled"):
+            return None
+        ttl_seconds = runtime_config.get("session_ttl_seconds", DEFAULT_TTL_SECONDS)
+        if runtime_config.get("session_backend", "file") == "redis":
+            store = SessionStore(redis_config=redis_settings(json_config), namespace=namespace, ttl_seconds=ttl_seconds)
+        else:
+            store = SessionStore(directory=runtime_config["session_dir"], ttl_seconds=ttl_seconds)
+        return cls(
+            agent_names,
+            store,
+            runtime_config.get("session_checkpoint_turns", 1),
+            runtime_config.get("session_max_in_memory", 100)
+        )
+
+    async def run(self, agent, session: str, task):
+        """Run task (an awaitable factory) with the session's history loaded"""
+        async with self.lock:
+            if self.current != session:
+                self._capture(agent)
+                await self._load(agent, session)
+                self.current = session
+            try:
+                return await task()
+            finally:
+                self._capture(agent)
+                self.turns[session] = self.turns.get(session, 0) + 1
+                if self.checkpoint_turns and self.turns[session] >= self.checkpoint_turns:
+                    await self._save(session)
+
+    def _capture(self, agent):
+        """Copy the loaded session's histories out of the subagents"""
+        if self.current is None:
+            return
+        self.states[self.current] = {
+            name: [message.model_dump(mode="json") for message in agent[name].message_history]
+            for name in self.agent_names
+        }
+        self.states.move_to_end(self.current)
+
+    async def _load(self, agent, session: str):
+        state = self.states.get(session)
+        if state is None:
+            started = time.perf_counter()
+            try:
+                state = await self.store.get(session)
+            except Exception as e:
+                logger.warning(f"Failed to read session snapshot: {e}")
+            if state is not None:
+                self.restored += 1
+                logger.info("Restored session", extra={
+                    "event": "session_restore", "session": session,
+                    "messages": sum(len(messages) for messages in state.values()),
+                    "elapsed_ms": round((time.perf_counter() - started) * 1000, 1)
+                })
+            self.states[session] = state = state or {}
+            await self._evict(keep=session)
+        self.states.move_to_end(session)
+        for name in self.agent_names:
+            await self._set_history(agent[name], state.get(name, []))
+
+    @staticmethod
+    async def _set_history(subagent, messages: List[Dict]):
+        from mcp_agent.mcp.prompt_message_multipart import PromptMessageMultipart
+
+        llm = subagent._llm
+        llm.history.clear()
+        history = [PromptMessageMultipart.model_validate(message) for message in messages]
+        # A turn cut off before the reply would make generate() call the model
+        while history and history[-1].role != "assistant":
+            history.pop()
+        if history:
+            await subagent.generate(history)
+        llm._message_history = history
+
+    async def _evict(self, keep: str):
+        while len(self.states) > max(self.max_in_memory, 2):
+            session = next(iter(self.states))
+            if session in (self.current, keep):
+                self.states.move_to_end(session)
+                continue
+            if self.turns.get(session):
+                await self._save(session)
+            self.states.pop(session, None)
+            self.turns.pop(session, None)
+
+    async def _save(self, session: str):
+        state = self.states.get(session)
+        if state is None:
+            return
+        try:
+            size = await self.store.set(session, state)
+        except Exception as e:
+            logger.warning(f"Failed to write session snapshot: {e}")
+            return
+        self.turns[session] = 0
+        self.snapshots += 1
+        self.snapshot_bytes = size
+
+    async def close(self, agent=None):
+        """Snapshot every session changed since its last snapshot"""
+        async with self.lock:
+            if agent is not None:
+                self._capture(agent)
+            for session, turns in list(self.turns.items()):
+                if turns:
+                    await self._save(session)
+        await self.store.close()
+
+    def stats(self) -> Dict:
+        return {
+            "sessions": len(self.states),
+            "restored": self.restored,
+            "snapshots": self.snapshots,
+            "last_snapshot_bytes": self.snapshot_bytes,
+        }
@@ -0,0 +1,145 @@
+"""
+Fan-out of agent output to streaming clients (SSE / WebSocket) in agent_manager.
+
+Each agent has at most one upstream subscription, shared by every connected
+client. Clients read from their own bounded buffer; when a client falls
+behind, its oldest events are dropped so it can never stall the upstream
+reader or the other clients.
+"""
+
+import asyncio
+import logging
+import os
+import socket
+from typing import Dict, List
+
+from transports import create_transport
+
+logger = logging.getLogger(__name__)
+
+CLIENT_BUFFER_SIZE = int(os.environ.get('STREAM_CLIENT_BUFFER', '256'))
+
+
+class ClientStream:
+    """A connected client's bounded event buffer"""
+
+    def __init__(self, agent_stream, buffer_size: int):
+        self.agent_stream = agent_stream
+        self.queue = asyncio.Queue(maxsize=buffer_size)
+        self.dropped = 0
+
+    def offer(self, event: Dict):
+        """Queue an event, discarding the oldest one if the buffer is full"""
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+    async def next_event(self, timeout: float = None):
+        """
+        Next event for this client, or None on timeout. Reports how many
+        events were dropped since the last read before resuming the stream.
+        """
+        if self.dropped:
+            dropped, self.dropped = self.dropped, 0
+            return {"type": "stream_overflow", "dropped": dropped}
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class AgentStream:
+    """Single upstream subscription for one agent, fanned out to its clients"""
+
+    def __init__(self, key: str, pubsub_config: Dict, channels: List[str]):
+        self.key = key
+        self.pubsub_config = pubsub_config
+        self.channels = channels
+        self.clients = set()
+        self.transports = []
+        self.tasks = []
+
+    async def start(self):
+        # Kafka consumers need a group of their own per manager process so the
+        # stream sees every message instead of sharing partitions with the agent
+        group = f"agent_manager_stream_{socket.gethostname()}_{os.getpid()}"
+        for channel_name in self.channels:
+            transport = create_transport(self.pubsub_config, consumer_group=group)
+            await transport.start()
+            channel = transport.resolve_channel(channel_name)
+            await transport.subscribe(channel)
+            self.transports.append(transport)
+            self.tasks.append(asyncio.create_task(self._pump(transport), name=f"stream-{self.key}-{channel}"))
+        logger.info(f"Upstream stream for '{self.key}' subscribed to {self.channels}")
+
+    async def _pump(self, transport):
+        while True:
+            try:
+                messages = await transport.receive_batch(max_records=500, timeout_ms=1000)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Upstream stream for '{self.key}' failed to receive: {e}")
+                await asyncio.sleep(1)
+                continue
+            for message in messages:
+                value = message.value
+                # Inbound tasks are not agent output
+                if isinstance(value, dict) and value.get('type') == 'user':
+                    continue
+                event = value if isinstance(value, dict) else {"type": "message", "content": value}
+                for client in list(self.clients):
+                    client.offer(event)
+            for message in messages:
+                await transport.ack(message)
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        for task in self.tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        for transport in self.transports:
+            try:
+                await transport.close()
+            except Exception as e:
+                logger.warning(f"Error closing upstream stream for '{self.key}': {e}")
+        logger.info(f"Upstream stream for '{self.key}' closed")
+
+
+class StreamHub:
+    """Keeps one AgentStream per agent while it has at least one client"""
+
+    def __init__(self, buffer_size: int = CLIENT_BUFFER_SIZE):
+        self.buffer_size = buffer_size
+        self.streams = {}
+        self._lock = asyncio.Lock()
+
+    async def connect(self, key: str, pubsub_config: Dict, channels: List[str]) -> ClientStream:
+        async with self._lock:
+            stream = self.streams.get(key)
+            if stream is None:
+                stream = AgentStream(key, pubsub_config, channels)
+                try:
+                    await stream.start()
+                except Exception:
+                    await stream.stop()
+                    raise
+                self.streams[key] = stream
+            client = ClientStream(stream, self.buffer_size)
+            stream.clients.add(client)
+            return client
+
+    async def disconnect(self, client: ClientStream):
+        async with self._lock:
+            stream = client.agent_stream
+            stream.clients.discard(client)
+            if not stream.clients and self.streams.get(stream.key) is stream:
+                del self.streams[stream.key]
+                await stream.stop()
+
+    def stats(self) -> Dict:
+        return {key: len(stream.clients) for key, stream in self.streams.items()}
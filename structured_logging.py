@@ -0,0 +1,152 @@
+"""
+Structured, non-blocking logging for agents and the agent manager.
+
+Log records are formatted as compact JSON lines and handed to a bounded
+queue; a background thread (QueueListener) does the actual I/O, so logging
+never blocks the event loop. File output rotates by size and gzips the
+rotated files.
+"""
+
+import atexit
+import copy
+import gzip
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import shutil
+import sys
+from typing import Dict
+
+DEFAULT_MAX_BYTES = 50 * 1024 * 1024
+DEFAULT_BACKUP_COUNT = 5
+DEFAULT_QUEUE_SIZE = 10000
+
+LEVELS = {
+    "debug": logging.DEBUG,
+    "info": logging.INFO,
+    "warning": logging.WARNING,
+    "warn": logging.WARNING,
+    "error": logging.ERROR,
+    "critical": logging.CRITICAL,
+}
+
+# Attributes every LogRecord has; anything else was passed through `extra`
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+
+class JSONLineFormatter(logging.Formatter):
+    """Formats records as single-line JSON objects"""
+
+    def __init__(self, static_fields: Dict = None):
+        super().__init__()
+        self.static_fields = static_fields or {}
+
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        entry.update(self.static_fields)
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, separators=(',', ':'), default=str, ensure_ascii=False)
+
+
+_traceback_formatter = logging.Formatter()
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records instead of blocking when the queue is full"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Resolve the message and traceback now (the arguments may change
+        # before the writer thread runs) but keep them in separate fields
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _traceback_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class CompressingRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """Size-based rotation that gzips each rotated file"""
+
+    def __init__(self, filename, max_bytes=DEFAULT_MAX_BYTES, backup_count=DEFAULT_BACKUP_COUNT):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8")
+        self.namer = lambda name: name + ".gz"
+        self.rotator = self._compress
+
+    @staticmethod
+    def _compress(source, dest):
+        with open(source, "rb") as f_in, gzip.open(dest, "wb") as f_out:
+            shutil.copyfileobj(f_in, f_out)
+        os.remove(source)
+
+
+def configure_logging(logger_config: Dict = None, log_file: str = None,
+                      max_bytes: int = DEFAULT_MAX_BYTES, backup_count: int = DEFAULT_BACKUP_COUNT,
+                      static_fields: Dict = None, queue_size: int = DEFAULT_QUEUE_SIZE):
+    """
+    Route the root logger through a background JSON-lines writer
+
+    Args:
+        logger_config: The agent's json_config["logger"]; its "level" sets the log level
+        log_file: Write to this file (rotated and compressed) instead of stdout
+        max_bytes: Rotate the file once it reaches this size
+        backup_count: Compressed rotated files to keep
+        static_fields: Fields added to every line (e.g. {"agent": "crypto_trader"})
+        queue_size: Records buffered before new ones are dropped
+
+    Returns:
+        The started QueueListener (stopped automatically at exit, or with stop_logging)
+    """
+    logger_config = logger_config or {}
+    level = LEVELS.get(str(logger_config.get("level", "info")).lower(), logging.INFO)
+
+    if log_file:
+        os.makedirs(os.path.dirname(os.path.abspath(log_file)), exist_ok=True)
+        output = CompressingRotatingFileHandler(log_file, max_bytes=max_bytes, backup_count=backup_count)
+    else:
+        output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JSONLineFormatter(static_fields))
+
+    log_queue = queue.Queue(maxsize=queue_size)
+    queue_handler = DroppingQueueHandler(log_queue)
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    listener.start()
+    atexit.register(stop_logging, listener)
+    return listener
+
+
+def stop_logging(listener):
+    """Flush queued records and stop the writer thread (safe to call twice)"""
+    if listener._thread is not None:
+        listener.stop()
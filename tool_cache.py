@@ -0,0 +1,173 @@
+"""
+Cache of MCP tool call results for the agent runtime.
+
+Caching is configured per server in json_config["mcp"]["servers"]:
+
+    "fetch": {
+        "command": "uvx",
+        "args": ["mcp-server-fetch"],
+        "cache": {"ttl_seconds": 300, "tools": {"fetch": 600}, "backend": "redis"}
+    }
+
+"tools" overrides the TTL of single tools (0 disables caching for a tool).
+Results are keyed on the server's command/args/url, the tool name and its
+canonical arguments. Each server's results are kept in its own in-process
+LRU of "max_entries" and, if that server uses the "redis" backend, in Redis,
+where every agent on the host shares them.
+Concurrent identical calls in a process share one in-flight call, and error
+results are never cached.
+
+fast-agent has no hook around tool calls, so install_tool_cache wraps
+MCPAggregator._execute_on_server, through which every tool call passes.
+"""
+
+import hashlib
+import json
+import logging
+from typing import Dict
+
+from caching import Coalescer, RedisStore, TTLCache, redis_settings
+from result_cache import config_fingerprint
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("memory", "redis")
+DEFAULT_MAX_ENTRIES = 1000
+# Larger results (e.g. whole fetched pages) are passed through uncached
+DEFAULT_MAX_RESULT_BYTES = 512 * 1024
+
+
+class ToolCallCache:
+    """Tool call results by (server, tool, arguments)"""
+
+    def __init__(self, servers: Dict, store: RedisStore = None, max_result_bytes: int = DEFAULT_MAX_RESULT_BYTES):
+        self.policies = {}
+        for server_name, server_config in servers.items():
+            cache_config = server_config.get("cache") or {}
+            backend = cache_config.get("backend", "memory")
+            if backend not in BACKENDS:
+                raise ValueError(f"MCP server '{server_name}': cache backend must be one of {BACKENDS}, not '{backend}'")
+            self.policies[server_name] = {
+                "ttl_seconds": cache_config.get("ttl_seconds", 0),
+                "tools": cache_config.get("tools", {}),
+                # Agents configuring the same server differently must not share entries
+                "fingerprint": config_fingerprint(
+                    server_config.get("command"), server_config.get("args"), server_config.get("url")
+                ),
+                "local": TTLCache(cache_config.get("max_entries", DEFAULT_MAX_ENTRIES)),
+                "shared": backend == "redis",
+            }
+        # Only used for the servers with the redis backend
+        self.store = store
+        self.max_result_bytes = max_result_bytes
+        self.coalescer = Coalescer()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    @classmethod
+    def from_json_config(cls, json_config: Dict):
+        """Cache for the servers that configure one, or None when none does"""
+        servers = {
+            name: config for name, config in ((json_config.get("mcp") or {}).get("servers") or {}).items()
+            if isinstance(config, dict) and config.get("cache")
+        }
+        if not servers:
+            return None
+        store = None
+        if any(config["cache"].get("backend") == "redis" for config in servers.values()):
+            store = RedisStore("mcp_tool_cache:", **redis_settings(json_config))
+        return cls(servers, store)
+
+    def ttl_for(self, server_name: str, tool_name: str) -> float:
+        policy = self.policies.get(server_name)
+        if policy is None:
+            return 0
+        return policy["tools"].get(tool_name, policy["ttl_seconds"])
+
+    def key(self, server_name: str, tool_name: str, arguments) -> str:
+        encoded = json.dumps(arguments or {}, sort_keys=True, separators=(',', ':'), default=str)
+        digest = hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+        return f"{server_name}:{self.policies[server_name]['fingerprint']}:{tool_name}:{digest}"
+
+    async def call(self, server_name: str, tool_name: str, arguments, execute, dump, load):
+        """
+        Result of a tool call, from the cache when possible
+
+        Args:
+            execute: Awaitable factory performing the real call
+            dump: Converts a result to a JSON-serializable value, or None if it must not be cached
+            load: Rebuilds a result from the cached value
+        """
+        ttl = self.ttl_for(server_name, tool_name)
+        key = self.key(server_name, tool_name, arguments)
+        policy = self.policies[server_name]
+        local, store = policy["local"], self.store if policy["shared"] else None
+        cached = local.get(key)
+        if cached is None and store is not None and not self.coalescer.pending(key):
+            cached, remaining = await store.get_with_ttl(key)
+            if cached is not None and remaining > 0:
+                # Only for what is left of the Redis TTL, so an entry never outlives its ttl
+                local.set(key, cached, min(remaining, ttl))
+        if cached is not None:
+            self.hits += 1
+            logger.info("Tool cache hit", extra={
+                "event": "tool_cache", "outcome": "hit", "server": server_name, "tool": tool_name
+            })
+            return load(cached)
+
+        async def execute_and_store():
+            result = await execute()
+            value = dump(result)
+            if value is not None and len(json.dumps(value, default=str)) <= self.max_result_bytes:
+                local.set(key, value, ttl)
+                if store is not None:
+                    await store.set(key, value, ttl)
+            return result
+
+        result, shared = await self.coalescer.run(key, execute_and_store)
+        if shared:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+        return result
+
+    def stats(self) -> Dict:
+        entries = sum(len(policy["local"]) for policy in self.policies.values())
+        return {"hits": self.hits, "misses": self.misses, "coalesced": self.coalesced, "entries": entries}
+
+    async def close(self):
+        if self.store is not None:
+            await self.store.close()
+
+
+def install_tool_cache(cache: ToolCallCache) -> bool:
+    """Route fast-agent's MCP tool calls through cache; returns False if fast-agent could not be patched"""
+    try:
+        from mcp.types import CallToolResult
+        from mcp_agent.mcp.mcp_aggregator import MCPAggregator
+    except ImportError as e:
+        logger.warning(f"MCP tool cache disabled: {e}")
+        return False
+
+    original = MCPAggregator._execute_on_server
+
+    def dump(result):
+        if getattr(result, "isError", False):
+            return None
+        return result.model_dump(mode="json")
+
+    async def _execute_on_server(self, server_name, operation_type, operation_name, method_name,
+                                 method_args=None, error_factory=None):
+        def execute():
+            return original(self, server_name, operation_type, operation_name, method_name,
+                            method_args, error_factory)
+
+        if operation_type != "tool" or cache.ttl_for(server_name, operation_name) <= 0:
+            return await execute()
+        arguments = (method_args or {}).get("arguments")
+        return await cache.call(server_name, operation_name, arguments, execute, dump, CallToolResult.model_validate)
+
+    MCPAggregator._execute_on_server = _execute_on_server
+    logger.info(f"MCP tool cache enabled for servers {list(cache.policies)}")
+    return True
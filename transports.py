@@ -0,0 +1,291 @@
+"""
+Message transports for the agent runtime.
+
+A transport hides the broker behind four operations: subscribe to a channel,
+receive a batch of messages, acknowledge a processed message and publish a
+value. The backend is chosen from ``pubsub_config["backend"]`` (Redis when the
+config names none, as agents used before transports were pluggable):
+
+- ``memory``: in-process broker, no external services (tests, benchmarks)
+- ``redis``: Redis pub/sub
+- ``kafka`` / ``msk``: Kafka, with IAM authentication for MSK
+
+Subscribers are told which partitions they own through on_assign/on_revoke
+callbacks. Memory and Redis expose a single partition per channel.
+"""
+
+import asyncio
+import logging
+from typing import Dict, List
+
+import serializers
+
+logger = logging.getLogger(__name__)
+
+# Backend of a pubsub_config without "backend"
+DEFAULT_BACKEND = "redis"
+
+
+class TransportMessage:
+    """A received message with its decoded value and broker metadata"""
+
+    __slots__ = ("value", "channel", "partition", "offset", "key", "headers", "size", "raw")
+
+    def __init__(self, value, channel, partition, offset=None, key=None, headers=None, size=0, raw=None):
+        self.value = value
+        self.channel = channel
+        self.partition = partition
+        self.offset = offset
+        self.key = key
+        self.headers = headers or []
+        self.size = size
+        self.raw = raw
+
+
+class Transport:
+    """Base class for message transports"""
+
+    backend = None
+
+    def __init__(self, pubsub_config: Dict = None, content_type=None):
+        self.pubsub_config = pubsub_config or {}
+        self.content_type = content_type or self.pubsub_config.get("content_type")
+
+    def resolve_channel(self, channel_name: str) -> str:
+        """Map a logical channel name to the broker's channel/topic name"""
+        return channel_name
+
+    async def start(self):
+        pass
+
+    async def warm(self):
+        """Open the publishing connection ahead of the first publish"""
+        pass
+
+    async def subscribe(self, channel: str, on_assign=None, on_revoke=None):
+        raise NotImplementedError
+
+    async def receive_batch(self, max_records: int = 100, timeout_ms: int = 1000) -> List[TransportMessage]:
+        raise NotImplementedError
+
+    async def ack(self, message: TransportMessage):
+        """Mark a message as processed (no-op for fire-and-forget backends)"""
+        pass
+
+    async def publish(self, channel: str, value, key=None, content_type=None):
+        raise NotImplementedError
+
+    async def publish_many(self, items):
+        """
+        Publish a batch of (channel, value, key) tuples. Backends with a
+        batching producer override this to send them in one round trip.
+        """
+        return await asyncio.gather(*(self.publish(channel, value, key) for channel, value, key in items))
+
+    def pause(self, partition):
+        """Stop fetching from a partition whose worker is backed up"""
+        pass
+
+    def resume(self, partition):
+        pass
+
+    async def close(self):
+        pass
+
+
+class MemoryBroker:
+    """In-process pub/sub broker: every subscriber gets its own bounded queue"""
+
+    def __init__(self):
+        self.channels = {}
+
+    def add_subscriber(self, channel, max_queue):
+        queue = asyncio.Queue(maxsize=max_queue)
+        self.channels.setdefault(channel, []).append(queue)
+        return queue
+
+    def remove_subscriber(self, channel, queue):
+        subscribers = self.channels.get(channel, [])
+        if queue in subscribers:
+            subscribers.remove(queue)
+
+    async def publish(self, channel, item):
+        subscribers = self.channels.get(channel, [])
+        for queue in subscribers:
+            # Waits when a subscriber is full, giving producers backpressure
+            await queue.put(item)
+        return len(subscribers)
+
+
+_default_broker = MemoryBroker()
+
+
+class MemoryTransport(Transport):
+    """
+    Transport backed by an in-process MemoryBroker. Values are still encoded
+    with the configured serializer so that benchmarks include that cost.
+    """
+
+    backend = "memory"
+
+    def __init__(self, pubsub_config: Dict = None, broker: MemoryBroker = None, max_queue: int = 10000, **kwargs):
+        super().__init__(pubsub_config, kwargs.get("content_type"))
+        self.broker = broker or _default_broker
+        self.max_queue = (pubsub_config or {}).get("memory", {}).get("max_queue", max_queue)
+        self.subscriptions = {}
+        self.offsets = {}
+
+    async def subscribe(self, channel: str, on_assign=None, on_revoke=None):
+        self.subscriptions[channel] = (self.broker.add_subscriber(channel, self.max_queue), on_revoke)
+        self.offsets.setdefault(channel, 0)
+        if on_assign:
+            on_assign([channel])
+
+    async def receive_batch(self, max_records: int = 100, timeout_ms: int = 1000) -> List[TransportMessage]:
+        if not self.subscriptions:
+            await asyncio.sleep(timeout_ms / 1000)
+            return []
+        messages = []
+        for channel, (queue, _) in self.subscriptions.items():
+            while len(messages) < max_records and not queue.empty():
+                messages.append(self._to_message(channel, queue.get_nowait()))
+        if messages:
+            return messages
+
+        # Nothing buffered: wait for the first message on any subscription
+        waiters = {asyncio.ensure_future(queue.get()): channel
+                   for channel, (queue, _) in self.subscriptions.items()}
+        done, pending = await asyncio.wait(waiters, timeout=timeout_ms / 1000, return_when=asyncio.FIRST_COMPLETED)
+        for future in pending:
+            future.cancel()
+        for future in done:
+            messages.append(self._to_message(waiters[future], future.result()))
+        return messages
+
+    def _to_message(self, channel, item):
+        payload, headers, key = item
+        offset = self.offsets[channel]
+        self.offsets[channel] = offset + 1
+        return TransportMessage(
+            value=serializers.decode(payload, headers),
+            channel=channel, partition=channel, offset=offset,
+            key=key, headers=headers, size=len(payload), raw=payload
+        )
+
+    async def publish(self, channel: str, value, key=None, content_type=None):
+        payload, headers = serializers.encode(value, content_type or self.content_type)
+        await self.broker.publish(channel, (payload, headers, key))
+        return {"channel": channel}
+
+    async def close(self):
+        for channel, (queue, on_revoke) in self.subscriptions.items():
+            self.broker.remove_subscriber(channel, queue)
+            if on_revoke:
+                await on_revoke([channel])
+        self.subscriptions = {}
+
+
+class RedisTransport(Transport):
+    """
+    Redis pub/sub transport. Redis messages carry no headers, so values are
+    always JSON and plain-text payloads are passed through as strings.
+    """
+
+    backend = "redis"
+
+    def __init__(self, pubsub_config: Dict = None, **kwargs):
+        super().__init__(pubsub_config, serializers.JSON_CONTENT_TYPE)
+        redis_config = self.pubsub_config.get("redis", {})
+        self.host = redis_config.get("host", "localhost")
+        self.port = redis_config.get("port", 6379)
+        self.db = redis_config.get("db", 0)
+        self.channel_prefix = redis_config.get("channel_prefix", "agent:")
+        self.client = None
+        self.pubsub = None
+        self.channels = {}
+
+    def resolve_channel(self, channel_name: str) -> str:
+        if channel_name.startswith(self.channel_prefix):
+            return channel_name
+        return self.channel_prefix + channel_name
+
+    async def start(self):
+        import redis.asyncio as aioredis
+        self.client = aioredis.Redis(host=self.host, port=self.port, db=self.db)
+        self.pubsub = self.client.pubsub()
+
+    async def warm(self):
+        await self.client.ping()
+
+    async def subscribe(self, channel: str, on_assign=None, on_revoke=None):
+        await self.pubsub.subscribe(channel)
+        self.channels[channel] = on_revoke
+        if on_assign:
+            on_assign([channel])
+
+    async def receive_batch(self, max_records: int = 100, timeout_ms: int = 1000) -> List[TransportMessage]:
+        messages = []
+        timeout = timeout_ms / 1000
+        while len(messages) < max_records:
+            message = await self.pubsub.get_message(ignore_subscribe_messages=True, timeout=timeout)
+            if message is None:
+                break
+            if message.get('type') != 'message':
+                continue
+            messages.append(self._to_message(message))
+            # Only the first read blocks; the rest drain what is already buffered
+            timeout = 0
+        return messages
+
+    def _to_message(self, message):
+        channel = message.get('channel')
+        if isinstance(channel, bytes):
+            channel = channel.decode('utf-8')
+        data = message.get('data')
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        try:
+            value = serializers.decode(data)
+        except (ValueError, UnicodeDecodeError):
+            value = data.decode('utf-8', errors='replace')
+        return TransportMessage(value=value, channel=channel, partition=channel, size=len(data), raw=data)
+
+    async def publish(self, channel: str, value, key=None, content_type=None):
+        payload, _ = serializers.encode(value, serializers.JSON_CONTENT_TYPE)
+        receivers = await self.client.publish(channel, payload)
+        return {"channel": channel, "receivers": receivers}
+
+    async def close(self):
+        if self.pubsub:
+            for channel, on_revoke in self.channels.items():
+                if on_revoke:
+                    await on_revoke([channel])
+            await self.pubsub.unsubscribe()
+            await self.pubsub.close()
+        if self.client:
+            await self.client.close()
+
+
+def backend_of(pubsub_config: Dict) -> str:
+    """Backend named by a pubsub_config, DEFAULT_BACKEND when it names none"""
+    return (pubsub_config or {}).get("backend") or DEFAULT_BACKEND
+
+
+def create_transport(pubsub_config: Dict, **options) -> Transport:
+    """
+    Build the transport named by pubsub_config["backend"] (DEFAULT_BACKEND if unset)
+
+    Args:
+        pubsub_config: The agent's json_config["pubsub_config"]
+        **options: Backend specific options (e.g. num_partitions for Kafka)
+    """
+    backend = backend_of(pubsub_config)
+    if backend == "memory":
+        return MemoryTransport(pubsub_config, **options)
+    if backend == "redis":
+        return RedisTransport(pubsub_config, **options)
+    if backend in ("kafka", "msk"):
+        # Imported lazily so the memory backend works without aiokafka installed
+        from kafka_transport import KafkaTransport
+        return KafkaTransport(pubsub_config, **options)
+    raise ValueError(f"Unsupported pubsub backend '{backend}'")